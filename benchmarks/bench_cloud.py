@@ -0,0 +1,128 @@
+"""
+Benchmark the cloud mock's hot endpoints (/profile upsert, batched
+upserts and /model/latest) served by uvicorn in-process on localhost.
+
+    python benchmarks/bench_cloud.py [--quick]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent import futures
+from pathlib import Path
+
+from bench_common import (
+    Timer, serve_app, setup_paths, summarize, write_results,
+)
+
+setup_paths()
+
+import requests  # noqa: E402
+
+import app as cloud  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def run_clients(base_url, concurrency, calls, request, **params):
+    """Run ``request(session, client_id, i)`` from concurrent clients."""
+    local = threading.local()
+
+    def one_client(client_id: int):
+        local.session = requests.Session()
+        timer = Timer()
+        for i in range(calls):
+            with timer:
+                resp = request(local.session, base_url, client_id, i)
+                resp.raise_for_status()
+                # Drain the body so downloads are measured end to end
+                resp.content
+        local.session.close()
+        return timer.latencies
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = [lat for client in results for lat in client]
+    return summarize(latencies, elapsed, concurrency=concurrency, **params)
+
+
+def upsert(session, base_url, client_id, i):
+    return session.post(f"{base_url}/profile", json={
+        "id": f"bench-{client_id}-{i % 50}",
+        "name": f"Bench {i}",
+        "email": "bench@example.com",
+        "updated_at": int(time.time()),
+    })
+
+
+def batch_upsert(session, base_url, client_id, i, size=50):
+    now = int(time.time())
+    return session.post(f"{base_url}/profiles/batch", json=[
+        {"id": f"bench-{client_id}-{n}", "name": f"Bench {i}",
+         "updated_at": now}
+        for n in range(size)
+    ])
+
+
+def latest_model(session, base_url, client_id, i):
+    return session.get(f"{base_url}/model/latest")
+
+
+def print_row(key, row):
+    print(
+        f"{key:36} {row['ops_per_sec']:>10} req/s "
+        f"p50 {row['p50_ms']} ms p99 {row['p99_ms']} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+
+    calls = 30 if args.quick else args.calls
+    levels = (1, 4) if args.quick else (1, 4, 16)
+    sizes = (1,) if args.quick else (1, 16, 64)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cloud.MODEL_PATH = Path(tmp) / "model.bin"
+        base_url, stop = serve_app(cloud.app)
+        try:
+            for concurrency in levels:
+                key = f"profile_upsert/c{concurrency}"
+                results[key] = run_clients(
+                    base_url, concurrency, calls, upsert
+                )
+                print_row(key, results[key])
+
+                key = f"profiles_batch50/c{concurrency}"
+                results[key] = run_clients(
+                    base_url, concurrency, max(1, calls // 10),
+                    batch_upsert, batch=50,
+                )
+                print_row(key, results[key])
+
+            for size in sizes:
+                cloud.MODEL_PATH.write_bytes(os.urandom(size * MB))
+                for concurrency in levels:
+                    key = f"model_latest/{size}MB/c{concurrency}"
+                    results[key] = run_clients(
+                        base_url, concurrency, max(1, calls // (size * 5)),
+                        latest_model, size_mb=size,
+                    )
+                    print_row(key, results[key])
+        finally:
+            stop()
+
+    write_results("cloud", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Shared helpers for the benchmark scripts: import paths, latency
+statistics and JSON result files keyed by git commit.
+"""
+
+import json
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Service sources are plain script directories, not installed packages
+SOURCE_DIRS = [
+    ROOT / "waw-contracts" / "dist",
+    ROOT / "waw-contracts" / "src",
+    ROOT / "waw-identity" / "src",
+    ROOT / "waw-sync" / "src",
+    ROOT / "waw-sync" / "backend_mock",
+]
+
+
+def setup_paths() -> None:
+    """Make the service modules importable."""
+    for path in SOURCE_DIRS:
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+
+def git_commit() -> str:
+    """Return the current short commit hash, or "unknown"."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def summarize(
+    latencies: List[float], elapsed: float, **params
+) -> Dict[str, object]:
+    """Summarize per-operation latencies (seconds) for one run."""
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 4)
+
+    return {
+        "params": params,
+        "ops": len(ordered),
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4)
+        if ordered else 0.0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+class Timer:
+    """Collects per-operation latencies."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.latencies.append(time.perf_counter() - self._start)
+        return False
+
+
+def write_results(
+    suite: str, results: Dict[str, dict], out: Optional[Path] = None
+) -> Path:
+    """Write a suite's results as JSON and return the file path."""
+    commit = git_commit()
+    path = out or RESULTS_DIR / f"{suite}-{commit}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "suite": suite,
+        "commit": commit,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    path.write_text(json.dumps(document, indent=2) + "\n")
+    print(f"📝 Results written to {path}")
+    return path
+
+
+def serve_app(app) -> Tuple[str, Callable[[], None]]:
+    """Run an ASGI app under uvicorn on an ephemeral localhost port.
+
+    Returns the base URL and a function that stops the server.
+    """
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(app, log_level="warning", lifespan="on")
+    )
+    thread = threading.Thread(
+        target=server.run, kwargs={"sockets": [sock]}, daemon=True
+    )
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+    return f"http://127.0.0.1:{port}", stop
@@ -0,0 +1,97 @@
+"""
+Benchmark the cost of opening a keyed profile database connection in
+passphrase and raw-key modes.
+
+    python benchmarks/bench_db_open.py [--opens 200] [--kdf-iter 256000]
+
+``kdf_derivation`` is one PBKDF2 run at the configured iteration count:
+what SQLCipher pays on every passphrase-keyed open, and what raw-key
+mode pays once per process. Open timings include keying and a first
+query. Against SQLite without SQLCipher the cipher pragmas are no-ops,
+so only ``kdf_derivation`` reflects the passphrase cost there.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from bench_common import Timer, setup_paths, summarize, write_results
+
+setup_paths()
+
+import waw_storage  # noqa: E402
+
+PASSPHRASE = "bench-master-key"
+
+
+def time_opens(
+    db_path: Path, opens: int, mode: str, kdf_iter: int, salt: str
+):
+    timer = Timer()
+    for _ in range(opens):
+        with timer:
+            conn = waw_storage.sqlite3.connect(str(db_path))
+            waw_storage.apply_key(
+                conn, PASSPHRASE, mode=mode, kdf_iter=kdf_iter, salt=salt
+            )
+            conn.execute("SELECT count(*) FROM profile").fetchone()
+            conn.close()
+    return timer.latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--opens", type=int, default=200)
+    parser.add_argument("--kdf-iter", type=int, default=waw_storage.KDF_ITER)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+    opens = 20 if args.quick else args.opens
+
+    results = {}
+    derive = Timer()
+    for n in range(3 if args.quick else 10):
+        with derive:
+            waw_storage.derive_raw_key(f"{PASSPHRASE}{n}", "salt",
+                                       args.kdf_iter)
+    results["kdf_derivation"] = summarize(
+        derive.latencies, sum(derive.latencies), kdf_iter=args.kdf_iter
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("passphrase", "raw"):
+            db_path = Path(tmp) / f"{mode}.db"
+            salt = waw_storage.db_salt(db_path, create=True)
+            conn = waw_storage.sqlite3.connect(str(db_path))
+            waw_storage.apply_key(
+                conn, PASSPHRASE, mode=mode, kdf_iter=args.kdf_iter,
+                salt=salt,
+            )
+            results.setdefault("sqlcipher", waw_storage.cipher_version(conn))
+            conn.execute("CREATE TABLE profile (id TEXT PRIMARY KEY)")
+            conn.commit()
+            conn.close()
+
+            waw_storage.clear_raw_keys()
+            start = time.perf_counter()
+            latencies = time_opens(
+                db_path, opens, mode, args.kdf_iter, salt
+            )
+            results[f"open_{mode}"] = summarize(
+                latencies, time.perf_counter() - start,
+                mode=mode, kdf_iter=args.kdf_iter,
+            )
+            results[f"open_{mode}"]["first_open_ms"] = round(
+                latencies[0] * 1000, 3
+            )
+
+    print(f"SQLCipher: {results['sqlcipher'] or 'not available'}")
+    for name in ("kdf_derivation", "open_passphrase", "open_raw"):
+        print(f"{name:16} p50 {results[name]['p50_ms']:>10} ms  "
+              f"p99 {results[name]['p99_ms']:>10} ms")
+    write_results("db_open", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark IdentityService RPC throughput and latency at varying client
+concurrency, against an in-process server on a throwaway database.
+
+    python benchmarks/bench_identity.py [--mode sync|aio] [--quick]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import threading
+import time
+from concurrent import futures
+from pathlib import Path
+
+from bench_common import Timer, setup_paths, summarize, write_results
+
+setup_paths()
+
+import grpc  # noqa: E402
+
+import identity_pb2  # noqa: E402
+import identity_pb2_grpc  # noqa: E402
+import identity_srv  # noqa: E402
+
+
+def start_sync_server(workers: int):
+    """Start a grpc.server and return ``(address, stop)``."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    identity_pb2_grpc.add_IdentityServiceServicer_to_server(
+        identity_srv.IdentityService(), server
+    )
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return f"localhost:{port}", lambda: server.stop(None)
+
+
+def start_aio_server(workers: int):
+    """Start a grpc.aio server on a background event loop."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    executor = futures.ThreadPoolExecutor(max_workers=workers)
+
+    async def start():
+        server = grpc.aio.server()
+        identity_pb2_grpc.add_IdentityServiceServicer_to_server(
+            identity_srv.AsyncIdentityService(
+                identity_srv.IdentityService(), executor
+            ),
+            server,
+        )
+        port = server.add_insecure_port("localhost:0")
+        await server.start()
+        return server, port
+
+    server, port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(server.stop(None), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        executor.shutdown()
+
+    return f"localhost:{port}", stop
+
+
+def run_clients(address: str, rpc: str, concurrency: int, calls: int):
+    """Issue ``calls`` RPCs per client thread; return a summary."""
+    channel = grpc.insecure_channel(address)
+    stub = identity_pb2_grpc.IdentityServiceStub(channel)
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def one_client(client_id: int):
+        timer = Timer()
+        for i in range(calls):
+            with timer:
+                if rpc == "GetProfile":
+                    stub.GetProfile(identity_pb2.Empty())
+                else:
+                    stub.UpdateProfile(identity_pb2.ProfileDelta(
+                        profile=identity_pb2.UserProfile(
+                            id=f"bench-{client_id}",
+                            name=f"Bench {i}",
+                            email="bench@example.com",
+                            created_at=now,
+                            updated_at=now,
+                        )
+                    ))
+        return timer.latencies
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    channel.close()
+
+    latencies = [lat for client in results for lat in client]
+    return summarize(latencies, elapsed, rpc=rpc, concurrency=concurrency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--mode", choices=("sync", "aio"), default="sync")
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+
+    calls = 50 if args.quick else args.calls
+    levels = (1, 4) if args.quick else (1, 4, 16, 64)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        identity_srv.DB_PATH = Path(tmp) / "identity.db"
+        start = start_aio_server if args.mode == "aio" else start_sync_server
+        address, stop = start(args.workers)
+        results = {}
+        try:
+            for rpc in ("UpdateProfile", "GetProfile"):
+                for concurrency in levels:
+                    key = f"{args.mode}/{rpc}/c{concurrency}"
+                    results[key] = run_clients(
+                        address, rpc, concurrency, calls
+                    )
+                    print(
+                        f"{key:32} {results[key]['ops_per_sec']:>10} ops/s "
+                        f"p50 {results[key]['p50_ms']} ms "
+                        f"p99 {results[key]['p99_ms']} ms"
+                    )
+        finally:
+            stop()
+
+    write_results(f"identity-{args.mode}", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark ModelSync download + verify time across model sizes, against
+the cloud mock served by uvicorn in-process on localhost.
+
+    python benchmarks/bench_model_sync.py [--quick]
+"""
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from bench_common import (
+    Timer, serve_app, setup_paths, summarize, write_results,
+)
+
+setup_paths()
+
+import app as cloud  # noqa: E402
+import sync_loop  # noqa: E402
+from downloader import RangeDownloader  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--connections", type=int, default=4,
+        help="Connections for the ranged-download case",
+    )
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+
+    runs = 2 if args.quick else args.runs
+    sizes = (1, 8) if args.quick else (1, 16, 64, 256)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # ModelSync writes under ~/.waw; keep it inside the temp dir
+        os.environ["HOME"] = tmp
+        sync_loop.STATE_PATH = Path(tmp) / ".waw" / "state.db"
+        local_model = Path(tmp) / ".waw" / "models" / "model.bin"
+        cloud.MODEL_PATH = Path(tmp) / "served-model.bin"
+        base_url, stop = serve_app(cloud.app)
+        # One stream always, and byte ranges over pooled connections
+        syncer = sync_loop.ModelSync(
+            base_url, RangeDownloader(threshold=2 ** 62)
+        )
+        ranged = sync_loop.ModelSync(
+            base_url, RangeDownloader(args.connections, threshold=0)
+        )
+        try:
+            for size in sizes:
+                cloud.MODEL_PATH.write_bytes(os.urandom(size * MB))
+
+                download = Timer()
+                for _ in range(runs):
+                    local_model.unlink(missing_ok=True)
+                    with download:
+                        syncer.sync_model()
+                    assert local_model.stat().st_size == size * MB
+                key = f"download_verify/{size}MB"
+                results[key] = summarize(
+                    download.latencies, sum(download.latencies),
+                    size_mb=size,
+                )
+                results[key]["mb_per_sec"] = round(
+                    size * runs / sum(download.latencies), 2
+                )
+
+                fetched = Timer()
+                for _ in range(runs):
+                    local_model.unlink(missing_ok=True)
+                    with fetched:
+                        ranged.sync_model()
+                    assert local_model.stat().st_size == size * MB
+                key = f"download_ranged/{size}MB"
+                results[key] = summarize(
+                    fetched.latencies, sum(fetched.latencies),
+                    size_mb=size, connections=args.connections,
+                )
+                results[key]["mb_per_sec"] = round(
+                    size * runs / sum(fetched.latencies), 2
+                )
+
+                # Model already current: header check + cached fingerprint
+                current = Timer()
+                for _ in range(runs):
+                    with current:
+                        syncer.sync_model()
+                key = f"up_to_date/{size}MB"
+                results[key] = summarize(
+                    current.latencies, sum(current.latencies), size_mb=size
+                )
+
+                print(
+                    f"{size:>4} MB  download+verify "
+                    f"{results[f'download_verify/{size}MB']['p50_ms']} ms "
+                    f"({results[f'download_verify/{size}MB']['mb_per_sec']}"
+                    f" MB/s)  ranged "
+                    f"{results[f'download_ranged/{size}MB']['mb_per_sec']}"
+                    f" MB/s  up-to-date {results[key]['p50_ms']} ms"
+                )
+        finally:
+            stop()
+
+    write_results("model_sync", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark cold-start time of the sync loop module and the profile CLI
+scripts, measured as wall time of fresh interpreter processes.
+
+    python benchmarks/bench_startup.py [--runs 20]
+
+Each case is compared against a bare ``python -c pass`` baseline, so
+``import_ms`` is the cost attributable to our own start-up path.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from bench_common import ROOT, SOURCE_DIRS, summarize, write_results
+
+SCRIPTS = ROOT / "waw-identity" / "scripts"
+
+CASES = {
+    "python_baseline": ["-c", "pass"],
+    "sync_loop_import": ["-c", "import sync_loop"],
+    "edit_profile_help": [str(SCRIPTS / "edit_profile.py"), "--help"],
+    "get_profile_help": [str(SCRIPTS / "get_profile.py"), "--help"],
+    # What the first real RPC pays on top of start-up
+    "grpc_stubs_import": ["-c", "import identity_pb2_grpc"],
+}
+
+
+def time_case(argv, runs, env):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *argv],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+    runs = 5 if args.quick else args.runs
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(str(p) for p in SOURCE_DIRS)
+    env["PYTHONDONTWRITEBYTECODE"] = "0"
+
+    results = {}
+    for name, argv in CASES.items():
+        # One untimed run warms the bytecode and OS file caches
+        time_case(argv, 1, env)
+        latencies = time_case(argv, runs, env)
+        results[name] = summarize(latencies, sum(latencies), argv=argv)
+
+    baseline = results["python_baseline"]["p50_ms"]
+    for name, row in results.items():
+        row["import_ms"] = round(row["p50_ms"] - baseline, 2)
+        print(f"{name:20} p50 {row['p50_ms']:>8} ms  "
+              f"(+{row['import_ms']} ms over bare python)")
+
+    write_results("startup", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
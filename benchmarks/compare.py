@@ -0,0 +1,53 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python benchmarks/compare.py results/cloud-abc123.json \\
+        results/cloud-def456.json [--threshold 10]
+
+Exits non-zero when any shared case lost more than ``--threshold``
+percent throughput or gained that much p99 latency.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def pct_change(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare benchmark runs")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    base = json.loads(args.baseline.read_text())
+    cand = json.loads(args.candidate.read_text())
+    print(f"{base['suite']}: {base['commit']} → {cand['commit']}")
+
+    regressions = 0
+    for key in sorted(set(base["results"]) & set(cand["results"])):
+        old, new = base["results"][key], cand["results"][key]
+        # Skip run metadata such as fleet config or bandwidth totals
+        if not all(isinstance(r, dict) and "p99_ms" in r for r in (old, new)):
+            continue
+        ops = pct_change(old["ops_per_sec"], new["ops_per_sec"])
+        p99 = pct_change(old["p99_ms"], new["p99_ms"])
+        flag = ""
+        if ops < -args.threshold or p99 > args.threshold:
+            flag = "  ❌ regression"
+            regressions += 1
+        print(
+            f"{key:36} ops/s {old['ops_per_sec']:>10} → "
+            f"{new['ops_per_sec']:>10} ({ops:+.1f}%)  p99 "
+            f"{old['p99_ms']} → {new['p99_ms']} ms ({p99:+.1f}%){flag}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Simulate a fleet of sync clients against the cloud mock.
+
+Each virtual client runs the ProfileSync/ModelSync cycle on its own
+jittered schedule: push a batched change with probability ``--churn``,
+pull its profile with ``since``, and check /model/latest every
+``--model-interval`` seconds, downloading only when the checksum header
+changes. A release task publishes ``--releases`` new models during the
+run. Server-side latency comes from the Server-Timing header.
+
+    python benchmarks/fleet_sim.py --clients 2000 --duration 60
+
+The cloud mock runs in a separate process on localhost unless ``--url``
+points at an already running instance (model releases are then skipped).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import socket
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench_common import setup_paths, summarize, write_results
+
+MB = 1024 * 1024
+SERVER_TIMING = re.compile(r"dur=([\d.]+)")
+
+
+# ─── Cloud process ─────────────────────────────────────────────────────────
+
+def _run_cloud(sock: socket.socket, model_path: str) -> None:
+    setup_paths()
+    import uvicorn
+
+    import app as cloud
+
+    cloud.MODEL_PATH = Path(model_path)
+    uvicorn.Server(
+        uvicorn.Config(cloud.app, log_level="warning", lifespan="on")
+    ).run(sockets=[sock])
+
+
+def start_cloud(model_path: Path):
+    """Start the cloud mock in a child process; return ``(url, proc)``."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    proc = multiprocessing.get_context("fork").Process(
+        target=_run_cloud, args=(sock, str(model_path)), daemon=True
+    )
+    proc.start()
+    sock.close()
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(f"{url}/metrics", timeout=1)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    return url, proc
+
+
+def publish_model(model_path: Path, size: int) -> None:
+    """Atomically replace the served model with fresh random bytes."""
+    tmp = model_path.with_suffix(".tmp")
+    tmp.write_bytes(os.urandom(size))
+    os.replace(tmp, model_path)
+
+
+# ─── Measurements ──────────────────────────────────────────────────────────
+
+class FleetStats:
+    """Per-endpoint latencies, statuses and byte counts."""
+
+    def __init__(self):
+        self.server: Dict[str, List[float]] = defaultdict(list)
+        self.client: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+        self.bytes_in: Counter = Counter()
+        self.bytes_out: Counter = Counter()
+
+    def record(
+        self,
+        endpoint: str,
+        resp: Optional[httpx.Response],
+        elapsed: float,
+        sent: int = 0,
+        received: int = 0,
+    ) -> None:
+        self.client[endpoint].append(elapsed)
+        self.bytes_out[endpoint] += sent
+        self.bytes_in[endpoint] += received
+        if resp is None:
+            self.errors[endpoint] += 1
+            self.status[endpoint]["error"] += 1
+            return
+        self.status[endpoint][resp.status_code] += 1
+        if resp.status_code >= 500:
+            self.errors[endpoint] += 1
+        match = SERVER_TIMING.search(resp.headers.get("server-timing", ""))
+        if match:
+            self.server[endpoint].append(float(match.group(1)) / 1000)
+
+    def report(self, duration: float) -> Dict[str, dict]:
+        results = {}
+        for endpoint in sorted(self.client):
+            requests = len(self.client[endpoint])
+            server = summarize(self.server[endpoint], duration)
+            client = summarize(self.client[endpoint], duration)
+            results[endpoint] = {
+                "requests": requests,
+                "ops_per_sec": client["ops_per_sec"],
+                "error_rate": round(self.errors[endpoint] / requests, 4),
+                "status": {
+                    str(k): v for k, v in self.status[endpoint].items()
+                },
+                "server_p50_ms": server["p50_ms"],
+                "server_p95_ms": server["p95_ms"],
+                "server_p99_ms": server["p99_ms"],
+                "p50_ms": client["p50_ms"],
+                "p95_ms": client["p95_ms"],
+                "p99_ms": client["p99_ms"],
+                "mb_in": round(self.bytes_in[endpoint] / MB, 3),
+                "mb_out": round(self.bytes_out[endpoint] / MB, 3),
+            }
+        total_in = sum(self.bytes_in.values()) / MB
+        total_out = sum(self.bytes_out.values()) / MB
+        results["bandwidth"] = {
+            "mb_in_per_sec": round(total_in / duration, 3),
+            "mb_out_per_sec": round(total_out / duration, 3),
+        }
+        return results
+
+
+# ─── Virtual clients ───────────────────────────────────────────────────────
+
+async def push(client, stats, profile_id, rng) -> None:
+    """ProfileSync.flush: one batched partial upsert."""
+    body = json.dumps([{
+        "id": profile_id,
+        "name": f"User {rng.randrange(10 ** 6)}",
+        "updated_at": int(time.time()),
+    }]).encode()
+    start = time.perf_counter()
+    try:
+        resp = await client.post(
+            "/profiles/batch",
+            content=body,
+            headers={"Content-Type": "application/json"},
+        )
+    except httpx.HTTPError:
+        resp = None
+    stats.record(
+        "push", resp, time.perf_counter() - start, len(body),
+        len(resp.content) if resp is not None else 0,
+    )
+
+
+async def pull(client, stats, profile_id, since) -> Optional[int]:
+    """ProfilePull.pull_profile: conditional GET; return the new cursor."""
+    params = {"since": since} if since is not None else None
+    start = time.perf_counter()
+    try:
+        resp = await client.get(f"/profile/{profile_id}", params=params)
+    except httpx.HTTPError:
+        resp = None
+    stats.record(
+        "pull", resp, time.perf_counter() - start, 0,
+        len(resp.content) if resp is not None else 0,
+    )
+    if resp is not None and resp.status_code == 200:
+        return resp.json().get("updated_at", since)
+    return since
+
+
+async def check_model(client, stats, known_sha) -> Optional[str]:
+    """ModelSync.sync_model: download only when the checksum changed."""
+    start = time.perf_counter()
+    received = 0
+    try:
+        async with client.stream("GET", "/model/latest") as resp:
+            sha = resp.headers.get("x-model-sha256")
+            if resp.status_code == 200 and sha != known_sha:
+                async for chunk in resp.aiter_bytes():
+                    received += len(chunk)
+                known_sha = sha
+    except httpx.HTTPError:
+        resp = None
+    stats.record(
+        "model", resp, time.perf_counter() - start, 0, received
+    )
+    if received:
+        stats.record("model_download", resp, time.perf_counter() - start)
+    return known_sha
+
+
+async def virtual_client(
+    n: int, client: httpx.AsyncClient, stats: FleetStats, args, deadline
+) -> None:
+    rng = random.Random(args.seed + n)
+    loop = asyncio.get_running_loop()
+    profile_id = f"fleet-{n}"
+    since = None
+    model_sha = None
+
+    # Stagger start-up like a fleet that was not booted in lockstep
+    await asyncio.sleep(rng.uniform(0, args.poll_interval))
+    next_model = loop.time()
+    while loop.time() < deadline:
+        if rng.random() < args.churn:
+            await push(client, stats, profile_id, rng)
+        since = await pull(client, stats, profile_id, since)
+        if loop.time() >= next_model:
+            model_sha = await check_model(client, stats, model_sha)
+            next_model = loop.time() + args.model_interval
+        await asyncio.sleep(args.poll_interval * rng.uniform(0.8, 1.2))
+
+
+async def release_models(model_path: Path, args, deadline) -> None:
+    loop = asyncio.get_running_loop()
+    gap = args.duration / (args.releases + 1)
+    while loop.time() + gap < deadline:
+        await asyncio.sleep(gap)
+        await asyncio.to_thread(
+            publish_model, model_path, int(args.model_mb * MB)
+        )
+        print("🚀 Released a new model")
+
+
+async def run_fleet(url: str, model_path: Optional[Path], args) -> dict:
+    stats = FleetStats()
+    limits = httpx.Limits(
+        max_connections=args.connections,
+        max_keepalive_connections=args.connections,
+    )
+    timeout = httpx.Timeout(args.timeout, pool=None)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + args.duration
+    start = time.perf_counter()
+    async with httpx.AsyncClient(
+        base_url=url, limits=limits, timeout=timeout
+    ) as client:
+        tasks = [
+            virtual_client(n, client, stats, args, deadline)
+            for n in range(args.clients)
+        ]
+        if model_path is not None and args.releases:
+            tasks.append(release_models(model_path, args, deadline))
+        await asyncio.gather(*tasks)
+    return stats.report(time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Simulate many sync clients against the cloud mock"
+    )
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--churn", type=float, default=0.2,
+                        help="chance a client pushes a change per cycle")
+    parser.add_argument("--model-interval", type=float, default=30.0)
+    parser.add_argument("--model-mb", type=float, default=4.0)
+    parser.add_argument("--releases", type=int, default=1,
+                        help="model releases published during the run")
+    parser.add_argument("--connections", type=int, default=256,
+                        help="cap on concurrent sockets to the server")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="use a running cloud mock instead")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = None
+        proc = None
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            model_path = Path(tmp) / "model.bin"
+            publish_model(model_path, int(args.model_mb * MB))
+            url, proc = start_cloud(model_path)
+        try:
+            results = asyncio.run(run_fleet(url, model_path, args))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.join()
+
+    for endpoint, row in results.items():
+        if endpoint == "bandwidth":
+            continue
+        print(
+            f"{endpoint:15} {row['requests']:>8} req "
+            f"{row['error_rate'] * 100:5.2f}% err  server p50/p95/p99 "
+            f"{row['server_p50_ms']}/{row['server_p95_ms']}/"
+            f"{row['server_p99_ms']} ms  client p99 {row['p99_ms']} ms"
+        )
+    print(
+        f"bandwidth: {results['bandwidth']['mb_in_per_sec']} MB/s down, "
+        f"{results['bandwidth']['mb_out_per_sec']} MB/s up"
+    )
+    results["config"] = {
+        key: value for key, value in vars(args).items() if key != "out"
+    }
+    write_results("fleet", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Simulate one site of sync clients sharing a model release over the LAN
+cache.
+
+Each client is a separate process with its own home directory, running
+ModelSync with a LanCache against a shared cloud mock. All clients
+discover the release at the same moment; the report shows how many
+fetched it from the cloud and how many from LAN peers. ``--cloud-rate``
+throttles the cloud link (MB/s) to mimic a slow WAN.
+
+    python benchmarks/lan_sim.py --clients 8 --model-mb 32
+
+Clients announce to each other over unicast UDP on localhost, or over
+the ``LAN_CACHE_GROUP`` multicast group with ``--multicast``.
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from bench_common import setup_paths, summarize, write_results
+from fleet_sim import MB, publish_model, start_cloud
+
+
+def free_udp_ports(count: int) -> List[int]:
+    socks = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        socks.append(sock)
+    ports = [sock.getsockname()[1] for sock in socks]
+    for sock in socks:
+        sock.close()
+    return ports
+
+
+def run_client(
+    index: int, url: str, sha: str, home: str, ports: List[int],
+    args, start, finished, results,
+) -> None:
+    setup_paths()
+    os.environ["HOME"] = home
+    import lan_cache
+    import sync_loop
+    from downloader import BandwidthPolicy, RangeDownloader
+
+    sync_loop.STATE_PATH = Path(home) / ".waw" / "state.db"
+    model = Path(home) / ".waw" / "models" / "model.bin"
+    if args.multicast:
+        lan = lan_cache.LanCache(
+            group=lan_cache.GROUP, peers=[], interval=1.0,
+            wait_seconds=args.wait, fetch_wait_seconds=60,
+        )
+    else:
+        peers: List[Tuple[str, int]] = [
+            ("127.0.0.1", port) for i, port in enumerate(ports) if i != index
+        ]
+        lan = lan_cache.LanCache(
+            group=None, peers=peers, announce_port=ports[index],
+            interval=1.0, wait_seconds=args.wait, fetch_wait_seconds=60,
+        )
+    downloader = RangeDownloader(threshold=0, policy=BandwidthPolicy(
+        max_rate=int(args.cloud_rate * MB), adaptive=False,
+    ))
+    m_sync = sync_loop.ModelSync(url, downloader, lan=lan.start())
+
+    start.wait()
+    began = time.perf_counter()
+    while sync_loop.FileManager.get_local_model_sha(model) != sha:
+        m_sync.sync_model()
+    elapsed = time.perf_counter() - began
+    lan_bytes = sync_loop.MODEL_LAN_BYTES.value()
+    results.put({
+        "seconds": elapsed,
+        "lan_bytes": lan_bytes,
+        "cloud_bytes": sync_loop.MODEL_DOWNLOAD_BYTES.value() - lan_bytes,
+    })
+    # Keep serving until every client has the model
+    finished.wait()
+    lan.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Simulate a site of sync clients sharing a model"
+    )
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--model-mb", type=float, default=32.0)
+    parser.add_argument("--cloud-rate", type=float, default=0.0,
+                        help="cloud download cap per client in MB/s")
+    parser.add_argument("--wait", type=float, default=2.0,
+                        help="LAN_CACHE_WAIT for the clients")
+    parser.add_argument("--multicast", action="store_true")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = Path(tmp) / "model.bin"
+        publish_model(model_path, int(args.model_mb * MB))
+        sha = hashlib.sha256(model_path.read_bytes()).hexdigest()
+        url, cloud = start_cloud(model_path)
+
+        ports = free_udp_ports(args.clients)
+        start, finished = ctx.Event(), ctx.Event()
+        results = ctx.Queue()
+        clients = []
+        for index in range(args.clients):
+            home = Path(tmp) / f"client-{index}"
+            home.mkdir()
+            proc = ctx.Process(target=run_client, args=(
+                index, url, sha, str(home), ports, args,
+                start, finished, results,
+            ))
+            proc.start()
+            clients.append(proc)
+        # Give the caches time to find each other before the release
+        time.sleep(1.5)
+        start.set()
+        rows = [results.get(timeout=600) for _ in clients]
+        finished.set()
+        for proc in clients:
+            proc.join()
+        cloud.terminate()
+        cloud.join()
+
+    size = int(args.model_mb * MB)
+    from_cloud = sum(row["cloud_bytes"] for row in rows)
+    from_lan = sum(row["lan_bytes"] for row in rows)
+    longest = max(row["seconds"] for row in rows)
+    report = {
+        "time_to_model": summarize(
+            [row["seconds"] for row in rows], longest
+        ),
+        "bytes": {
+            "cloud": from_cloud,
+            "lan": from_lan,
+            "cloud_copies": round(from_cloud / size, 2),
+        },
+        "config": {
+            key: value for key, value in vars(args).items() if key != "out"
+        },
+    }
+    print(
+        f"{args.clients} clients: {report['bytes']['cloud_copies']} model "
+        f"copies from the cloud, {round(from_lan / size, 2)} from LAN "
+        f"peers; time to model p50/max "
+        f"{report['time_to_model']['p50_ms'] / 1000:.2f}/{longest:.2f} s"
+    )
+    write_results("lan", report, args.out)
+
+
+if __name__ == "__main__":
+    main()
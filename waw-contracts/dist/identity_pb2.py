@@ -13,21 +13,32 @@ from google.protobuf.internal import builder as _builder
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0eidentity.proto\x12\x0fwaw.identity.v0\"m\n\x0bUserProfile\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\r\n\x05phone\x18\x04 \x01(\t\x12\x12\n\ncreated_at\x18\x05 \x01(\t\x12\x12\n\nupdated_at\x18\x06 \x01(\t\"\x07\n\x05\x45mpty\"=\n\x0cProfileDelta\x12-\n\x07profile\x18\x01 \x01(\x0b\x32\x1c.waw.identity.v0.UserProfile2\xea\x01\n\x0fIdentityService\x12\x42\n\nGetProfile\x12\x16.waw.identity.v0.Empty\x1a\x1c.waw.identity.v0.UserProfile\x12L\n\rUpdateProfile\x12\x1d.waw.identity.v0.ProfileDelta\x1a\x1c.waw.identity.v0.UserProfile\x12\x45\n\rDeleteProfile\x12\x1c.waw.identity.v0.UserProfile\x1a\x16.waw.identity.v0.Emptyb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0eidentity.proto\x12\x0fwaw.identity.v0\x1a google/protobuf/field_mask.proto\"m\n\x0bUserProfile\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\r\n\x05phone\x18\x04 \x01(\t\x12\x12\n\ncreated_at\x18\x05 \x01(\t\x12\x12\n\nupdated_at\x18\x06 \x01(\t\"\x07\n\x05\x45mpty\"n\n\x0cProfileDelta\x12-\n\x07profile\x18\x01 \x01(\x0b\x32\x1c.waw.identity.v0.UserProfile\x12/\n\x0bupdate_mask\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"S\n\x13ListProfilesRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\x12\x15\n\rupdated_since\x18\x03 \x01(\x03\"&\n\x13\x42\x61tchUpdateResponse\x12\x0f\n\x07updated\x18\x01 \x01(\x05\"\x16\n\x14WatchProfilesRequest\"\x91\x01\n\x0cProfileEvent\x12\x30\n\x04kind\x18\x01 \x01(\x0e\x32\".waw.identity.v0.ProfileEvent.Kind\x12-\n\x07profile\x18\x02 \x01(\x0b\x32\x1c.waw.identity.v0.UserProfile\" \n\x04Kind\x12\x0b\n\x07UPDATED\x10\x00\x12\x0b\n\x07\x44\x45LETED\x10\x01\x32\xf7\x03\n\x0fIdentityService\x12\x42\n\nGetProfile\x12\x16.waw.identity.v0.Empty\x1a\x1c.waw.identity.v0.UserProfile\x12L\n\rUpdateProfile\x12\x1d.waw.identity.v0.ProfileDelta\x1a\x1c.waw.identity.v0.UserProfile\x12\x45\n\rDeleteProfile\x12\x1c.waw.identity.v0.UserProfile\x1a\x16.waw.identity.v0.Empty\x12T\n\x0cListProfiles\x12$.waw.identity.v0.ListProfilesRequest\x1a\x1c.waw.identity.v0.UserProfile0\x01\x12\\\n\x13\x42\x61tchUpdateProfiles\x12\x1d.waw.identity.v0.ProfileDelta\x1a$.waw.identity.v0.BatchUpdateResponse(\x01\x12W\n\rWatchProfiles\x12%.waw.identity.v0.WatchProfilesRequest\x1a\x1d.waw.identity.v0.ProfileEvent0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'identity_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_USERPROFILE']._serialized_start=35
-  _globals['_USERPROFILE']._serialized_end=144
-  _globals['_EMPTY']._serialized_start=146
-  _globals['_EMPTY']._serialized_end=153
-  _globals['_PROFILEDELTA']._serialized_start=155
-  _globals['_PROFILEDELTA']._serialized_end=216
-  _globals['_IDENTITYSERVICE']._serialized_start=219
-  _globals['_IDENTITYSERVICE']._serialized_end=453
+  _globals['_USERPROFILE']._serialized_start=69
+  _globals['_USERPROFILE']._serialized_end=178
+  _globals['_EMPTY']._serialized_start=180
+  _globals['_EMPTY']._serialized_end=187
+  _globals['_PROFILEDELTA']._serialized_start=189
+  _globals['_PROFILEDELTA']._serialized_end=299
+  _globals['_LISTPROFILESREQUEST']._serialized_start=301
+  _globals['_LISTPROFILESREQUEST']._serialized_end=384
+  _globals['_BATCHUPDATERESPONSE']._serialized_start=386
+  _globals['_BATCHUPDATERESPONSE']._serialized_end=424
+  _globals['_WATCHPROFILESREQUEST']._serialized_start=426
+  _globals['_WATCHPROFILESREQUEST']._serialized_end=448
+  _globals['_PROFILEEVENT']._serialized_start=451
+  _globals['_PROFILEEVENT']._serialized_end=596
+  _globals['_PROFILEEVENT_KIND']._serialized_start=564
+  _globals['_PROFILEEVENT_KIND']._serialized_end=596
+  _globals['_IDENTITYSERVICE']._serialized_start=599
+  _globals['_IDENTITYSERVICE']._serialized_end=1102
 # @@protoc_insertion_point(module_scope)
@@ -55,6 +55,21 @@ class IdentityServiceStub(object):
                 request_serializer=identity__pb2.UserProfile.SerializeToString,
                 response_deserializer=identity__pb2.Empty.FromString,
                 _registered_method=True)
+        self.ListProfiles = channel.unary_stream(
+                '/waw.identity.v0.IdentityService/ListProfiles',
+                request_serializer=identity__pb2.ListProfilesRequest.SerializeToString,
+                response_deserializer=identity__pb2.UserProfile.FromString,
+                _registered_method=True)
+        self.BatchUpdateProfiles = channel.stream_unary(
+                '/waw.identity.v0.IdentityService/BatchUpdateProfiles',
+                request_serializer=identity__pb2.ProfileDelta.SerializeToString,
+                response_deserializer=identity__pb2.BatchUpdateResponse.FromString,
+                _registered_method=True)
+        self.WatchProfiles = channel.unary_stream(
+                '/waw.identity.v0.IdentityService/WatchProfiles',
+                request_serializer=identity__pb2.WatchProfilesRequest.SerializeToString,
+                response_deserializer=identity__pb2.ProfileEvent.FromString,
+                _registered_method=True)
 
 
 class IdentityServiceServicer(object):
@@ -78,6 +93,24 @@ class IdentityServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ListProfiles(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchUpdateProfiles(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchProfiles(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_IdentityServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -96,6 +129,21 @@ def add_IdentityServiceServicer_to_server(servicer, server):
                     request_deserializer=identity__pb2.UserProfile.FromString,
                     response_serializer=identity__pb2.Empty.SerializeToString,
             ),
+            'ListProfiles': grpc.unary_stream_rpc_method_handler(
+                    servicer.ListProfiles,
+                    request_deserializer=identity__pb2.ListProfilesRequest.FromString,
+                    response_serializer=identity__pb2.UserProfile.SerializeToString,
+            ),
+            'BatchUpdateProfiles': grpc.stream_unary_rpc_method_handler(
+                    servicer.BatchUpdateProfiles,
+                    request_deserializer=identity__pb2.ProfileDelta.FromString,
+                    response_serializer=identity__pb2.BatchUpdateResponse.SerializeToString,
+            ),
+            'WatchProfiles': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchProfiles,
+                    request_deserializer=identity__pb2.WatchProfilesRequest.FromString,
+                    response_serializer=identity__pb2.ProfileEvent.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'waw.identity.v0.IdentityService', rpc_method_handlers)
@@ -187,3 +235,84 @@ class IdentityService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ListProfiles(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/waw.identity.v0.IdentityService/ListProfiles',
+            identity__pb2.ListProfilesRequest.SerializeToString,
+            identity__pb2.UserProfile.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchUpdateProfiles(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/waw.identity.v0.IdentityService/BatchUpdateProfiles',
+            identity__pb2.ProfileDelta.SerializeToString,
+            identity__pb2.BatchUpdateResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchProfiles(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/waw.identity.v0.IdentityService/WatchProfiles',
+            identity__pb2.WatchProfilesRequest.SerializeToString,
+            identity__pb2.ProfileEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,56 @@
+"""
+Deferred imports for start-up sensitive entry points (the sync loop and
+the profile CLI scripts).
+
+``requests = lazy_import("requests")`` binds a placeholder module that
+performs the real import on first attribute access, so code paths that
+never touch it never pay for it. Modules that are already imported are
+returned as is.
+"""
+
+import importlib
+import sys
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Placeholder that imports the named module on first use.
+
+    Attribute reads are forwarded to the real module; attributes set on
+    the placeholder (e.g. by test monkeypatching) shadow the real ones
+    for code that goes through the placeholder.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self._lazy_lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_module"] else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Return ``name`` if already imported, else a ``LazyModule``."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
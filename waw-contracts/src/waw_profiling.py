@@ -0,0 +1,206 @@
+"""
+Opt-in profiling of slow operations, shared by the identity, sync and
+cloud services.
+
+Set ``WAW_PROFILE=1`` (or send SIGUSR2 to toggle at runtime) and every
+sampled operation wrapped with ``profiled`` runs under cProfile. Those
+slower than ``WAW_PROFILE_THRESHOLD`` seconds are written to
+``WAW_PROFILE_DIR`` as a ``.prof`` file (for ``pstats``/snakeviz) plus a
+``.txt`` summary with the hottest functions and, with
+``WAW_PROFILE_MEMORY=1``, the largest live tracemalloc allocations. Only
+the newest ``WAW_PROFILE_KEEP`` captures are kept.
+
+When profiling is off a wrapped call costs one attribute check.
+"""
+
+import functools
+import io
+import logging
+import os
+import random
+import re
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+PROFILE_ENABLED = os.getenv("WAW_PROFILE", "0").lower() in ("1", "true")
+PROFILE_THRESHOLD = float(os.getenv("WAW_PROFILE_THRESHOLD", "0.5"))
+PROFILE_SAMPLE_RATE = float(os.getenv("WAW_PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_DIR = Path(
+    os.getenv("WAW_PROFILE_DIR", str(Path.home() / ".waw" / "profiles"))
+)
+PROFILE_KEEP = int(os.getenv("WAW_PROFILE_KEEP", "50"))
+PROFILE_MEMORY = os.getenv("WAW_PROFILE_MEMORY", "0").lower() in ("1", "true")
+# Frames kept per tracemalloc allocation
+MEMORY_FRAMES = 5
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+log = logging.getLogger("waw.profiling")
+
+
+class Profiler:
+    """Captures cProfile (and tracemalloc) data for slow operations."""
+
+    def __init__(
+        self,
+        enabled: bool = PROFILE_ENABLED,
+        threshold: float = PROFILE_THRESHOLD,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        directory: Path = PROFILE_DIR,
+        keep: int = PROFILE_KEEP,
+        memory: bool = PROFILE_MEMORY,
+    ):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.keep = keep
+        self.memory = memory
+        self.enabled = False
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        if enabled:
+            self.enable()
+
+    def enable(self) -> None:
+        # Profiling modules are imported on first use to keep the
+        # disabled path free of their import cost
+        import tracemalloc
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_FRAMES)
+        self.enabled = True
+
+    def disable(self) -> None:
+        import tracemalloc
+
+        self.enabled = False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def toggle(self, *_signal_args) -> None:
+        """Flip profiling on or off (usable as a signal handler)."""
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        log.warning(
+            "🩺 Profiling %s", "enabled" if self.enabled else "disabled",
+            extra={"dir": str(self.directory), "threshold": self.threshold},
+        )
+
+    def run(self, name: str, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Call ``fn``, profiling it when enabled and sampled."""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        # Nested operations are already covered by the outer capture
+        if getattr(self._local, "active", False) or (
+            self.sample_rate < 1 and random.random() >= self.sample_rate
+        ):
+            return fn(*args, **kwargs)
+
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process, so a
+            # capture running on another thread wins; the call still runs
+            return fn(*args, **kwargs)
+        self._local.active = True
+        start = time.perf_counter()
+        try:
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+        finally:
+            self._local.active = False
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                try:
+                    self._save(name, elapsed, profile)
+                except OSError as e:
+                    log.warning("⚠️  Could not save profile: %s", e)
+
+    def profiled(self, name: Optional[str] = None):
+        """Decorator form of ``run``; ``name`` defaults to the qualname."""
+        def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+            label = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                return self.run(label, fn, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _save(self, name: str, elapsed: float, profile) -> Path:
+        import pstats
+        import tracemalloc
+
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+        base = self.directory / (
+            f"{stamp}-{time.time_ns() % 10 ** 9:09d}-{slug}"
+            f"-{elapsed * 1000:.0f}ms"
+        )
+
+        summary = io.StringIO()
+        summary.write(f"{name}: {elapsed * 1000:.1f} ms\n\n")
+        pstats.Stats(profile, stream=summary).sort_stats(
+            "cumulative"
+        ).print_stats(TOP_FUNCTIONS)
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            summary.write(
+                f"\ntraced memory: {current / 1024:.0f} KiB "
+                f"(peak {peak / 1024:.0f} KiB)\n"
+            )
+            snapshot = tracemalloc.take_snapshot()
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                summary.write(f"{stat}\n")
+
+        with self._write_lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(f"{base}.prof")
+            Path(f"{base}.txt").write_text(summary.getvalue())
+            self._rotate()
+        log.info(
+            "🩺 Slow operation profiled",
+            extra={"op": name, "ms": round(elapsed * 1000, 1),
+                   "path": f"{base}.prof"},
+        )
+        return Path(f"{base}.prof")
+
+    def _rotate(self) -> None:
+        captures = sorted(
+            self.directory.glob("*.prof"), key=lambda p: p.stat().st_mtime
+        )
+        for old in captures[:max(0, len(captures) - self.keep)]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".txt").unlink(missing_ok=True)
+
+    def install_signal_toggle(self, signum: Optional[int] = None) -> bool:
+        """Toggle profiling on SIGUSR2; returns False where unsupported.
+
+        Signal handlers can only be installed from the main thread.
+        """
+        signum = signum or getattr(signal, "SIGUSR2", None)
+        if signum is None:
+            return False
+        try:
+            signal.signal(signum, self.toggle)
+        except ValueError:
+            return False
+        return True
+
+
+PROFILER = Profiler()
+profiled = PROFILER.profiled
@@ -0,0 +1,56 @@
+"""
+Request coalescing for expensive calls shared by many concurrent callers
+(model hashing, upstream fetches).
+
+``flight.do(key, fn)`` runs ``fn`` unless a call for the same key is
+already running, in which case it waits for that call and returns its
+result (or raises its exception). Nothing is cached once the call ends;
+callers keep their own cache and use the flight only to refresh it.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return ``fn()``, sharing a call already running for ``key``."""
+        result, _ = self.do_shared(key, fn)
+        return result
+
+    def do_shared(
+        self, key: Hashable, fn: Callable[[], Any]
+    ) -> Tuple[Any, bool]:
+        """Like ``do``; also return whether another caller ran ``fn``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
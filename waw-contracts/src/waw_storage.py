@@ -0,0 +1,462 @@
+"""
+Keyed SQLite connections for the profile database, shared by the
+identity server, the sync loop and the admin scripts.
+
+By default the passphrase is handed to SQLCipher with ``PRAGMA key``, so
+every new connection pays the full PBKDF2 cost. With
+``WAW_DB_KEY_MODE=raw`` the passphrase is stretched once per process
+(PBKDF2-HMAC-SHA512, ``WAW_DB_KDF_ITER`` rounds) and connections are
+keyed with the cached raw key, which SQLCipher uses as is. The PBKDF2
+salt is random per database and kept in ``<db>-salt`` next to it; raw
+mode refuses an existing database without one. The two modes produce
+different keys: convert an existing database once with
+``migrate_to_raw_key`` (which creates the salt) before switching.
+
+``WAW_DB_CIPHER_PAGE_SIZE`` sets the SQLCipher page size; it must match
+the value the database was created with.
+
+Against a SQLite build without SQLCipher the cipher pragmas are no-ops.
+
+Every connection is also tuned for two processes (identity server and
+sync loop) sharing the file: WAL journaling so readers never wait for
+the writer, ``synchronous=NORMAL`` (durable at checkpoints, no fsync
+per commit), a memory-mapped read path, a larger page cache and a busy
+timeout instead of immediate "database is locked" errors. The writer
+runs a ``CheckpointScheduler`` to keep the WAL file bounded, and new
+files use ``auto_vacuum=INCREMENTAL`` so it can hand free pages back
+(``enable_auto_vacuum`` converts older files once, if
+``WAW_DB_CONVERT_AUTO_VACUUM=1``).
+
+``migrate`` brings the profile table up to the current schema
+(``PROFILE_MIGRATIONS``); both processes call it when they open the DB.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import waw_metrics
+
+KEY_MODE = os.getenv("WAW_DB_KEY_MODE", "passphrase")
+# SQLCipher 4 defaults
+KDF_ITER = int(os.getenv("WAW_DB_KDF_ITER", "256000"))
+CIPHER_PAGE_SIZE = int(os.getenv("WAW_DB_CIPHER_PAGE_SIZE", "4096"))
+RAW_KEY_BYTES = 32
+SALT_BYTES = 16
+
+JOURNAL_MODE = os.getenv("WAW_DB_JOURNAL_MODE", "WAL")
+AUTO_VACUUM = os.getenv("WAW_DB_AUTO_VACUUM", "INCREMENTAL")
+# Convert existing files to AUTO_VACUUM with a full VACUUM at start-up;
+# off by default as it rewrites the file and needs ~2x its disk space
+CONVERT_AUTO_VACUUM = os.getenv("WAW_DB_CONVERT_AUTO_VACUUM", "0") == "1"
+SYNCHRONOUS = os.getenv("WAW_DB_SYNCHRONOUS", "NORMAL")
+MMAP_SIZE = int(os.getenv("WAW_DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+# Negative values are KiB, as in PRAGMA cache_size
+CACHE_SIZE = int(os.getenv("WAW_DB_CACHE_SIZE", "-8192"))
+BUSY_TIMEOUT_MS = int(os.getenv("WAW_DB_BUSY_TIMEOUT_MS", "5000"))
+# Size the WAL is truncated back to after checkpoints
+JOURNAL_SIZE_LIMIT = int(
+    os.getenv("WAW_DB_JOURNAL_SIZE_LIMIT", str(16 * 1024 * 1024))
+)
+
+CHECKPOINT_INTERVAL = float(os.getenv("WAW_DB_CHECKPOINT_INTERVAL", "30"))
+# A WAL larger than this is checkpointed with TRUNCATE instead of PASSIVE
+WAL_MAX_BYTES = int(os.getenv("WAW_DB_WAL_MAX_BYTES", str(4 * 1024 * 1024)))
+# Seconds between incremental vacuum / optimize runs; 0 disables
+MAINTENANCE_INTERVAL = float(
+    os.getenv("WAW_DB_MAINTENANCE_INTERVAL", "3600")
+)
+VACUUM_PAGES = 256
+_AUTO_VACUUM_MODES = {"NONE": 0, "FULL": 1, "INCREMENTAL": 2}
+
+log = logging.getLogger("waw.storage")
+
+WAL_BYTES = waw_metrics.gauge(
+    "waw_db_wal_bytes",
+    "Size of the profile DB write-ahead log after the last checkpoint.",
+)
+CHECKPOINTS = waw_metrics.counter(
+    "waw_db_checkpoints_total",
+    "Profile DB WAL checkpoints run, by mode.",
+    ["mode"],
+)
+
+
+# (salt, iterations) -> (passphrase check, raw key). Only derived keys
+# are kept, one per database, never the passphrases themselves.
+_raw_keys: Dict[Tuple[str, int], Tuple[bytes, str]] = {}
+_raw_keys_lock = threading.Lock()
+
+
+def derive_raw_key(
+    passphrase: str, salt: str, iterations: int = KDF_ITER
+) -> str:
+    """Stretch ``passphrase`` into a hex raw key."""
+    return hashlib.pbkdf2_hmac(
+        "sha512",
+        passphrase.encode(),
+        salt.encode(),
+        iterations,
+        dklen=RAW_KEY_BYTES,
+    ).hex()
+
+
+def raw_key(passphrase: str, salt: str, iterations: int = KDF_ITER) -> str:
+    """Return the raw key for ``salt``, deriving it once per process."""
+    check = hmac.new(
+        salt.encode(), passphrase.encode(), hashlib.sha256
+    ).digest()
+    with _raw_keys_lock:
+        cached = _raw_keys.get((salt, iterations))
+    if cached and hmac.compare_digest(cached[0], check):
+        return cached[1]
+    key = derive_raw_key(passphrase, salt, iterations)
+    with _raw_keys_lock:
+        _raw_keys[(salt, iterations)] = (check, key)
+    return key
+
+
+def clear_raw_keys() -> None:
+    """Forget every cached raw key."""
+    with _raw_keys_lock:
+        _raw_keys.clear()
+
+
+def salt_path(db_path: Union[str, Path]) -> Path:
+    return Path(f"{db_path}-salt")
+
+
+def db_salt(db_path: Union[str, Path], create: bool = False) -> str:
+    """Return the database's PBKDF2 salt, creating it if ``create``.
+
+    Raises ``ValueError`` if there is none and ``create`` is false.
+    """
+    path = salt_path(db_path)
+    try:
+        salt = path.read_text().strip()
+    except FileNotFoundError:
+        salt = ""
+    if salt:
+        return salt
+    if not create:
+        raise ValueError(
+            f"{path} is missing: raw key mode needs a per-database salt "
+            "(convert the database with migrate_to_raw_key)"
+        )
+    salt = os.urandom(SALT_BYTES).hex()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Created by another process in the meantime
+        return db_salt(db_path)
+    with os.fdopen(fd, "w") as f:
+        f.write(salt + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return salt
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def key_pragmas(
+    master_key: str,
+    mode: str = KEY_MODE,
+    kdf_iter: int = KDF_ITER,
+    page_size: int = CIPHER_PAGE_SIZE,
+    salt: Optional[str] = None,
+) -> List[str]:
+    """Return the statements that key a fresh connection.
+
+    Raw mode needs the database's ``salt`` (see ``db_salt``).
+    """
+    if mode == "raw":
+        if not salt:
+            raise ValueError("raw key mode needs the database's salt")
+        raw = raw_key(master_key, salt, kdf_iter)
+        return [
+            f"PRAGMA key = \"x'{raw}'\";",
+            f"PRAGMA cipher_page_size = {int(page_size)};",
+        ]
+    if mode != "passphrase":
+        raise ValueError(f"Unknown WAW_DB_KEY_MODE: {mode!r}")
+    return [
+        f"PRAGMA key = {_quote(master_key)};",
+        f"PRAGMA kdf_iter = {int(kdf_iter)};",
+        f"PRAGMA cipher_page_size = {int(page_size)};",
+    ]
+
+
+def apply_key(conn: sqlite3.Connection, master_key: str, **options) -> None:
+    """Key an open connection; must run before any other statement."""
+    for statement in key_pragmas(master_key, **options):
+        conn.execute(statement)
+
+
+def tuning_pragmas() -> List[str]:
+    """Return the per-connection performance settings."""
+    return [
+        f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)};",
+        # Only honoured before the file is first written, which setting
+        # the journal mode already does
+        f"PRAGMA auto_vacuum = {AUTO_VACUUM};",
+        f"PRAGMA journal_mode = {JOURNAL_MODE};",
+        f"PRAGMA synchronous = {SYNCHRONOUS};",
+        f"PRAGMA mmap_size = {int(MMAP_SIZE)};",
+        f"PRAGMA cache_size = {int(CACHE_SIZE)};",
+        f"PRAGMA journal_size_limit = {int(JOURNAL_SIZE_LIMIT)};",
+    ]
+
+
+def connect(
+    db_path: Union[str, Path], master_key: str, **kwargs
+) -> sqlite3.Connection:
+    """Open, key and tune a connection.
+
+    ``kwargs`` go to ``sqlite3.connect``.
+    """
+    kwargs.setdefault("timeout", BUSY_TIMEOUT_MS / 1000)
+    options = {}
+    if KEY_MODE == "raw":
+        # A new database gets a fresh salt; an existing one must have it
+        options["salt"] = db_salt(
+            db_path, create=not Path(db_path).exists()
+        )
+    conn = sqlite3.connect(str(db_path), **kwargs)
+    try:
+        apply_key(conn, master_key, **options)
+        for statement in tuning_pragmas():
+            conn.execute(statement).fetchall()
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def enable_auto_vacuum(
+    conn: sqlite3.Connection, convert: Optional[bool] = None
+) -> bool:
+    """Give an existing database the configured ``auto_vacuum`` mode.
+
+    Files created before it was set need a one-time ``VACUUM``, which
+    rewrites the whole file; it only runs if ``convert`` (default:
+    ``CONVERT_AUTO_VACUUM``). Returns True if one was run.
+    """
+    wanted = _AUTO_VACUUM_MODES.get(AUTO_VACUUM.upper(), AUTO_VACUUM)
+    current = conn.execute("PRAGMA auto_vacuum;").fetchone()[0]
+    if str(current) == str(wanted):
+        return False
+    if not (CONVERT_AUTO_VACUUM if convert is None else convert):
+        log.info(
+            "🧹 DB predates auto_vacuum=%s; set "
+            "WAW_DB_CONVERT_AUTO_VACUUM=1 once to convert it", AUTO_VACUUM,
+        )
+        return False
+    log.info("🧹 Converting DB to auto_vacuum=%s (one-time VACUUM)",
+             AUTO_VACUUM)
+    conn.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM};")
+    conn.execute("VACUUM;")
+    return True
+
+
+def cipher_version(conn: sqlite3.Connection) -> str:
+    """Return the SQLCipher version, or "" for plain SQLite."""
+    row = conn.execute("PRAGMA cipher_version;").fetchone()
+    return row[0] if row else ""
+
+
+def migrate_to_raw_key(db_path: Union[str, Path], master_key: str) -> None:
+    """Re-key a passphrase-keyed database for raw-key mode."""
+    salt = db_salt(db_path, create=True)
+    conn = sqlite3.connect(str(db_path))
+    try:
+        apply_key(conn, master_key, mode="passphrase")
+        raw = raw_key(master_key, salt, KDF_ITER)
+        conn.execute(f"PRAGMA rekey = \"x'{raw}'\";")
+    finally:
+        conn.close()
+
+
+# ─── Schema ────────────────────────────────────────────────────────────────
+
+def _epoch_column(name: str, source: str) -> str:
+    # The GLOB guard keeps strftime's non-deterministic 'now' form (which
+    # generated columns reject) from failing the write
+    return (
+        f"ALTER TABLE profile ADD COLUMN {name} INTEGER GENERATED ALWAYS AS "
+        f"(CASE WHEN {source} GLOB '[0-9]*' "
+        f"THEN CAST(strftime('%s', {source}) AS INTEGER) END) VIRTUAL;"
+    )
+
+
+# ``PRAGMA user_version`` records how many of these have been applied.
+# Append new steps; never edit one that has shipped.
+PROFILE_MIGRATIONS: List[Tuple[str, ...]] = [
+    # 1: the original text-timestamp table
+    (
+        """
+        CREATE TABLE IF NOT EXISTS profile (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            phone TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        );
+        """,
+    ),
+    # 2: epoch-second timestamps, computed by SQLite from the ISO text so
+    # every writer stays consistent (naive times count as UTC, unparsable
+    # ones as NULL); an index on updated_ts for "changed since" range
+    # scans; and a row version bumped on each write
+    (
+        _epoch_column("created_ts", "created_at"),
+        _epoch_column("updated_ts", "updated_at"),
+        "ALTER TABLE profile ADD COLUMN version INTEGER NOT NULL DEFAULT 1;",
+        "CREATE INDEX IF NOT EXISTS idx_profile_updated_ts "
+        "ON profile (updated_ts);",
+    ),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(
+    conn: sqlite3.Connection,
+    migrations: Sequence[Tuple[str, ...]] = PROFILE_MIGRATIONS,
+    label: str = "Profile DB",
+) -> int:
+    """Apply pending migrations atomically; return the schema version.
+
+    Safe to call from several processes at once: the version is re-read
+    under the write lock, so each step runs exactly once.
+    """
+    if schema_version(conn) >= len(migrations):
+        return schema_version(conn)
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        version = schema_version(conn)
+        for number, statements in enumerate(
+            migrations[version:], start=version + 1
+        ):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number};")
+            log.info("🗂️  %s migrated to schema v%d", label, number)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return schema_version(conn)
+
+
+# ─── Checkpointing ─────────────────────────────────────────────────────────
+
+class CheckpointScheduler:
+    """Background WAL checkpoints and periodic light maintenance.
+
+    Runs PASSIVE checkpoints (which never block readers or the writer)
+    every ``interval`` seconds and escalates to TRUNCATE once the WAL
+    exceeds ``wal_max_bytes``. Every ``maintenance_interval`` seconds it
+    also runs ``PRAGMA optimize`` and an incremental vacuum (a no-op
+    unless the database uses ``auto_vacuum = INCREMENTAL``).
+    """
+
+    def __init__(
+        self,
+        db_path: Union[str, Path],
+        master_key: str,
+        interval: float = CHECKPOINT_INTERVAL,
+        wal_max_bytes: int = WAL_MAX_BYTES,
+        maintenance_interval: float = MAINTENANCE_INTERVAL,
+    ):
+        self.db_path = Path(db_path)
+        self.master_key = master_key
+        self.interval = interval
+        self.wal_max_bytes = wal_max_bytes
+        self.maintenance_interval = maintenance_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._since_maintenance = 0.0
+
+    @property
+    def wal_path(self) -> Path:
+        return self.db_path.with_name(self.db_path.name + "-wal")
+
+    def wal_size(self) -> int:
+        try:
+            return self.wal_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def checkpoint(self, mode: Optional[str] = None) -> tuple:
+        """Run one checkpoint; returns SQLite's (busy, log, checkpointed)."""
+        if mode is None:
+            mode = (
+                "TRUNCATE" if self.wal_size() > self.wal_max_bytes
+                else "PASSIVE"
+            )
+        if self._conn is None:
+            self._conn = connect(self.db_path, self.master_key)
+        result = self._conn.execute(
+            f"PRAGMA wal_checkpoint({mode});"
+        ).fetchone()
+        CHECKPOINTS.inc(mode=mode.lower())
+        WAL_BYTES.set(self.wal_size())
+        return tuple(result or ())
+
+    def maintain(self) -> None:
+        """Run the planner's optimize pass and an incremental vacuum."""
+        if self._conn is None:
+            self._conn = connect(self.db_path, self.master_key)
+        self._conn.execute("PRAGMA optimize;")
+        # Each step frees one page, so the statement must be exhausted
+        self._conn.execute(
+            f"PRAGMA incremental_vacuum({VACUUM_PAGES});"
+        ).fetchall()
+        self._conn.commit()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+                self._since_maintenance += self.interval
+                if self.maintenance_interval and (
+                    self._since_maintenance >= self.maintenance_interval
+                ):
+                    self._since_maintenance = 0.0
+                    self.maintain()
+            except sqlite3.Error as e:
+                log.warning("⚠️  DB checkpoint failed: %s", e)
+
+    def start(self) -> "CheckpointScheduler":
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="waw-db-checkpoint", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the thread and fold the WAL back into the database."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.checkpoint("TRUNCATE")
+        except sqlite3.Error as e:
+            log.warning("⚠️  Final DB checkpoint failed: %s", e)
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+# Add src directory to path so we can import the shared modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import waw_lazy  # noqa: E402
+
+
+def test_lazy_import_defers_until_attribute_access(monkeypatch):
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    colorsys = waw_lazy.lazy_import("colorsys")
+    assert "colorsys" not in sys.modules
+
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules
+    assert waw_lazy.lazy_import("colorsys") is sys.modules["colorsys"]
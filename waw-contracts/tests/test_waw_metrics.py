@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+# Add src directory to path so we can import the shared modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import waw_metrics  # noqa: E402
+
+
+def test_metrics_render():
+    registry = waw_metrics.Registry()
+    latency = registry.histogram("rpc_seconds", "RPC latency.", ["method"])
+    latency.observe(0.002, method="Get")
+    registry.counter("errors_total", "Errors.").inc()
+
+    text = registry.render()
+    assert 'rpc_seconds_bucket{method="Get",le="0.0025"} 1' in text
+    assert 'rpc_seconds_count{method="Get"} 1' in text
+    assert "errors_total 1" in text
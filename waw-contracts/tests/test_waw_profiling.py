@@ -0,0 +1,48 @@
+import cProfile
+import sys
+import time
+from pathlib import Path
+
+# Add src directory to path so we can import the shared modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import waw_profiling  # noqa: E402
+
+
+def test_profiler_captures_only_slow_operations(tmp_path):
+    profiler = waw_profiling.Profiler(
+        enabled=False, threshold=0.05, directory=tmp_path, keep=2
+    )
+    slow = profiler.profiled("slow op")(lambda: time.sleep(0.06) or "done")
+
+    # Off: plain call, nothing written
+    assert slow() == "done"
+    assert list(tmp_path.iterdir()) == []
+
+    profiler.enable()
+    assert profiler.run("fast", lambda: 1) == 1
+    assert list(tmp_path.iterdir()) == []
+
+    for _ in range(3):
+        slow()
+    captures = sorted(tmp_path.glob("*.prof"))
+    assert len(captures) == 2
+    assert all("slow_op" in p.name for p in captures)
+    assert "slow op:" in captures[0].with_suffix(".txt").read_text()
+
+
+def test_profiler_runs_unprofiled_when_another_capture_is_active(
+    tmp_path, monkeypatch
+):
+    class BusyProfile(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            # What Python 3.12+ raises while another thread is profiling
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(cProfile, "Profile", BusyProfile)
+    profiler = waw_profiling.Profiler(
+        enabled=True, threshold=0, directory=tmp_path
+    )
+    assert profiler.run("busy", lambda: "done") == "done"
+    assert list(tmp_path.iterdir()) == []
+    assert profiler.run("again", lambda: 2) == 2
@@ -0,0 +1,32 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add src directory to path so we can import the shared modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import waw_singleflight  # noqa: E402
+
+
+def test_single_flight_shares_one_call():
+    flight = waw_singleflight.SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return len(calls)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 5
+    # Finished calls are not cached
+    assert flight.do("k", slow) == 2
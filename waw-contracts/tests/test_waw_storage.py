@@ -0,0 +1,117 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src directory to path so we can import the shared modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import waw_storage  # noqa: E402
+
+
+def test_storage_raw_key_uses_a_salt_per_database(tmp_path, monkeypatch):
+    waw_storage.clear_raw_keys()
+    with pytest.raises(ValueError):
+        waw_storage.key_pragmas("it's secret", mode="raw", kdf_iter=10)
+    salt_a = waw_storage.db_salt(tmp_path / "a.db", create=True)
+    salt_b = waw_storage.db_salt(tmp_path / "b.db", create=True)
+    assert len(salt_a) == 32 and salt_a != salt_b
+    assert waw_storage.db_salt(tmp_path / "a.db") == salt_a
+
+    pragmas = waw_storage.key_pragmas(
+        "it's secret", mode="raw", kdf_iter=10, salt=salt_a
+    )
+    assert pragmas[0].startswith("PRAGMA key = \"x'")
+    raw = waw_storage.derive_raw_key("it's secret", salt_a, 10)
+    assert len(raw) == 64 and raw in pragmas[0]
+    # Same passphrase, other database: another key
+    assert raw not in waw_storage.key_pragmas(
+        "it's secret", mode="raw", kdf_iter=10, salt=salt_b
+    )[0]
+    # Only derived keys are cached, never the passphrase
+    assert "it's secret" not in repr(waw_storage._raw_keys)
+
+    # An existing database without a salt is refused in raw mode
+    monkeypatch.setattr(waw_storage, "KEY_MODE", "raw")
+    sqlite3.connect(tmp_path / "old.db").close()
+    with pytest.raises(ValueError):
+        waw_storage.connect(tmp_path / "old.db", "it's secret")
+    waw_storage.connect(tmp_path / "new.db", "it's secret").close()
+    assert waw_storage.salt_path(tmp_path / "new.db").exists()
+    monkeypatch.setattr(waw_storage, "KEY_MODE", "passphrase")
+
+    passphrase = waw_storage.key_pragmas("it's secret", kdf_iter=10)
+    assert passphrase[0] == "PRAGMA key = 'it''s secret';"
+    assert "PRAGMA kdf_iter = 10;" in passphrase
+
+    conn = waw_storage.connect(tmp_path / "keyed.db", "it's secret")
+    assert isinstance(conn, sqlite3.Connection)
+    conn.close()
+
+
+def test_storage_uses_wal_and_checkpoints_it(tmp_path):
+    db_path = tmp_path / "wal.db"
+    conn = waw_storage.connect(db_path, "key")
+    assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous;").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2
+    conn.execute("CREATE TABLE t (v TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?)", [("x" * 512,)] * 200)
+    conn.commit()
+
+    scheduler = waw_storage.CheckpointScheduler(
+        db_path, "key", interval=0, wal_max_bytes=1
+    )
+    assert scheduler.wal_size() > 0
+    busy, _, _ = scheduler.checkpoint()
+    assert busy == 0
+    assert scheduler.wal_size() == 0
+    scheduler.maintain()
+    scheduler.stop()
+    conn.close()
+
+
+def test_storage_converts_old_files_to_incremental_vacuum(tmp_path):
+    db_path = tmp_path / "old.db"
+    old = sqlite3.connect(db_path)
+    old.execute("CREATE TABLE t (v TEXT)")
+    old.commit()
+    old.close()
+
+    conn = waw_storage.connect(db_path, "key")
+    assert conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 0
+    # Rewriting the file is opt-in
+    assert not waw_storage.enable_auto_vacuum(conn)
+    assert conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 0
+    assert waw_storage.enable_auto_vacuum(conn, convert=True)
+    assert conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2
+    assert not waw_storage.enable_auto_vacuum(conn, convert=True)
+    conn.close()
+
+
+def test_storage_migrates_legacy_profile_table(tmp_path):
+    conn = waw_storage.connect(tmp_path / "legacy.db", "key")
+    conn.execute(waw_storage.PROFILE_MIGRATIONS[0][0])
+    conn.execute(
+        "INSERT INTO profile VALUES "
+        "('a', 'A', '', '', '2025-01-01T00:00:00', '2025-01-01T00:00:00Z')"
+    )
+    conn.commit()
+
+    assert waw_storage.migrate(conn) == len(waw_storage.PROFILE_MIGRATIONS)
+    assert waw_storage.migrate(conn) == len(waw_storage.PROFILE_MIGRATIONS)
+    conn.execute(
+        "INSERT INTO profile (id, updated_at) VALUES ('b', 'not a date')"
+    )
+    rows = conn.execute(
+        "SELECT id, created_ts, updated_ts, version FROM profile ORDER BY id"
+    ).fetchall()
+    assert rows == [("a", 1735689600, 1735689600, 1), ("b", None, None, 1)]
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM profile WHERE updated_ts > ?",
+        (0,),
+    ).fetchall()
+    assert "idx_profile_updated_ts" in plan[0][-1]
+    conn.close()
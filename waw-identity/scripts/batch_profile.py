@@ -0,0 +1,297 @@
+"""
+CLI tool to run many profile commands over one IdentityService channel.
+
+Commands are JSON lines read from stdin or ``--file``; one JSON result
+line is printed per command, in input order::
+
+    {"op": "edit", "id": "u1", "name": "Ada"}
+    {"op": "set", "id": "u2", "name": "Bob", "email": "bob@example.com"}
+    {"op": "delete", "id": "u3"}
+    {"op": "get"}
+    {"op": "list"}
+    {"op": "list", "updated_since": 1767225600}
+
+``edit`` updates only the given fields (creating the profile if it does
+not exist, like edit_profile.py); ``set`` replaces the whole profile.
+Writes are pipelined up to ``--window`` RPCs in flight. A write waits for
+an earlier in-flight write to the same id, and ``get``/``list`` wait for
+all earlier writes, so results match running the commands one by one.
+Reading from a terminal runs each command to completion before
+prompting for the next.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import deque
+from typing import Callable, Deque, Iterable, Optional, TextIO
+
+from edit_profile import (
+    GRPC_SERVER,
+    ProfileUpdater,
+    build_patch,
+    create_or_update_profile,
+    field_mask_pb2,
+    grpc,
+    identity_pb2,
+)
+
+PROFILE_FIELDS = ("id", "name", "email", "phone", "created_at", "updated_at")
+WRITE_OPS = ("edit", "set", "delete")
+READ_OPS = ("get", "list")
+
+
+def profile_to_dict(profile: identity_pb2.UserProfile) -> dict:
+    """Return the profile's fields as a plain dict."""
+    return {name: getattr(profile, name) for name in PROFILE_FIELDS}
+
+
+def error_result(error: Exception) -> dict:
+    """Describe a failed command."""
+    if isinstance(error, grpc.RpcError):
+        return {
+            "ok": False,
+            "code": error.code().name,
+            "error": error.details(),
+        }
+    return {"ok": False, "code": "INVALID_ARGUMENT", "error": str(error)}
+
+
+class Pending:
+    """One submitted command whose result may not be ready yet."""
+
+    def __init__(self, line: int, key: Optional[str], resolve: Callable):
+        self.line = line
+        self.key = key
+        self._resolve = resolve
+
+    def result(self) -> dict:
+        try:
+            result = self._resolve()
+        except (grpc.RpcError, TypeError, ValueError) as error:
+            result = error_result(error)
+        return {"line": self.line, **result}
+
+
+class BatchRunner:
+    """Submits commands over one channel with a bounded in-flight window."""
+
+    def __init__(self, updater: ProfileUpdater, window: int, out: TextIO):
+        self.updater = updater
+        self.stub = updater.stub
+        self.window = max(1, window)
+        self.out = out
+        self.in_flight: Deque[Pending] = deque()
+        self.failures = 0
+
+    # ─── Output ────────────────────────────────────────────────────────
+
+    def _emit_oldest(self) -> Pending:
+        pending = self.in_flight.popleft()
+        result = pending.result()
+        if not result.get("ok"):
+            self.failures += 1
+        self.out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        return pending
+
+    def drain(self) -> None:
+        """Wait for and print every in-flight command."""
+        while self.in_flight:
+            self._emit_oldest()
+        self.out.flush()
+
+    def _wait_for_key(self, key: str) -> None:
+        # Results are printed in order, so settling the newest write to
+        # ``key`` means settling everything submitted before it
+        while any(p.key == key for p in self.in_flight):
+            self._emit_oldest()
+
+    # ─── Commands ──────────────────────────────────────────────────────
+
+    def submit(self, line: int, command: dict) -> None:
+        op = command.get("op")
+        if op in READ_OPS:
+            self.drain()
+        elif op in WRITE_OPS and command.get("id"):
+            self._wait_for_key(command["id"])
+        elif op in WRITE_OPS:
+            # An empty id targets "the" profile; order it like a read
+            self.drain()
+
+        while len(self.in_flight) >= self.window:
+            self._emit_oldest()
+
+        handler = getattr(self, f"_op_{op}", None) if op in (
+            WRITE_OPS + READ_OPS
+        ) else None
+        if handler is None:
+            self.reject(line, f"unknown op: {op!r}")
+            return
+        try:
+            resolve = handler(command)
+        except (grpc.RpcError, TypeError, ValueError) as error:
+            # Wrong field types (e.g. a number for a name) fail when the
+            # request is built; they get a result line like any other
+            resolve = self._failed(error)
+        self.in_flight.append(Pending(line, command.get("id"), resolve))
+
+    def reject(self, line: int, message: str) -> None:
+        """Queue an error result for a command that cannot be sent."""
+        self.in_flight.append(
+            Pending(line, None, self._failed(ValueError(message)))
+        )
+
+    @staticmethod
+    def _failed(error: Exception) -> Callable[[], dict]:
+        def resolve():
+            raise error
+        return resolve
+
+    def _op_get(self, command: dict):
+        future = self.stub.GetProfile.future(identity_pb2.Empty())
+        return lambda: {"ok": True, "profile": profile_to_dict(
+            future.result()
+        )}
+
+    def _op_list(self, command: dict):
+        request = identity_pb2.ListProfilesRequest(
+            page_size=int(command.get("page_size", 0)),
+            updated_since=int(command.get("updated_since", 0)),
+        )
+        # Starting the stream does not wait for it; it is read when the
+        # result is due, like the futures of the other ops
+        call = self.stub.ListProfiles(request)
+        return lambda: {
+            "ok": True, "profiles": [profile_to_dict(p) for p in call],
+        }
+
+    def _op_delete(self, command: dict):
+        if not command.get("id"):
+            raise ValueError("delete needs an id")
+        future = self.stub.DeleteProfile.future(
+            identity_pb2.UserProfile(id=command["id"])
+        )
+
+        def resolve():
+            future.result()
+            return {"ok": True, "id": command["id"]}
+        return resolve
+
+    def _op_set(self, command: dict):
+        args = as_args(command)
+        if args.name is None or args.email is None:
+            raise ValueError("set needs name and email")
+        args.phone = args.phone or ""
+        profile = create_or_update_profile(identity_pb2.UserProfile(), args)
+        return self._update(identity_pb2.ProfileDelta(profile=profile))
+
+    def _op_edit(self, command: dict):
+        args = as_args(command)
+        profile, fields = build_patch(args)
+        future = self.stub.UpdateProfile.future(
+            identity_pb2.ProfileDelta(
+                profile=profile,
+                update_mask=field_mask_pb2.FieldMask(paths=fields),
+            )
+        )
+
+        def resolve():
+            try:
+                response = future.result()
+            except grpc.RpcError as error:
+                if error.code() != grpc.StatusCode.NOT_FOUND:
+                    raise
+                if args.name is None or args.email is None:
+                    raise ValueError(
+                        "profile not found; name and email are needed "
+                        "to create it"
+                    ) from error
+                # Same fallback as edit_profile.py: create the profile
+                args.phone = args.phone or ""
+                profile = create_or_update_profile(
+                    identity_pb2.UserProfile(), args
+                )
+                response = self.stub.UpdateProfile(
+                    identity_pb2.ProfileDelta(profile=profile)
+                )
+            return {"ok": True, "profile": profile_to_dict(response)}
+        return resolve
+
+    def _update(self, delta: identity_pb2.ProfileDelta):
+        future = self.stub.UpdateProfile.future(delta)
+        return lambda: {"ok": True, "profile": profile_to_dict(
+            future.result()
+        )}
+
+
+def as_args(command: dict) -> argparse.Namespace:
+    """Adapt a JSON command to the Namespace the edit helpers expect."""
+    return argparse.Namespace(
+        id=command.get("id"),
+        name=command.get("name"),
+        email=command.get("email"),
+        phone=command.get("phone"),
+    )
+
+
+def read_commands(stream: TextIO) -> Iterable[tuple]:
+    """Yield ``(line_number, command, error)`` for each non-blank line."""
+    for number, raw in enumerate(stream, start=1):
+        raw = raw.strip()
+        if not raw or raw.startswith("#"):
+            continue
+        try:
+            command = json.loads(raw)
+            if not isinstance(command, dict):
+                raise ValueError("command must be a JSON object")
+        except ValueError as error:
+            yield number, None, str(error)
+        else:
+            yield number, command, None
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Define and parse command-line flags."""
+    parser = argparse.ArgumentParser(
+        description="Run JSON-lines profile commands over one gRPC channel"
+    )
+    parser.add_argument(
+        "--file", help="Read commands from this file instead of stdin"
+    )
+    parser.add_argument(
+        "--window", type=int, default=32,
+        help="Maximum RPCs in flight (default: 32)",
+    )
+    parser.add_argument(
+        "--server", default=GRPC_SERVER,
+        help=f"IdentityService address (default: {GRPC_SERVER})",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Entry point: stream commands through one channel; 1 on failures."""
+    args = parse_arguments()
+    stream = open(args.file, encoding="utf-8") if args.file else sys.stdin
+    interactive = stream.isatty()
+    runner = BatchRunner(ProfileUpdater(args.server), args.window, sys.stdout)
+    try:
+        for number, command, error in read_commands(stream):
+            if error is not None:
+                runner.reject(number, error)
+            else:
+                runner.submit(number, command)
+            if interactive:
+                runner.drain()
+        runner.drain()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        runner.updater.channel.close()
+    return 1 if runner.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,12 @@ via SQLCipher.
 """
 
 import os
-import sqlite3
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+import waw_storage
+
 
 # Load environment variables
 load_dotenv()
@@ -31,8 +32,7 @@ class DatabaseManager:
         if not self.db_path.exists():
             raise FileNotFoundError(f"No profile DB found at {self.db_path}")
 
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.execute(f"PRAGMA key = '{self.master_key}';")
+        self.conn = waw_storage.connect(self.db_path, self.master_key)
 
     def execute_query(self, query: str, params: tuple = ()):
         """Execute a parameterized SQL query and commit."""
@@ -2,22 +2,30 @@
 CLI tool to create or update a user profile via the IdentityService gRPC API.
 """
 
+from __future__ import annotations
+
 import argparse
+import os
 import uuid
 from datetime import datetime, timezone
 
-import grpc
 from dotenv import load_dotenv
 
-import identity_pb2
-import identity_pb2_grpc
+from waw_lazy import lazy_import
+
+# grpc and the stubs load on first use, keeping --help and argument
+# errors fast for UI hooks
+grpc = lazy_import("grpc")
+identity_pb2 = lazy_import("identity_pb2")
+identity_pb2_grpc = lazy_import("identity_pb2_grpc")
+field_mask_pb2 = lazy_import("google.protobuf.field_mask_pb2")
 
 
 # Load environment variables
 load_dotenv()
 
-# gRPC server address
-GRPC_SERVER = "localhost:50051"
+# gRPC server address, e.g. "unix:///run/user/1000/waw-identity.sock"
+GRPC_SERVER = os.getenv("IDENTITY_GRPC_ADDR", "localhost:50051")
 
 
 class ProfileUpdater:
@@ -46,6 +54,16 @@ class ProfileUpdater:
             print(f"Error updating profile: {error.details()}")
             return identity_pb2.UserProfile()
 
+    def patch_profile(
+        self, profile: identity_pb2.UserProfile, fields: list
+    ) -> identity_pb2.UserProfile:
+        """Update only ``fields``; raise RpcError if there is no profile."""
+        delta = identity_pb2.ProfileDelta(
+            profile=profile,
+            update_mask=field_mask_pb2.FieldMask(paths=fields),
+        )
+        return self.stub.UpdateProfile(delta)
+
 
 def create_or_update_profile(
     existing: identity_pb2.UserProfile, args: argparse.Namespace
@@ -65,6 +83,21 @@ def create_or_update_profile(
     )
 
 
+def build_patch(args: argparse.Namespace) -> tuple:
+    """Build a partial UserProfile and its field list from CLI args."""
+    now = datetime.now(timezone.utc).isoformat()
+    fields = [
+        name for name in ("name", "email", "phone")
+        if getattr(args, name) is not None
+    ]
+    profile = identity_pb2.UserProfile(
+        id=args.id or "",
+        updated_at=now,
+        **{name: getattr(args, name) for name in fields},
+    )
+    return profile, fields + ["updated_at"]
+
+
 def parse_arguments() -> argparse.Namespace:
     """Define and parse command-line flags."""
     parser = argparse.ArgumentParser(
@@ -81,8 +114,7 @@ def parse_arguments() -> argparse.Namespace:
     )
     parser.add_argument(
         "--phone",
-        default="",
-        help="Phone number (optional)",
+        help="Phone number (optional; left unchanged if omitted)",
     )
     return parser.parse_args()
 
@@ -99,12 +131,22 @@ def print_profile(response: identity_pb2.UserProfile) -> None:
 
 
 def main() -> None:
-    """Entry point: parse args, fetch, update, and print profile."""
+    """Entry point: parse args, patch (or create), and print profile."""
     args = parse_arguments()
     updater = ProfileUpdater(GRPC_SERVER)
-    existing = updater.get_existing_profile()
-    profile = create_or_update_profile(existing, args)
-    response = updater.update_profile(profile)
+
+    # Editing an existing profile takes a single masked UpdateProfile
+    profile, fields = build_patch(args)
+    try:
+        response = updater.patch_profile(profile, fields)
+    except grpc.RpcError as error:
+        if error.code() != grpc.StatusCode.NOT_FOUND:
+            print(f"Error updating profile: {error.details()}")
+            return
+        args.phone = args.phone or ""
+        existing = identity_pb2.UserProfile()
+        profile = create_or_update_profile(existing, args)
+        response = updater.update_profile(profile)
     print_profile(response)
 
 
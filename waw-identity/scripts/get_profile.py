@@ -2,22 +2,29 @@
 CLI tool to create or update a user profile via the IdentityService gRPC API.
 """
 
+from __future__ import annotations
+
 import argparse
+import os
 import uuid
 from datetime import datetime, timezone
 
-import grpc
 from dotenv import load_dotenv
 
-import identity_pb2
-import identity_pb2_grpc
+from waw_lazy import lazy_import
+
+# grpc and the stubs load on first use, keeping --help and argument
+# errors fast for UI hooks
+grpc = lazy_import("grpc")
+identity_pb2 = lazy_import("identity_pb2")
+identity_pb2_grpc = lazy_import("identity_pb2_grpc")
 
 
 # Load environment variables from .env
 load_dotenv()
 
-# gRPC server address
-GRPC_SERVER = "localhost:50051"
+# gRPC server address, e.g. "unix:///run/user/1000/waw-identity.sock"
+GRPC_SERVER = os.getenv("IDENTITY_GRPC_ADDR", "localhost:50051")
 
 
 class ProfileUpdater:
@@ -2,19 +2,32 @@
 gRPC server for IdentityService with SQLCipher-encrypted SQLite database.
 """
 
+import asyncio
+import functools
+import inspect
 import logging
 import sys
 import os
 import signal
+import socket
 import sqlite3
+import stat
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from concurrent import futures
 from pathlib import Path
+from typing import Callable, List, Optional, Tuple
 
 import grpc
 from dotenv import load_dotenv
 
 import identity_pb2
 import identity_pb2_grpc
+import waw_metrics
+import waw_storage
+from waw_profiling import PROFILER
 
 
 # Load environment variables
@@ -24,6 +37,70 @@ load_dotenv()
 DB_PATH = Path("../waw-identity/identity.db").resolve()
 MASTER_KEY = os.getenv("waw_MASTER_KEY", "dummy_key")
 
+# ListProfiles page sizes and the WatchProfiles change-log length
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+CHANGE_FEED_SIZE = 1024
+
+# Server tuning: "sync" uses grpc.server, "aio" uses grpc.aio with DB
+# work offloaded to a bounded executor of IDENTITY_MAX_WORKERS threads
+SERVER_MODE = os.getenv("IDENTITY_SERVER_MODE", "sync")
+MAX_WORKERS = int(os.getenv("IDENTITY_MAX_WORKERS", "5"))
+MAX_CONCURRENT_RPCS = int(os.getenv("IDENTITY_MAX_CONCURRENT_RPCS", "0"))
+# In "sync" mode every WatchProfiles call holds a worker thread while it
+# is subscribed; watchers beyond this many are refused so the remaining
+# threads stay free for unary RPCs. Use "aio" mode for many watchers.
+MAX_WATCHERS = int(
+    os.getenv("IDENTITY_MAX_WATCHERS", str(max(1, MAX_WORKERS // 2)))
+)
+KEEPALIVE_TIME_MS = int(os.getenv("IDENTITY_KEEPALIVE_TIME_MS", "30000"))
+KEEPALIVE_TIMEOUT_MS = int(os.getenv("IDENTITY_KEEPALIVE_TIMEOUT_MS", "10000"))
+MAX_MESSAGE_BYTES = int(
+    os.getenv("IDENTITY_MAX_MESSAGE_BYTES", str(4 * 1024 * 1024))
+)
+SHUTDOWN_GRACE = float(os.getenv("IDENTITY_SHUTDOWN_GRACE", "5"))
+
+# Comma-separated listen addresses; "unix:/path/to.sock" entries let
+# same-host callers skip the loopback TCP stack
+BIND_ADDRESSES = [
+    address.strip()
+    for address in os.getenv("IDENTITY_BIND", "[::]:50051").split(",")
+    if address.strip()
+]
+
+# Seconds a cached GetProfile response may be served without touching the
+# DB; this only bounds staleness against writers that bypass the service
+# (e.g. scripts/delete_profile.py). 0 disables the cache.
+PROFILE_CACHE_TTL = float(os.getenv("IDENTITY_PROFILE_CACHE_TTL", "5"))
+VERSION_METADATA_KEY = "x-profile-version"
+
+# Local Prometheus endpoint (127.0.0.1); 0 disables it
+METRICS_PORT = int(os.getenv("IDENTITY_METRICS_PORT", "9101"))
+
+RPC_LATENCY = waw_metrics.histogram(
+    "identity_rpc_duration_seconds",
+    "IdentityService handler latency.",
+    ["method"],
+)
+RPC_ERRORS = waw_metrics.counter(
+    "identity_rpc_errors_total",
+    "IdentityService handlers that raised or aborted.",
+    ["method"],
+)
+DB_QUERY_LATENCY = waw_metrics.histogram(
+    "identity_db_query_seconds",
+    "Identity DB statement latency.",
+    ["statement"],
+)
+DB_ERRORS = waw_metrics.counter(
+    "identity_db_errors_total",
+    "Identity DB statements that failed.",
+    ["statement"],
+)
+
+PROFILE_COLUMNS = "id, name, email, phone, created_at, updated_at"
+MASKABLE_FIELDS = ("name", "email", "phone", "created_at", "updated_at")
+
 logging.basicConfig(level=logging.INFO)
 logging.info(f"📌 Identity DB path: {DB_PATH}")
 
@@ -34,93 +111,358 @@ class DatabaseManager:
     def __init__(self, db_path: Path, master_key: str):
         self.db_path = db_path
         self.master_key = master_key
+        # Serializes use of the shared connection across worker threads
+        self.lock = threading.RLock()
         self.conn = self._init_db()
 
     def _init_db(self):
         """Initializes an encrypted SQLite database."""
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.execute(f"PRAGMA key = '{self.master_key}';")
-
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS profile (
-                id TEXT PRIMARY KEY,
-                name TEXT,
-                email TEXT,
-                phone TEXT,
-                created_at TEXT,
-                updated_at TEXT
-            );
-            """
+        conn = waw_storage.connect(
+            self.db_path, self.master_key, check_same_thread=False
         )
-        conn.commit()
+        # Lets the checkpoint scheduler reclaim free pages incrementally
+        waw_storage.enable_auto_vacuum(conn)
+        waw_storage.migrate(conn)
         return conn
 
     def execute_query(self, query: str, params: tuple = ()):
         """Execute a SQL query and return all rows."""
-        cursor = self.conn.cursor()
-        cursor.execute(query, params)
-        return cursor.fetchall()
+        statement = query.split(None, 1)[0].upper()
+        with self.lock, DB_QUERY_LATENCY.time(statement=statement):
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            except sqlite3.DatabaseError:
+                DB_ERRORS.inc(statement=statement)
+                raise
 
     def commit(self):
         """Commit the current transaction."""
-        self.conn.commit()
+        with self.lock:
+            self.conn.commit()
+
+    def rollback(self):
+        """Roll back the current transaction."""
+        with self.lock:
+            self.conn.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """Hold the lock across a group of writes and their commit.
+
+        Rolls back if the block raises, before another thread can use
+        the connection, so one failed write never discards another's.
+        """
+        with self.lock:
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
 
     def close(self):
         """Close the database connection."""
         self.conn.close()
 
 
+def _status_failed(context) -> bool:
+    """True if a handler reported an error through ``set_code``."""
+    # grpc contexts expose code(); ExecutorContext a plain attribute
+    code = getattr(context, "code", None)
+    if callable(code):
+        code = code()
+    return isinstance(code, grpc.StatusCode) and code != grpc.StatusCode.OK
+
+
+def instrumented(method):
+    """Record latency and failures of a servicer method in RPC metrics.
+
+    Failures are raised exceptions (including aborts) and error codes
+    set on the context by handlers that then return normally.
+    """
+    name = method.__name__
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def stream_wrapper(self, request, context):
+            start = time.perf_counter()
+            try:
+                yield from method(self, request, context)
+            except Exception:
+                RPC_ERRORS.inc(method=name)
+                raise
+            else:
+                if _status_failed(context):
+                    RPC_ERRORS.inc(method=name)
+            finally:
+                RPC_LATENCY.observe(time.perf_counter() - start, method=name)
+        return stream_wrapper
+
+    # Unary handlers are also captured by the opt-in profiler when slow
+    profiled_method = PROFILER.profiled(f"identity.{name}")(method)
+
+    @functools.wraps(method)
+    def wrapper(self, request, context):
+        start = time.perf_counter()
+        try:
+            response = profiled_method(self, request, context)
+        except Exception:
+            RPC_ERRORS.inc(method=name)
+            raise
+        else:
+            if _status_failed(context):
+                RPC_ERRORS.inc(method=name)
+            return response
+        finally:
+            RPC_LATENCY.observe(time.perf_counter() - start, method=name)
+    return wrapper
+
+
+class ChangeFeed:
+    """Bounded in-process log of profile changes for WatchProfiles."""
+
+    def __init__(self, maxlen: int = CHANGE_FEED_SIZE):
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the most recent change."""
+        with self._cond:
+            return self._seq
+
+    def publish(self, event: identity_pb2.ProfileEvent) -> None:
+        """Append a change and wake all watchers."""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event))
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` (from the writer's thread) on every change."""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        """Stop calling a listener registered with add_listener."""
+        with self._cond:
+            self._listeners.remove(callback)
+
+    def since(
+        self, after_seq: int
+    ) -> List[Tuple[int, identity_pb2.ProfileEvent]]:
+        """Return changes newer than ``after_seq`` without blocking."""
+        with self._cond:
+            return [item for item in self._events if item[0] > after_seq]
+
+    def wait(
+        self, after_seq: int, timeout: float
+    ) -> List[Tuple[int, identity_pb2.ProfileEvent]]:
+        """Return changes newer than ``after_seq``, waiting up to timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq, timeout)
+            return self.since(after_seq)
+
+
+class ProfileCache:
+    """Read-through cache of the GetProfile response.
+
+    Every write bumps ``version``; a reader may only fill the cache with
+    data it read under the current version, so a fill that races a write
+    is dropped instead of caching stale data.
+    """
+
+    def __init__(self, ttl: float = PROFILE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._epoch = int(time.time() * 1000)
+        self._version = 0
+        self._profile: Optional[identity_pb2.UserProfile] = None
+        self._expires_at = 0.0
+
+    @property
+    def version(self) -> int:
+        """Counter bumped on every write."""
+        with self._lock:
+            return self._version
+
+    def stamp(self, version: int) -> str:
+        """Version stamp sent to clients; unique across server restarts."""
+        return f"{self._epoch}-{version}"
+
+    def get(self) -> Optional[Tuple[identity_pb2.UserProfile, int]]:
+        """Return ``(profile, version)`` if a fresh entry is cached."""
+        with self._lock:
+            if self._profile is None or time.monotonic() >= self._expires_at:
+                return None
+            return self._profile, self._version
+
+    def fill(self, profile: identity_pb2.UserProfile, version: int) -> None:
+        """Cache a response read while ``version`` was current."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if version == self._version:
+                self._profile = profile
+                self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        """Drop the cached response and bump the version."""
+        with self._lock:
+            self._version += 1
+            self._profile = None
+
+
+def row_to_profile(row: tuple) -> identity_pb2.UserProfile:
+    """Build a UserProfile message from a profile table row."""
+    # Partially-written rows may hold NULLs; proto strings cannot
+    row = tuple(value or "" for value in row)
+    return identity_pb2.UserProfile(
+        id=row[0],
+        name=row[1],
+        email=row[2],
+        phone=row[3],
+        created_at=row[4],
+        updated_at=row[5],
+    )
+
+
 class IdentityService(identity_pb2_grpc.IdentityServiceServicer):
     """gRPC servicer providing profile CRUD operations."""
 
-    def __init__(self):
+    def __init__(self, max_watchers: Optional[int] = None):
         self.db_manager = DatabaseManager(DB_PATH, MASTER_KEY)
+        self.change_feed = ChangeFeed()
+        self.cache = ProfileCache()
+        # Bounds WatchProfiles streams, each of which holds a thread
+        self.watch_slots = (
+            threading.BoundedSemaphore(max_watchers)
+            if max_watchers else None
+        )
 
+    @instrumented
     def GetProfile(self, request, context):
-        try:
-            rows = self.db_manager.execute_query(
-                "SELECT id, name, email, phone, created_at, updated_at "
-                "FROM profile LIMIT 1;"
-            )
-            if not rows:
+        cached = self.cache.get()
+        if cached is None:
+            version = self.cache.version
+            try:
+                rows = self.db_manager.execute_query(
+                    f"SELECT {PROFILE_COLUMNS} FROM profile LIMIT 1;"
+                )
+            except sqlite3.DatabaseError as err:
+                context.set_details(f"Database error: {err}")
+                context.set_code(grpc.StatusCode.INTERNAL)
                 return identity_pb2.UserProfile()
 
-            row = rows[0]
-            return identity_pb2.UserProfile(
-                id=row[0],
-                name=row[1],
-                email=row[2],
-                phone=row[3],
-                created_at=row[4],
-                updated_at=row[5],
+            profile = (
+                row_to_profile(rows[0]) if rows else identity_pb2.UserProfile()
             )
+            self.cache.fill(profile, version)
+            cached = (profile, version)
 
-        except sqlite3.DatabaseError as err:
-            context.set_details(f"Database error: {err}")
-            context.set_code(grpc.StatusCode.INTERNAL)
-            return identity_pb2.UserProfile()
+        profile, version = cached
+        context.set_trailing_metadata(
+            ((VERSION_METADATA_KEY, self.cache.stamp(version)),)
+        )
+        return profile
+
+    def _write_profile(self, p: identity_pb2.UserProfile) -> None:
+        """Upsert one profile row without committing."""
+        # An upsert rather than INSERT OR REPLACE keeps the row's version
+        self.db_manager.execute_query(
+            f"""
+            INSERT INTO profile
+            ({PROFILE_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name,
+                email = excluded.email,
+                phone = excluded.phone,
+                created_at = excluded.created_at,
+                updated_at = excluded.updated_at,
+                version = version + 1
+            """,
+            (
+                p.id,
+                p.name,
+                p.email,
+                p.phone,
+                p.created_at,
+                p.updated_at,
+            ),
+        )
 
+    def _publish(self, kind, profile: identity_pb2.UserProfile) -> None:
+        self.cache.invalidate()
+        self.change_feed.publish(
+            identity_pb2.ProfileEvent(kind=kind, profile=profile)
+        )
+
+    def _patch_profile(self, request, context):
+        """Write only the fields named in the request's update mask."""
+        paths = list(dict.fromkeys(request.update_mask.paths))
+        invalid = [path for path in paths if path not in MASKABLE_FIELDS]
+        if invalid:
+            context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"Unknown update_mask fields: {', '.join(invalid)}",
+            )
+
+        p = request.profile
+        values = tuple(getattr(p, path) for path in paths)
+        assignments = ", ".join(f"{path} = ?" for path in paths)
+        # An empty id targets the current profile, as GetProfile does
+        target = "?" if p.id else "(SELECT id FROM profile LIMIT 1)"
+        target_params = (p.id,) if p.id else ()
+
+        with self.db_manager.transaction():
+            rows = self.db_manager.execute_query(
+                f"UPDATE profile SET {assignments}, version = version + 1 "
+                f"WHERE id = {target} "
+                f"RETURNING {PROFILE_COLUMNS};",
+                values + target_params,
+            )
+            if not rows and p.id:
+                # Unknown id: create the row from the masked fields
+                fields = dict(zip(paths, values), id=p.id)
+                fields.setdefault("created_at", p.created_at or p.updated_at)
+                columns = ", ".join(fields)
+                placeholders = ", ".join("?" * len(fields))
+                rows = self.db_manager.execute_query(
+                    f"INSERT INTO profile ({columns}) "
+                    f"VALUES ({placeholders}) RETURNING {PROFILE_COLUMNS};",
+                    tuple(fields.values()),
+                )
+
+        if not rows:
+            context.abort(grpc.StatusCode.NOT_FOUND, "No profile to update")
+        profile = row_to_profile(rows[0])
+        self._publish(identity_pb2.ProfileEvent.UPDATED, profile)
+        return profile
+
+    @instrumented
     def UpdateProfile(self, request, context):
+        if request.update_mask.paths:
+            try:
+                return self._patch_profile(request, context)
+            except sqlite3.DatabaseError as err:
+                context.set_details(f"Database error: {err}")
+                context.set_code(grpc.StatusCode.INTERNAL)
+                return identity_pb2.UserProfile()
+
         try:
             p = request.profile
-            self.db_manager.execute_query(
-                """
-                INSERT OR REPLACE INTO profile
-                (id, name, email, phone, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    p.id,
-                    p.name,
-                    p.email,
-                    p.phone,
-                    p.created_at,
-                    p.updated_at,
-                ),
-            )
-            self.db_manager.commit()
+            with self.db_manager.transaction():
+                self._write_profile(p)
+            self._publish(identity_pb2.ProfileEvent.UPDATED, p)
             return p
 
         except sqlite3.DatabaseError as err:
@@ -128,12 +470,14 @@ class IdentityService(identity_pb2_grpc.IdentityServiceServicer):
             context.set_code(grpc.StatusCode.INTERNAL)
             return identity_pb2.UserProfile()
 
+    @instrumented
     def DeleteProfile(self, request, context):
         try:
-            self.db_manager.execute_query(
-                "DELETE FROM profile WHERE id = ?;", (request.id,)
-            )
-            self.db_manager.commit()
+            with self.db_manager.transaction():
+                self.db_manager.execute_query(
+                    "DELETE FROM profile WHERE id = ?;", (request.id,)
+                )
+            self._publish(identity_pb2.ProfileEvent.DELETED, request)
             return identity_pb2.Empty()
 
         except sqlite3.DatabaseError as err:
@@ -141,29 +485,347 @@ class IdentityService(identity_pb2_grpc.IdentityServiceServicer):
             context.set_code(grpc.StatusCode.INTERNAL)
             return identity_pb2.Empty()
 
+    @instrumented
+    def ListProfiles(self, request, context):
+        """Stream one page of profiles ordered by id."""
+        page_size = request.page_size or DEFAULT_PAGE_SIZE
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        if request.updated_since:
+            # Range scan on idx_profile_updated_ts; the unary + keeps the
+            # planner from walking the primary key instead
+            query = (
+                f"SELECT {PROFILE_COLUMNS} FROM profile "
+                "WHERE updated_ts > ? AND +id > ? ORDER BY id LIMIT ?;"
+            )
+            params = (request.updated_since, request.page_token, page_size)
+        else:
+            query = (
+                f"SELECT {PROFILE_COLUMNS} FROM profile "
+                "WHERE id > ? ORDER BY id LIMIT ?;"
+            )
+            params = (request.page_token, page_size)
+        try:
+            rows = self.db_manager.execute_query(query, params)
+        except sqlite3.DatabaseError as err:
+            context.abort(grpc.StatusCode.INTERNAL, f"Database error: {err}")
+
+        for row in rows:
+            yield row_to_profile(row)
+
+    @instrumented
+    def BatchUpdateProfiles(self, request_iterator, context):
+        """Upsert a stream of profiles in a single transaction."""
+        deltas = list(request_iterator)
+        written = [delta.profile for delta in deltas]
+        try:
+            with self.db_manager.transaction():
+                for profile in written:
+                    self._write_profile(profile)
+        except sqlite3.DatabaseError as err:
+            context.set_details(f"Database error: {err}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            return identity_pb2.BatchUpdateResponse()
+
+        for profile in written:
+            self._publish(identity_pb2.ProfileEvent.UPDATED, profile)
+        return identity_pb2.BatchUpdateResponse(updated=len(written))
+
+    def WatchProfiles(self, request, context):
+        """Stream profile changes made after the call starts.
+
+        Refused with RESOURCE_EXHAUSTED once ``max_watchers`` streams are
+        open, since each holds a server thread for its whole life.
+        """
+        slots = self.watch_slots
+        if slots is not None and not slots.acquire(blocking=False):
+            context.abort(
+                grpc.StatusCode.RESOURCE_EXHAUSTED,
+                "Too many profile watchers; retry later",
+            )
+        try:
+            cursor = self.change_feed.last_seq
+            while context.is_active():
+                for seq, event in self.change_feed.wait(
+                    cursor, timeout=1.0
+                ):
+                    cursor = seq
+                    yield event
+        finally:
+            if slots is not None:
+                slots.release()
+
+
+class RpcAbort(Exception):
+    """Raised by ExecutorContext.abort to end an offloaded handler."""
+
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+class ExecutorContext:
+    """Servicer-context stand-in for sync handlers run on an executor.
+
+    grpc.aio contexts are not safe to drive from worker threads (their
+    ``abort`` is a coroutine), so status is recorded here and applied to
+    the real context back on the event loop.
+    """
+
+    def __init__(self):
+        self.code: Optional[grpc.StatusCode] = None
+        self.details: Optional[str] = None
+        self.trailing_metadata: tuple = ()
+
+    def set_trailing_metadata(self, metadata: tuple) -> None:
+        self.trailing_metadata = metadata
+
+    def set_code(self, code: grpc.StatusCode) -> None:
+        self.code = code
+
+    def set_details(self, details: str) -> None:
+        self.details = details
+
+    def abort(self, code: grpc.StatusCode, details: str):
+        raise RpcAbort(code, details)
+
+    def is_active(self) -> bool:
+        return True
+
+
+class AsyncIdentityService(identity_pb2_grpc.IdentityServiceServicer):
+    """grpc.aio servicer running IdentityService DB work on an executor."""
+
+    def __init__(
+        self, service: IdentityService, executor: futures.Executor
+    ):
+        self.service = service
+        self.executor = executor
+
+    async def _offload(self, fn: Callable, context):
+        """Run ``fn(executor_context)`` on the executor and relay status."""
+        loop = asyncio.get_running_loop()
+        ctx = ExecutorContext()
+        try:
+            result = await loop.run_in_executor(self.executor, fn, ctx)
+        except RpcAbort as err:
+            await context.abort(err.code, err.details)
+        if ctx.code is not None:
+            context.set_code(ctx.code)
+            context.set_details(ctx.details or "")
+        if ctx.trailing_metadata:
+            context.set_trailing_metadata(ctx.trailing_metadata)
+        return result
+
+    async def GetProfile(self, request, context):
+        return await self._offload(
+            lambda ctx: self.service.GetProfile(request, ctx), context
+        )
+
+    async def UpdateProfile(self, request, context):
+        return await self._offload(
+            lambda ctx: self.service.UpdateProfile(request, ctx), context
+        )
+
+    async def DeleteProfile(self, request, context):
+        return await self._offload(
+            lambda ctx: self.service.DeleteProfile(request, ctx), context
+        )
+
+    async def ListProfiles(self, request, context):
+        profiles = await self._offload(
+            lambda ctx: list(self.service.ListProfiles(request, ctx)),
+            context,
+        )
+        for profile in profiles:
+            yield profile
+
+    async def BatchUpdateProfiles(self, request_iterator, context):
+        deltas = [delta async for delta in request_iterator]
+        return await self._offload(
+            lambda ctx: self.service.BatchUpdateProfiles(iter(deltas), ctx),
+            context,
+        )
+
+    async def WatchProfiles(self, request, context):
+        feed = self.service.change_feed
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def notify():
+            loop.call_soon_threadsafe(changed.set)
+
+        cursor = feed.last_seq
+        feed.add_listener(notify)
+        try:
+            while True:
+                changed.clear()
+                events = feed.since(cursor)
+                if not events:
+                    await changed.wait()
+                    continue
+                for seq, event in events:
+                    cursor = seq
+                    yield event
+        finally:
+            feed.remove_listener(notify)
+
+
+def unix_socket_path(address: str) -> Optional[Path]:
+    """Return the socket path of a ``unix:`` address, else None."""
+    if not address.startswith("unix:"):
+        return None
+    path = address[len("unix:"):]
+    if path.startswith("//"):
+        path = path[2:]
+    return Path(path)
+
+
+def _socket_in_use(path: Path) -> bool:
+    """True if a server accepts connections on the unix socket ``path``."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1.0)
+    try:
+        probe.connect(str(path))
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def bind_server(server, addresses: List[str]) -> None:
+    """Listen on each address, clearing stale unix socket files first.
+
+    Raises ``FileExistsError`` if a unix address names something other
+    than a socket, or a socket another server is still listening on,
+    rather than deleting it.
+    """
+    for address in addresses:
+        socket_path = unix_socket_path(address)
+        if socket_path is not None:
+            socket_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                mode = socket_path.lstat().st_mode
+            except FileNotFoundError:
+                pass
+            else:
+                if not stat.S_ISSOCK(mode):
+                    raise FileExistsError(
+                        f"{socket_path} exists and is not a socket"
+                    )
+                if _socket_in_use(socket_path):
+                    raise FileExistsError(
+                        f"{socket_path} is in use by another server"
+                    )
+                socket_path.unlink()
+        server.add_insecure_port(address)
+
+
+def start_metrics_server() -> None:
+    """Expose Prometheus metrics on 127.0.0.1:METRICS_PORT if enabled."""
+    if not METRICS_PORT:
+        return
+    try:
+        waw_metrics.start_http_server(METRICS_PORT)
+    except OSError as e:
+        # Metrics are optional: a busy port must not stop the service
+        logging.warning(f"⚠️ Metrics disabled, port {METRICS_PORT}: {e}")
+        return
+    logging.info(f"📈 Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+
+
+def start_checkpointer() -> waw_storage.CheckpointScheduler:
+    """Checkpoint the WAL in the background so it stays bounded."""
+    return waw_storage.CheckpointScheduler(DB_PATH, MASTER_KEY).start()
+
+
+def server_options() -> list:
+    """Channel arguments shared by the sync and aio servers."""
+    return [
+        ("grpc.keepalive_time_ms", KEEPALIVE_TIME_MS),
+        ("grpc.keepalive_timeout_ms", KEEPALIVE_TIMEOUT_MS),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+        ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+    ]
+
 
 def serve():
     """Start the gRPC server and register the IdentityService."""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=5))
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=MAX_WORKERS),
+        options=server_options(),
+        maximum_concurrent_rpcs=MAX_CONCURRENT_RPCS or None,
+    )
     identity_pb2_grpc.add_IdentityServiceServicer_to_server(
-        IdentityService(), server
+        IdentityService(max_watchers=MAX_WATCHERS), server
     )
-    server.add_insecure_port("[::]:50051")
+    bind_server(server, BIND_ADDRESSES)
 
-    # Handle graceful shutdown on Ctrl+C
-    signal.signal(signal.SIGINT, lambda sig, frame: shutdown(server))
+    checkpointer = start_checkpointer()
 
-    logging.info("🚀 IdentityService running on port 50051")
+    # Handle graceful shutdown on Ctrl+C or SIGTERM
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(
+            sig, lambda sig, frame: shutdown(server, checkpointer)
+        )
+
+    start_metrics_server()
+    logging.info(
+        f"🚀 IdentityService running on {', '.join(BIND_ADDRESSES)}"
+    )
     server.start()
     server.wait_for_termination()
 
 
-def shutdown(server_obj):
-    """Gracefully stop the gRPC server."""
+async def serve_aio():
+    """Run IdentityService on grpc.aio until SIGINT/SIGTERM."""
+    executor = futures.ThreadPoolExecutor(
+        max_workers=MAX_WORKERS, thread_name_prefix="identity-db"
+    )
+    server = grpc.aio.server(
+        options=server_options(),
+        maximum_concurrent_rpcs=MAX_CONCURRENT_RPCS or None,
+    )
+    identity_pb2_grpc.add_IdentityServiceServicer_to_server(
+        AsyncIdentityService(IdentityService(), executor), server
+    )
+    bind_server(server, BIND_ADDRESSES)
+
+    checkpointer = start_checkpointer()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    start_metrics_server()
+    logging.info(
+        f"🚀 IdentityService (aio) running on {', '.join(BIND_ADDRESSES)}"
+    )
+    await server.start()
+    await stop.wait()
+
+    # Stop accepting new RPCs and let in-flight ones drain
+    logging.info("Shutting down server...")
+    await server.stop(SHUTDOWN_GRACE)
+    executor.shutdown(wait=True)
+    checkpointer.stop()
+
+
+def shutdown(server_obj, checkpointer=None):
+    """Gracefully stop the gRPC server, draining in-flight RPCs."""
     logging.info("Shutting down server...")
-    server_obj.stop(0)
+    server_obj.stop(SHUTDOWN_GRACE).wait()
+    if checkpointer is not None:
+        checkpointer.stop()
     sys.exit(0)
 
 
 if __name__ == "__main__":
-    serve()
+    PROFILER.install_signal_toggle()
+    if SERVER_MODE == "aio":
+        asyncio.run(serve_aio())
+    else:
+        serve()
@@ -1,19 +1,37 @@
 """
-Integration test for IdentityService: update then fetch a UserProfile.
+Integration tests for IdentityService: update, patch, fetch, list,
+batch-update and watch UserProfiles, over the sync and aio servers.
 """
 
+import asyncio
+import io
+import json
 import os
+import socket
 import sqlite3
+import sys
+import threading
+from concurrent import futures
 from datetime import datetime
 from pathlib import Path
 from uuid import uuid4
 
 import grpc
+import pytest
 from dotenv import load_dotenv
+from google.protobuf import field_mask_pb2
 
 import identity_pb2
 import identity_pb2_grpc
 
+# Ensure identity_srv and the CLI scripts are importable for in-process
+# server tests
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import batch_profile  # noqa: E402
+import identity_srv  # noqa: E402
+
 
 # Load environment variables
 load_dotenv()
@@ -92,5 +110,461 @@ def test_update_and_get_profile():
     print("✅ test_update_and_get_profile passed.")
 
 
+def make_profile(name: str) -> identity_pb2.UserProfile:
+    """Build a test profile with a fresh id."""
+    now = datetime.now().isoformat()
+    return identity_pb2.UserProfile(
+        id=str(uuid4()),
+        name=name,
+        email="batch@user.com",
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def test_batch_update_and_list_profiles():
+    """Batch-upload profiles in one call, then page through them."""
+    stub = identity_pb2_grpc.IdentityServiceStub(
+        grpc.insecure_channel("localhost:50051")
+    )
+    profiles = [make_profile(f"Batch {i}") for i in range(5)]
+
+    response = stub.BatchUpdateProfiles(
+        identity_pb2.ProfileDelta(profile=p) for p in profiles
+    )
+    assert response.updated == 5
+
+    listed, token = [], ""
+    while True:
+        page = list(stub.ListProfiles(
+            identity_pb2.ListProfilesRequest(page_size=2, page_token=token)
+        ))
+        if not page:
+            break
+        assert len(page) <= 2
+        listed.extend(page)
+        token = page[-1].id
+
+    ids = [p.id for p in listed]
+    assert ids == sorted(ids)
+    assert {p.id for p in profiles} <= set(ids)
+
+    for p in profiles:
+        stub.DeleteProfile(p)
+
+
+def test_list_profiles_updated_since(tmp_path, monkeypatch):
+    """updated_since filters on the epoch column; writes bump version."""
+    monkeypatch.setattr(identity_srv, "DB_PATH", tmp_path / "identity.db")
+    service = identity_srv.IdentityService()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    identity_pb2_grpc.add_IdentityServiceServicer_to_server(service, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    try:
+        channel = grpc.insecure_channel(f"localhost:{port}")
+        stub = identity_pb2_grpc.IdentityServiceStub(channel)
+        old, new = make_profile("Old"), make_profile("New")
+        old.updated_at = "2000-01-01T00:00:00+00:00"
+        new.updated_at = "2000-01-03T00:00:00+00:00"
+        for profile in (old, new, new):
+            stub.UpdateProfile(identity_pb2.ProfileDelta(profile=profile))
+
+        since = int(datetime.fromisoformat(
+            "2000-01-02T00:00:00+00:00"
+        ).timestamp())
+        listed = list(stub.ListProfiles(
+            identity_pb2.ListProfilesRequest(updated_since=since)
+        ))
+        assert [p.id for p in listed] == [new.id]
+        channel.close()
+    finally:
+        server.stop(None)
+
+    versions = dict(service.db_manager.execute_query(
+        "SELECT id, version FROM profile;"
+    ))
+    assert versions == {old.id: 1, new.id: 2}
+    # Fresh files are created ready for incremental vacuuming
+    assert service.db_manager.execute_query("PRAGMA auto_vacuum;") == [(2,)]
+
+
+def test_masked_update_only_touches_listed_fields():
+    """UpdateProfile with an update_mask leaves other columns intact."""
+    stub = identity_pb2_grpc.IdentityServiceStub(
+        grpc.insecure_channel("localhost:50051")
+    )
+    profile = make_profile("Masked")
+    profile.phone = "12345"
+    stub.UpdateProfile(identity_pb2.ProfileDelta(profile=profile))
+
+    patched = stub.UpdateProfile(identity_pb2.ProfileDelta(
+        profile=identity_pb2.UserProfile(id=profile.id, name="Renamed"),
+        update_mask=field_mask_pb2.FieldMask(paths=["name"]),
+    ))
+    assert patched.name == "Renamed"
+    assert patched.phone == "12345"
+    assert patched.email == profile.email
+
+    try:
+        stub.UpdateProfile(identity_pb2.ProfileDelta(
+            profile=identity_pb2.UserProfile(id=profile.id),
+            update_mask=field_mask_pb2.FieldMask(paths=["id"]),
+        ))
+        assert False, "expected INVALID_ARGUMENT"
+    except grpc.RpcError as error:
+        assert error.code() == grpc.StatusCode.INVALID_ARGUMENT
+    finally:
+        stub.DeleteProfile(profile)
+
+
+def test_watch_profiles_receives_changes():
+    """WatchProfiles streams updates and deletes made after it starts."""
+    stub = identity_pb2_grpc.IdentityServiceStub(
+        grpc.insecure_channel("localhost:50051")
+    )
+    profile = make_profile("Watched")
+    call = stub.WatchProfiles(identity_pb2.WatchProfilesRequest(), timeout=10)
+
+    def mutate():
+        # Give the watch call time to register before changing anything
+        threading.Event().wait(0.5)
+        stub.UpdateProfile(identity_pb2.ProfileDelta(profile=profile))
+        stub.DeleteProfile(profile)
+
+    threading.Thread(target=mutate).start()
+    events = []
+    for event in call:
+        if event.profile.id == profile.id:
+            events.append(event.kind)
+        if len(events) == 2:
+            call.cancel()
+            break
+
+    assert events == [
+        identity_pb2.ProfileEvent.UPDATED,
+        identity_pb2.ProfileEvent.DELETED,
+    ]
+
+
+def test_watchers_leave_threads_for_unary_rpcs(tmp_path, monkeypatch):
+    """Sync-mode watchers beyond max_watchers are refused, not queued."""
+    monkeypatch.setattr(identity_srv, "DB_PATH", tmp_path / "identity.db")
+    service = identity_srv.IdentityService(max_watchers=1)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    identity_pb2_grpc.add_IdentityServiceServicer_to_server(service, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+
+    def slot_free():
+        if service.watch_slots.acquire(blocking=False):
+            service.watch_slots.release()
+            return True
+        return False
+
+    def wait_for_slot(free):
+        for _ in range(100):
+            if slot_free() == free:
+                return
+            threading.Event().wait(0.05)
+        raise AssertionError("watch slot did not change")
+
+    channel = grpc.insecure_channel(f"localhost:{port}")
+    try:
+        stub = identity_pb2_grpc.IdentityServiceStub(channel)
+        request = identity_pb2.WatchProfilesRequest()
+        watching = stub.WatchProfiles(request, timeout=10)
+        wait_for_slot(free=False)
+
+        refused = stub.WatchProfiles(request, timeout=10)
+        try:
+            next(refused)
+        except grpc.RpcError as error:
+            assert error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        else:
+            raise AssertionError("second watcher was accepted")
+        profile = make_profile("Unary")
+        stub.UpdateProfile(identity_pb2.ProfileDelta(profile=profile))
+        assert stub.GetProfile(identity_pb2.Empty()).id == profile.id
+
+        # A finished watcher gives its slot back
+        watching.cancel()
+        wait_for_slot(free=True)
+    finally:
+        channel.close()
+        server.stop(None)
+
+
+def test_failed_batch_never_discards_concurrent_updates(
+    tmp_path, monkeypatch
+):
+    """A batch rolled back mid-write leaves other writers' rows intact."""
+    monkeypatch.setattr(identity_srv, "DB_PATH", tmp_path / "identity.db")
+    service = identity_srv.IdentityService()
+    service.db_manager.execute_query(
+        "CREATE TRIGGER reject_boom BEFORE INSERT ON profile "
+        "WHEN NEW.name = 'boom' BEGIN SELECT RAISE(ABORT, 'boom'); END;"
+    )
+    service.db_manager.commit()
+
+    def failing_batch(i):
+        deltas = [
+            identity_pb2.ProfileDelta(profile=make_profile(f"batch {i}")),
+            identity_pb2.ProfileDelta(profile=make_profile("boom")),
+        ]
+        context = identity_srv.ExecutorContext()
+        service.BatchUpdateProfiles(iter(deltas), context)
+        return context.code
+
+    def update(i):
+        profile = make_profile(f"unary {i}")
+        context = identity_srv.ExecutorContext()
+        service.UpdateProfile(
+            identity_pb2.ProfileDelta(profile=profile), context
+        )
+        return profile.id if context.code is None else None
+
+    with futures.ThreadPoolExecutor(max_workers=8) as pool:
+        batches = [pool.submit(failing_batch, i) for i in range(150)]
+        updates = [pool.submit(update, i) for i in range(300)]
+        codes = {batch.result() for batch in batches}
+        updated = {u.result() for u in updates} - {None}
+
+    assert codes == {grpc.StatusCode.INTERNAL}
+    assert len(updated) == 300
+    stored = {
+        row[0] for row in service.db_manager.execute_query(
+            "SELECT id FROM profile;"
+        )
+    }
+    assert stored == updated
+
+
+def test_get_profile_version_changes_on_write():
+    """GetProfile reports a new version stamp after a profile write."""
+    stub = identity_pb2_grpc.IdentityServiceStub(
+        grpc.insecure_channel("localhost:50051")
+    )
+
+    def version():
+        _, call = stub.GetProfile.with_call(identity_pb2.Empty())
+        return dict(call.trailing_metadata())["x-profile-version"]
+
+    before = version()
+    assert version() == before
+
+    profile = make_profile("Versioned")
+    stub.UpdateProfile(identity_pb2.ProfileDelta(profile=profile))
+    after = version()
+    stub.DeleteProfile(profile)
+    assert after != before
+
+
+def test_profile_cache_drops_fill_that_races_a_write():
+    """A response read before a write must not be cached after it."""
+    cache = identity_srv.ProfileCache(ttl=60)
+    stale = identity_pb2.UserProfile(name="stale")
+
+    version = cache.version
+    cache.invalidate()
+    cache.fill(stale, version)
+    assert cache.get() is None
+
+    cache.fill(stale, cache.version)
+    assert cache.get() == (stale, cache.version)
+
+
+def test_rpc_errors_count_status_codes_set_without_raising():
+    def Failing(self, request, context):
+        context.set_code(grpc.StatusCode.INTERNAL)
+        return identity_pb2.Empty()
+
+    def Working(self, request, context):
+        return identity_pb2.Empty()
+
+    for method, expected in ((Failing, 1), (Working, 0)):
+        errors = identity_srv.RPC_ERRORS.value(method=method.__name__)
+        identity_srv.instrumented(method)(
+            None, None, identity_srv.ExecutorContext()
+        )
+        assert identity_srv.RPC_ERRORS.value(
+            method=method.__name__
+        ) - errors == expected
+
+
+def test_busy_metrics_port_does_not_stop_the_server(monkeypatch):
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        monkeypatch.setattr(
+            identity_srv, "METRICS_PORT", busy.getsockname()[1]
+        )
+        identity_srv.start_metrics_server()
+
+
+def test_unix_socket_transport(tmp_path, monkeypatch):
+    """IdentityService can be served and dialled over a unix socket."""
+    monkeypatch.setattr(identity_srv, "DB_PATH", tmp_path / "identity.db")
+    socket_path = tmp_path / "run" / "identity.sock"
+    socket_path.parent.mkdir()
+    # Left behind by a server that did not shut down cleanly
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(str(socket_path))
+    stale.close()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    identity_pb2_grpc.add_IdentityServiceServicer_to_server(
+        identity_srv.IdentityService(), server
+    )
+    # Anything but a socket is never deleted
+    not_a_socket = tmp_path / "identity.db.sock"
+    not_a_socket.write_text("keep me")
+    with pytest.raises(FileExistsError):
+        identity_srv.bind_server(server, [f"unix://{not_a_socket}"])
+    assert not_a_socket.read_text() == "keep me"
+    # Nor is the socket of a server that is still running
+    with socket.socket(socket.AF_UNIX) as live:
+        live_path = tmp_path / "live.sock"
+        live.bind(str(live_path))
+        live.listen()
+        with pytest.raises(FileExistsError):
+            identity_srv.bind_server(server, [f"unix://{live_path}"])
+        assert live_path.exists()
+
+    identity_srv.bind_server(server, [f"unix://{socket_path}"])
+    server.start()
+    try:
+        channel = grpc.insecure_channel(f"unix://{socket_path}")
+        stub = identity_pb2_grpc.IdentityServiceStub(channel)
+        profile = make_profile("Socket")
+        stub.UpdateProfile(identity_pb2.ProfileDelta(profile=profile))
+        assert stub.GetProfile(identity_pb2.Empty()).name == "Socket"
+        channel.close()
+    finally:
+        server.stop(None)
+
+
+def test_aio_server_offloads_db_work(tmp_path, monkeypatch):
+    """The grpc.aio servicer serves unary and streaming calls."""
+    monkeypatch.setattr(identity_srv, "DB_PATH", tmp_path / "identity.db")
+    profile = make_profile("Async")
+
+    async def scenario():
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        server = grpc.aio.server()
+        identity_pb2_grpc.add_IdentityServiceServicer_to_server(
+            identity_srv.AsyncIdentityService(
+                identity_srv.IdentityService(), executor
+            ),
+            server,
+        )
+        port = server.add_insecure_port("localhost:0")
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(
+                f"localhost:{port}"
+            ) as channel:
+                stub = identity_pb2_grpc.IdentityServiceStub(channel)
+                await stub.UpdateProfile(
+                    identity_pb2.ProfileDelta(profile=profile)
+                )
+                fetched = await stub.GetProfile(identity_pb2.Empty())
+                listed = [
+                    p async for p in stub.ListProfiles(
+                        identity_pb2.ListProfilesRequest()
+                    )
+                ]
+                try:
+                    await stub.UpdateProfile(identity_pb2.ProfileDelta(
+                        profile=profile,
+                        update_mask=field_mask_pb2.FieldMask(paths=["x"]),
+                    ))
+                    code = grpc.StatusCode.OK
+                except grpc.aio.AioRpcError as error:
+                    code = error.code()
+        finally:
+            await server.stop(None)
+            executor.shutdown()
+        return fetched, listed, code
+
+    fetched, listed, code = asyncio.run(scenario())
+    assert fetched.name == "Async"
+    assert [p.id for p in listed] == [profile.id]
+    assert code == grpc.StatusCode.INVALID_ARGUMENT
+
+
+def test_batch_cli_pipelines_commands_in_order(tmp_path, monkeypatch):
+    """batch_profile runs JSON-lines commands over one channel, in order."""
+    monkeypatch.setattr(identity_srv, "DB_PATH", tmp_path / "identity.db")
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    identity_pb2_grpc.add_IdentityServiceServicer_to_server(
+        identity_srv.IdentityService(), server
+    )
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+
+    commands = [
+        {"op": "set", "id": "a", "name": "Ada", "email": "ada@x.io"},
+        {"op": "set", "id": "b", "name": "Bob", "email": "bob@x.io"},
+        {"op": "edit", "id": "a", "phone": "123"},
+        {"op": "delete", "id": "b"},
+        {"op": "bogus"},
+        {"op": "list"},
+    ]
+    out = io.StringIO()
+    try:
+        runner = batch_profile.BatchRunner(
+            batch_profile.ProfileUpdater(f"localhost:{port}"), 8, out
+        )
+        for line, command in enumerate(commands, start=1):
+            runner.submit(line, command)
+        runner.drain()
+        runner.updater.channel.close()
+    finally:
+        server.stop(None)
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["line"] for r in results] == [1, 2, 3, 4, 5, 6]
+    assert results[2]["profile"]["phone"] == "123"
+    assert results[2]["profile"]["name"] == "Ada"
+    assert results[4]["ok"] is False
+    assert [p["id"] for p in results[5]["profiles"]] == ["a"]
+    assert runner.failures == 1
+
+
+def test_batch_cli_reports_unreachable_server_per_line():
+    """RPC failures become per-line results instead of ending the batch."""
+    out = io.StringIO()
+    runner = batch_profile.BatchRunner(
+        batch_profile.ProfileUpdater("localhost:1"), 8, out
+    )
+    runner.submit(1, {"op": "list"})
+    runner.submit(2, {"op": "get"})
+    runner.drain()
+    runner.updater.channel.close()
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["line"], r["ok"]) for r in results] == [(1, False), (2, False)]
+    assert results[0]["code"] == "UNAVAILABLE"
+    assert runner.failures == 2
+
+
+def test_batch_cli_reports_badly_typed_fields_per_line():
+    """Wrong JSON types are INVALID_ARGUMENT results, not a traceback."""
+    out = io.StringIO()
+    runner = batch_profile.BatchRunner(
+        batch_profile.ProfileUpdater("localhost:1"), 8, out
+    )
+    runner.submit(1, {"op": "list", "page_size": None})
+    runner.submit(2, {"op": "edit", "id": "zz", "name": 5})
+    runner.submit(3, {"op": "delete"})
+    runner.drain()
+    runner.updater.channel.close()
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["line"] for r in results] == [1, 2, 3]
+    assert all(r["code"] == "INVALID_ARGUMENT" for r in results)
+
+
 if __name__ == "__main__":
     test_update_and_get_profile()
@@ -1,19 +1,185 @@
 """
 FastAPI service for managing user profiles in-memory and serving the
 latest model file.
+
+With ``EDGE_UPSTREAM_URL`` set it runs as a site-local edge cache in
+front of that cloud API instead (see ``edge.py``).
 """
 
-import hashlib
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, Body, HTTPException
+from fastapi import FastAPI, Body, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, field_validator
 
-app = FastAPI()
+import waw_metrics
+from waw_profiling import PROFILER, profiled
+from edge import EdgeCache, EdgeError
+from model_store import ModelBusy, ModelPublisher
+from registry import ModelRegistry, Release
+
+MODEL_PATH = Path(__file__).parent / "model.bin"
+EDGE_UPSTREAM_URL = os.getenv("EDGE_UPSTREAM_URL", "")
+
+log = logging.getLogger("waw.cloud")
+
+# Seconds between SSE keepalive comments and between model.bin checks
+EVENT_KEEPALIVE_SECONDS = 15
+MODEL_WATCH_INTERVAL = 1.0
+
+REQUEST_LATENCY = waw_metrics.histogram(
+    "cloud_request_duration_seconds",
+    "Cloud API request latency.",
+    ["method", "endpoint", "status"],
+)
+
+
+# ─── EventBus ──────────────────────────────────────────────────────────────
+
+class EventBus:
+    """Fans out change notifications to connected SSE subscribers."""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber queue on the running event loop."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """Remove a subscriber queue."""
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def subscriber_count(self) -> int:
+        """Return the number of connected subscribers."""
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event: str, data: dict) -> None:
+        """Queue an event for every subscriber; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, (event, data))
+            except RuntimeError:
+                # Subscriber's loop is gone; drop it
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, item: Tuple[str, dict]) -> None:
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Slow consumer; it falls back to its periodic poll
+            pass
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+model_publisher = ModelPublisher()
+
+
+def model_fingerprint(model_path: Path) -> Optional[dict]:
+    """Return the SHA256 and size of a model file, or None if missing."""
+    try:
+        published = model_publisher.current(model_path)
+    except ModelBusy:
+        return None
+    if published is None:
+        return None
+    sha, path = published
+    return {"sha256": sha, "size": path.stat().st_size}
+
+
+async def watch_model(model_path: Path, bus: EventBus) -> None:
+    """Publish a ``model`` event whenever the model file changes."""
+    last_stat = None
+    last_sha = None
+    while True:
+        try:
+            st = model_path.stat()
+            stat_key = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stat_key = None
+
+        if stat_key is not None and stat_key != last_stat:
+            info = await asyncio.to_thread(model_fingerprint, model_path)
+            if info and info["sha256"] != last_sha:
+                if last_sha is not None:
+                    bus.publish("model", info)
+                last_sha = info["sha256"]
+        last_stat = stat_key
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+
+
+async def watch_registry(registry: ModelRegistry, bus: EventBus) -> None:
+    """Publish a ``model`` event for every new registry release."""
+    first = True
+    while True:
+        try:
+            releases = await asyncio.to_thread(registry.refresh)
+        except Exception as e:
+            log.error("🔥 Model registry refresh failed: %s", e)
+            releases = []
+        # Releases found at start-up are not news to anyone
+        if not first:
+            for release in releases:
+                bus.publish("model", release.info())
+        first = False
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+
+
+event_bus = EventBus()
+model_registry = ModelRegistry()
+edge: Optional[EdgeCache] = (
+    EdgeCache(EDGE_UPSTREAM_URL) if EDGE_UPSTREAM_URL else None
+)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Run the model watcher (or edge event relay) for the server's life."""
+    # Only takes effect when the server runs the loop on the main thread
+    PROFILER.install_signal_toggle()
+    if edge is not None:
+        edge.start(event_bus.publish)
+        try:
+            yield
+        finally:
+            edge.close()
+        return
+    watchers = [
+        asyncio.create_task(watch_model(MODEL_PATH, event_bus)),
+        asyncio.create_task(watch_registry(model_registry, event_bus)),
+    ]
+    try:
+        yield
+    finally:
+        for watcher in watchers:
+            watcher.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ─── CORS Middleware ────────────────────────────────────────────────────────
 app.add_middleware(
@@ -24,6 +190,24 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    """Time each request, labelled by its route template."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_LATENCY.observe(
+        elapsed,
+        method=request.method,
+        endpoint=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    # Expose server-side time to clients and load tools
+    response.headers["Server-Timing"] = f"app;dur={elapsed * 1000:.3f}"
+    return response
+
+
 class ProfileManager:
     """In-memory store for CRUD operations on profiles."""
 
@@ -35,6 +219,12 @@ class ProfileManager:
         self.store[profile["id"]] = profile
         return self.store[profile["id"]]
 
+    def merge(self, profile: dict) -> dict:
+        """Apply a partial profile on top of the stored copy."""
+        stored = {**self.store.get(profile["id"], {}), **profile}
+        self.store[profile["id"]] = stored
+        return stored
+
     def delete(self, profile_id: str) -> bool:
         """Delete a profile by ID."""
         return self.store.pop(profile_id, None) is not None
@@ -77,40 +267,229 @@ class UpsertResponse(BaseModel):
 profile_manager = ProfileManager()
 
 
+def forward_profiles(profiles: List[dict]) -> dict:
+    """Send upserts through the edge's upstream batches."""
+    try:
+        return edge.profiles.submit(profiles)
+    except EdgeError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+
+def proxy_upstream(method: str, path: str, **kwargs) -> Response:
+    """Relay a request to the edge's upstream and return its reply."""
+    try:
+        resp = edge.request(method, path, **kwargs)
+    except EdgeError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    return Response(
+        resp.content,
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type"),
+    )
+
+
 @app.post("/profile", response_model=UpsertResponse)
+@profiled("cloud.upsert_profile")
 def upsert_profile(profile: Profile = Body(...)):
     """Create or update a profile and return status."""
     data = profile.model_dump()
-    stored = profile_manager.upsert(data)
+    if edge is not None:
+        count = forward_profiles([data])["count"]
+        stored = dict(data)
+    else:
+        stored = dict(profile_manager.upsert(data))
+        count = len(profile_manager.all_profiles())
+        event_bus.publish(
+            "profile", {"id": data["id"], "updated_at": data["updated_at"]}
+        )
     stored["updated_at"] = (
         datetime.utcfromtimestamp(data["updated_at"]).isoformat() + "Z"
     )
+    return {"status": "ok", "count": count, "stored": stored}
+
+
+class BatchResponse(BaseModel):
+    """Response schema for batched profile upserts."""
+    status: str
+    count: int
+    accepted: int
+
+
+@app.post("/profiles/batch", response_model=BatchResponse)
+@profiled("cloud.upsert_profiles")
+def upsert_profiles(profiles: List[Profile] = Body(...)):
+    """Create or update several (possibly partial) profiles at once."""
+    if edge is not None:
+        reply = forward_profiles(
+            [profile.model_dump(exclude_unset=True) for profile in profiles]
+        )
+        return {
+            "status": "ok", "count": reply["count"],
+            "accepted": len(profiles),
+        }
+    for profile in profiles:
+        # Fields a client omitted keep their stored values
+        data = profile.model_dump(exclude_unset=True)
+        profile_manager.merge(data)
+        event_bus.publish(
+            "profile", {"id": data["id"], "updated_at": data["updated_at"]}
+        )
     return {
         "status": "ok",
         "count": len(profile_manager.all_profiles()),
-        "stored": stored,
+        "accepted": len(profiles),
     }
 
 
+@app.get("/profile/{profile_id}")
+@profiled("cloud.get_profile")
+def get_profile(profile_id: str, since: Optional[int] = None):
+    """Return a profile, or 304 if it is not newer than ``since``."""
+    if edge is not None:
+        params = {} if since is None else {"since": since}
+        return proxy_upstream("GET", f"/profile/{profile_id}", params=params)
+    stored = profile_manager.get(profile_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if since is not None and stored["updated_at"] <= since:
+        return Response(status_code=304)
+    return stored
+
+
 @app.get("/model/latest")
+@profiled("cloud.get_latest_model")
 def get_latest_model():
     """Serve the latest model file along with its SHA256 checksum header."""
-    model_path = Path(__file__).parent / "model.bin"
-    if not model_path.exists():
+    if edge is not None:
+        return serve_edge_model("/model/latest")
+    try:
+        published = model_publisher.current(MODEL_PATH)
+    except ModelBusy:
+        raise HTTPException(
+            status_code=503, detail="Model is being updated",
+            headers={"Retry-After": "1"},
+        )
+    if published is None:
         raise HTTPException(status_code=404, detail="Model not found")
+    # Served from the published copy, which the checksum describes
+    sha, path = published
+    return FileResponse(
+        path=path,
+        filename="model.bin",
+        media_type="application/octet-stream",
+        headers={"X-Model-SHA256": sha},
+    )
+
 
-    checksum = hashlib.sha256(model_path.read_bytes()).hexdigest()
+def serve_edge_model(path: str) -> FileResponse:
+    """Serve an upstream model file from the edge's local store."""
+    try:
+        local, headers = edge.model(path)
+    except EdgeError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
     return FileResponse(
-        path=model_path,
+        path=local,
         filename="model.bin",
         media_type="application/octet-stream",
-        headers={"X-Model-SHA256": checksum},
+        headers=headers,
     )
 
 
+def serve_release(release: Optional[Release]) -> FileResponse:
+    """Serve a registry release with its checksum and version headers."""
+    if release is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    path = model_registry.path(release)
+    if path is None:
+        # Replaced since the catalog was read; the next refresh has it
+        raise HTTPException(
+            status_code=503, detail="Model is being updated",
+            headers={"Retry-After": "1"},
+        )
+    return FileResponse(
+        path=path,
+        filename=f"{release.name}.bin",
+        media_type="application/octet-stream",
+        headers={
+            "X-Model-SHA256": release.sha256,
+            "X-Model-Version": release.version,
+        },
+    )
+
+
+@app.get("/models")
+@profiled("cloud.list_models")
+def list_models(channel: Optional[str] = None):
+    """Return the newest release of every model (on ``channel``)."""
+    if edge is not None:
+        params = {} if channel is None else {"channel": channel}
+        return proxy_upstream("GET", "/models", params=params)
+    return [
+        release.info() for release in model_registry.catalog()
+        if channel is None or release.channel == channel
+    ]
+
+
+@app.get("/models/{name}/{channel}/latest")
+@profiled("cloud.get_latest_release")
+def get_latest_release(name: str, channel: str):
+    """Serve the newest release of ``name`` on ``channel``."""
+    if edge is not None:
+        return serve_edge_model(f"/models/{name}/{channel}/latest")
+    return serve_release(model_registry.latest(name, channel))
+
+
+@app.get("/models/{name}/{channel}/{version}")
+@profiled("cloud.get_release")
+def get_release(name: str, channel: str, version: str):
+    """Serve one release of ``name``; its URL never changes content."""
+    if edge is not None:
+        return serve_edge_model(f"/models/{name}/{channel}/{version}")
+    return serve_release(model_registry.get(name, channel, version))
+
+
 @app.delete("/profile/{profile_id}")
+@profiled("cloud.delete_profile")
 def delete_profile(profile_id: str):
     """Delete a profile by ID or return 404 if not found."""
+    if edge is not None:
+        return proxy_upstream("DELETE", f"/profile/{profile_id}")
     if profile_manager.delete(profile_id):
+        event_bus.publish("profile", {"id": profile_id, "deleted": True})
         return {"status": "deleted", "id": profile_id}
     raise HTTPException(status_code=404, detail="Profile not found")
+
+
+@app.get("/events")
+async def stream_events():
+    """Push ``model`` and ``profile`` change events as server-sent events."""
+    queue = event_bus.subscribe()
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(
+                        queue.get(), EVENT_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            event_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    """Expose Prometheus metrics for this process."""
+    return Response(
+        waw_metrics.REGISTRY.render(), media_type=waw_metrics.CONTENT_TYPE
+    )
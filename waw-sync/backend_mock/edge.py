@@ -0,0 +1,340 @@
+"""
+Edge cache mode for the cloud API: a site-local instance in front of the
+central cloud API (``EDGE_UPSTREAM_URL``) that the site's sync clients
+use as their ``CLOUD_SYNC_URL``.
+
+- ``/model/latest`` and the ``/models/...`` registry files are served
+  from a content-addressed store on local disk
+  (``EDGE_CACHE_DIR/<sha256>``). The upstream checksum of a ``latest``
+  path is checked again at most every ``EDGE_MODEL_TTL`` seconds, or at
+  once when the upstream announces a new model; versioned paths never
+  change, so they are only fetched again once pruned from the store.
+  Concurrent misses share one upstream fetch.
+- Profile upserts are group-committed: those arriving within
+  ``EDGE_BATCH_WINDOW`` seconds go upstream as one ``/profiles/batch``
+  call, and every caller is answered once that call succeeds, so a write
+  the edge acknowledged is never held only by the edge.
+- Upstream events are relayed to the edge's own ``/events`` subscribers.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple,
+)
+
+import waw_metrics
+from waw_lazy import lazy_import
+from waw_singleflight import SingleFlight
+from model_store import ChecksumMismatch, ModelStore
+
+httpx = lazy_import("httpx")
+
+CACHE_DIR = Path(
+    os.path.expanduser(os.getenv("EDGE_CACHE_DIR", "~/.waw/edge-cache"))
+)
+MODEL_TTL = float(os.getenv("EDGE_MODEL_TTL", "5"))
+BATCH_WINDOW = float(os.getenv("EDGE_BATCH_WINDOW", "0.05"))
+BATCH_MAX = int(os.getenv("EDGE_BATCH_MAX", "500"))
+# Models kept in the store; older ones are pruned after a new fetch
+MODEL_KEEP = int(os.getenv("EDGE_MODEL_KEEP", "2"))
+# Model paths remembered (each for latest and versioned paths); the
+# least recently served are forgotten
+MODEL_PATHS = int(os.getenv("EDGE_MODEL_PATHS", "256"))
+CHUNK_SIZE = 1024 * 1024
+# Upstream response headers that describe a model file
+MODEL_HEADERS = ("X-Model-SHA256", "X-Model-Version")
+# The upstream sends a keepalive comment every 15 s
+EVENTS_READ_TIMEOUT = 45.0
+
+log = logging.getLogger("waw.cloud.edge")
+
+UPSTREAM_REQUESTS = waw_metrics.counter(
+    "cloud_edge_upstream_requests_total",
+    "Requests the edge cache made to the upstream cloud API.",
+    ["kind"],
+)
+COALESCED = waw_metrics.counter(
+    "cloud_edge_coalesced_total",
+    "Requests answered by another request's upstream call.",
+    ["kind"],
+)
+
+
+class EdgeError(Exception):
+    """The upstream cloud API failed or returned an unusable response."""
+
+    def __init__(self, message: str, status: int = 502):
+        super().__init__(message)
+        self.status = status
+
+
+# ─── ProfileForwarder ──────────────────────────────────────────────────────
+
+class _Batch:
+    def __init__(self):
+        self.profiles: Dict[str, dict] = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result: Optional[dict] = None
+        self.error: Optional[Exception] = None
+
+
+class ProfileForwarder:
+    """Group-commits profile upserts into upstream batch calls."""
+
+    def __init__(
+        self,
+        send: Callable[[List[dict]], dict],
+        window: float = BATCH_WINDOW,
+        max_batch: int = BATCH_MAX,
+    ):
+        self.send = send
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._batch: Optional[_Batch] = None
+
+    def submit(self, profiles: List[dict]) -> dict:
+        """Forward (possibly partial) profiles; return the upstream reply.
+
+        The first caller of a batch waits ``window`` seconds (less if
+        the batch fills up) for others to join, then sends it. Updates
+        to one profile within a batch are merged, later fields winning,
+        as the upstream would merge them.
+        """
+        with self._lock:
+            leader = self._batch is None
+            if leader:
+                self._batch = _Batch()
+            batch = self._batch
+            for profile in profiles:
+                merged = batch.profiles.setdefault(profile["id"], {})
+                merged.update(profile)
+            if len(batch.profiles) >= self.max_batch:
+                batch.full.set()
+        if not leader:
+            COALESCED.inc(kind="profile")
+            batch.done.wait()
+        else:
+            batch.full.wait(self.window)
+            with self._lock:
+                self._batch = None
+            try:
+                batch.result = self.send(list(batch.profiles.values()))
+            except Exception as e:
+                # Raised in every caller, not just the one that sent it
+                batch.error = e
+            finally:
+                batch.done.set()
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+
+
+# ─── EdgeCache ─────────────────────────────────────────────────────────────
+
+def read_events(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield ``(event, data)`` from server-sent event lines."""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def _is_latest(path: str) -> bool:
+    return path.endswith("/latest")
+
+
+class EdgeCache:
+    """Upstream client, model store and profile forwarder of an edge."""
+
+    def __init__(
+        self,
+        upstream_url: str,
+        store: Optional[ModelStore] = None,
+        ttl: float = MODEL_TTL,
+        client=None,
+        window: float = BATCH_WINDOW,
+    ):
+        self.client = client or httpx.Client(
+            base_url=upstream_url.rstrip("/"), timeout=30.0
+        )
+        self.store = store or ModelStore(CACHE_DIR, MODEL_KEEP)
+        self.ttl = ttl
+        self.profiles = ProfileForwarder(self._send_profiles, window)
+        self._flight = SingleFlight()
+        # latest path -> (model headers, monotonic time confirmed); the
+        # files of these are kept in the store whatever their age
+        self._models: "OrderedDict[str, Tuple[Dict[str, str], float]]" = (
+            OrderedDict()
+        )
+        # versioned path -> model headers; immutable, so never re-checked
+        self._versions: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._paths_lock = threading.Lock()
+        self.store.pinned = self._pinned
+        self._stop = threading.Event()
+
+    # ─── Models ────────────────────────────────────────────────────────
+
+    def model(
+        self, path: str = "/model/latest"
+    ) -> Tuple[Path, Dict[str, str]]:
+        """Return the local copy of the upstream model at ``path`` and
+        the model headers (checksum, version) to serve it with."""
+        if not _is_latest(path):
+            headers = self._versions.get(path)
+            if headers and self._stored(headers):
+                self._remember(self._versions, path, headers)
+                return self._local(headers)
+            return self._fetch_model(path)
+        cached = self._models.get(path)
+        if cached and self._stored(cached[0]) and (
+            time.monotonic() - cached[1] < self.ttl
+        ):
+            return self._local(cached[0])
+        try:
+            return self._fetch_model(path)
+        except EdgeError as e:
+            if e.status == 502 and cached and self._stored(cached[0]):
+                log.warning("⚠️  Upstream unavailable, serving cached model")
+                return self._local(cached[0])
+            raise
+
+    def invalidate_model(self) -> None:
+        """Make the next requests check the upstream checksums again."""
+        with self._paths_lock:
+            for path, (headers, _) in self._models.items():
+                self._models[path] = (headers, float("-inf"))
+
+    def _stored(self, headers: Dict[str, str]) -> bool:
+        return self.store.has(headers["X-Model-SHA256"])
+
+    def _local(self, headers: Dict[str, str]) -> Tuple[Path, Dict[str, str]]:
+        return self.store.path(headers["X-Model-SHA256"]), headers
+
+    def _pinned(self) -> Set[str]:
+        # The current file of every latest path; versioned files are
+        # fetched again if they are pruned
+        with self._paths_lock:
+            return {
+                headers["X-Model-SHA256"]
+                for headers, _ in self._models.values()
+            }
+
+    def _remember(self, paths: OrderedDict, path: str, entry) -> None:
+        # Keep at most MODEL_PATHS, forgetting the least recently used
+        with self._paths_lock:
+            paths[path] = entry
+            paths.move_to_end(path)
+            while len(paths) > MODEL_PATHS:
+                paths.popitem(last=False)
+
+    def _fetch_model(self, path: str) -> Tuple[Path, Dict[str, str]]:
+        result, shared = self._flight.do_shared(
+            path, lambda: self._refresh_model(path)
+        )
+        if shared:
+            COALESCED.inc(kind="model")
+        return result
+
+    def _refresh_model(self, path: str) -> Tuple[Path, Dict[str, str]]:
+        try:
+            with self.client.stream("GET", path) as resp:
+                if resp.status_code != 200:
+                    raise EdgeError(
+                        f"upstream model request returned "
+                        f"{resp.status_code}",
+                        status=404 if resp.status_code == 404 else 502,
+                    )
+                headers = {
+                    name: resp.headers[name]
+                    for name in MODEL_HEADERS if name in resp.headers
+                }
+                sha = headers.get("X-Model-SHA256")
+                if not sha:
+                    raise EdgeError("upstream model has no checksum")
+                if self.store.has(sha):
+                    UPSTREAM_REQUESTS.inc(kind="model_check")
+                else:
+                    UPSTREAM_REQUESTS.inc(kind="model_fetch")
+                    self.store.put(resp.iter_bytes(CHUNK_SIZE), sha)
+                    log.info(
+                        "📦 Edge cached model",
+                        extra={"sha256": sha, "path": path},
+                    )
+        except (httpx.HTTPError, ChecksumMismatch) as e:
+            raise EdgeError(f"upstream model request failed: {e}") from e
+        if _is_latest(path):
+            self._remember(
+                self._models, path, (headers, time.monotonic())
+            )
+        else:
+            self._remember(self._versions, path, headers)
+        return self._local(headers)
+
+    # ─── Profiles ──────────────────────────────────────────────────────
+
+    def _send_profiles(self, profiles: List[dict]) -> dict:
+        UPSTREAM_REQUESTS.inc(kind="profile_batch")
+        resp = self.request("POST", "/profiles/batch", json=profiles)
+        if resp.status_code != 200:
+            raise EdgeError(f"upstream batch returned {resp.status_code}")
+        return resp.json()
+
+    def request(self, method: str, path: str, **kwargs):
+        """Send one request upstream; raise ``EdgeError`` if it fails."""
+        try:
+            return self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            raise EdgeError(f"upstream {method} {path} failed: {e}") from e
+
+    # ─── Events ────────────────────────────────────────────────────────
+
+    def relay_events(self, publish: Callable[[str, dict], None]) -> None:
+        """Republish upstream events until ``close``; reconnects."""
+        backoff = 1
+        timeout = httpx.Timeout(10.0, read=EVENTS_READ_TIMEOUT)
+        while not self._stop.is_set():
+            try:
+                with self.client.stream(
+                    "GET", "/events", timeout=timeout
+                ) as resp:
+                    if resp.status_code != 200:
+                        raise EdgeError(f"HTTP {resp.status_code}")
+                    backoff = 1
+                    for event, data in read_events(resp.iter_lines()):
+                        if event == "model":
+                            self.invalidate_model()
+                        try:
+                            publish(event, json.loads(data))
+                        except ValueError:
+                            continue
+            except (httpx.HTTPError, EdgeError) as e:
+                if self._stop.is_set():
+                    return
+                log.warning("⚠️  Upstream event stream lost: %s", e)
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def start(self, publish: Callable[[str, dict], None]) -> None:
+        """Relay upstream events to ``publish`` in a background thread."""
+        threading.Thread(
+            target=self.relay_events, args=(publish,),
+            name="waw-edge-events", daemon=True,
+        ).start()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.client.close()
@@ -0,0 +1,180 @@
+"""
+Content-addressed model files for the cloud API.
+
+Responses never read ``model.bin`` itself. ``ModelPublisher`` copies it
+into a ``ModelStore`` once per change, hashing it on the way, and
+requests are served from that immutable copy. The checksum header
+therefore always matches the bytes sent, even when the file is replaced
+or rewritten in place mid-request. Concurrent requests that find a new
+file share one publication instead of each hashing it.
+"""
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import waw_metrics
+from waw_singleflight import SingleFlight
+
+CHUNK_SIZE = 1024 * 1024
+# Publication attempts while the source keeps changing under us
+PUBLISH_ATTEMPTS = 3
+
+MODEL_HASH_LATENCY = waw_metrics.histogram(
+    "cloud_model_hash_seconds", "Time spent hashing model.bin."
+)
+MODEL_PUBLISHES = waw_metrics.counter(
+    "cloud_model_publishes_total",
+    "model.bin publications, by whether the file held still.",
+    ["result"],
+)
+
+
+class ChecksumMismatch(Exception):
+    """Stored bytes did not hash to the expected SHA256."""
+
+
+class ModelBusy(Exception):
+    """The model file kept changing while it was being published."""
+
+
+# ─── ModelStore ────────────────────────────────────────────────────────────
+
+class ModelStore:
+    """Model files on local disk, named by their SHA256."""
+
+    def __init__(self, root: Path, keep: int = 2):
+        self.root = root
+        # Older models are pruned after a new one is stored, except
+        # those ``pinned`` returns
+        self.keep = max(1, keep)
+        self.pinned: Callable[[], Iterable[str]] = tuple
+
+    def path(self, sha: str) -> Path:
+        return self.root / sha
+
+    def has(self, sha: str) -> bool:
+        return self.path(sha).exists()
+
+    def put(
+        self, chunks: Iterable[bytes], expected_sha: Optional[str] = None
+    ) -> str:
+        """Store ``chunks`` and return their SHA256.
+
+        The file appears under its name only once complete. Raises
+        ``ChecksumMismatch`` if ``expected_sha`` is given and differs.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        try:
+            with tmp.open("wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            sha = digest.hexdigest()
+            if expected_sha is not None and sha != expected_sha:
+                raise ChecksumMismatch(f"model does not match {expected_sha}")
+            os.replace(tmp, self.path(sha))
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.prune()
+        return sha
+
+    def discard(self, sha: str) -> None:
+        self.path(sha).unlink(missing_ok=True)
+
+    def prune(self) -> None:
+        models = sorted(
+            (p for p in self.root.iterdir() if not p.name.startswith(".")),
+            key=lambda p: p.stat().st_mtime_ns,
+            reverse=True,
+        )
+        pinned = set(self.pinned())
+        for old in models[self.keep:]:
+            if old.name not in pinned:
+                old.unlink(missing_ok=True)
+
+
+# ─── ModelPublisher ────────────────────────────────────────────────────────
+
+def stat_key(st: os.stat_result) -> Tuple[int, int, int, int]:
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _read_chunks(f) -> Iterator[bytes]:
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+class ModelPublisher:
+    """Tracks source model files and their published copies."""
+
+    def __init__(self):
+        self._flight = SingleFlight()
+        # source -> (stat key, sha) of its current publication
+        self._published: Dict[Path, Tuple[tuple, str]] = {}
+
+    def remember(self, source: Path, key: tuple, sha: str) -> None:
+        """Record an earlier publication (e.g. from a catalog on disk)."""
+        self._published[source] = (key, sha)
+
+    @staticmethod
+    def store_for(source: Path) -> ModelStore:
+        return ModelStore(source.parent / f".{source.name}.published")
+
+    def current(self, source: Path) -> Optional[Tuple[str, Path]]:
+        """Return ``(sha, published path)`` for ``source``'s content.
+
+        Returns None if ``source`` does not exist; raises ``ModelBusy``
+        if it is still being written.
+        """
+        try:
+            key = stat_key(source.stat())
+        except FileNotFoundError:
+            return None
+        store = self.store_for(source)
+        published = self._published.get(source)
+        if published and published[0] == key and store.has(published[1]):
+            return published[1], store.path(published[1])
+        return self._flight.do(source, lambda: self._publish(source, store))
+
+    def _publish(
+        self, source: Path, store: ModelStore
+    ) -> Optional[Tuple[str, Path]]:
+        for _ in range(PUBLISH_ATTEMPTS):
+            try:
+                f = source.open("rb")
+            except FileNotFoundError:
+                return None
+            with f:
+                key = stat_key(os.fstat(f.fileno()))
+                published = self._published.get(source)
+                if published and published[0] == key and store.has(
+                    published[1]
+                ):
+                    # Published by the call we waited behind
+                    return published[1], store.path(published[1])
+                with MODEL_HASH_LATENCY.time():
+                    sha = store.put(_read_chunks(f))
+            try:
+                settled = stat_key(source.stat()) == key
+            except FileNotFoundError:
+                settled = False
+            if settled:
+                MODEL_PUBLISHES.inc(result="published")
+                self._published[source] = (key, sha)
+                return sha, store.path(sha)
+            # Written to (or replaced) while we read it: the copy may mix
+            # two versions, so drop it and read the file again
+            MODEL_PUBLISHES.inc(result="changed")
+            if published is None or published[1] != sha:
+                store.discard(sha)
+        raise ModelBusy(f"{source} is still being written")
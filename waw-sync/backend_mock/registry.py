@@ -0,0 +1,253 @@
+"""
+Model registry: several models (per locale, hardware tier, ...), each
+released on channels such as ``stable`` and ``beta``.
+
+Releases are files laid out as ``<root>/<name>/<channel>/<version>.bin``.
+``refresh`` scans that tree, publishes new or changed files through
+``ModelPublisher`` (hashed once, served from an immutable copy) and
+records them in an SQLite catalog indexed by (name, channel, version).
+The catalog outlives restarts, so unchanged releases are not hashed
+again. Lookups are answered from an in-memory copy of the catalog that
+is rebuilt only when a refresh changes it.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import waw_storage
+from waw_singleflight import SingleFlight
+from model_store import ModelBusy, ModelPublisher, stat_key
+
+REGISTRY_DIR = Path(
+    os.getenv("MODEL_REGISTRY_DIR", Path(__file__).parent / "models")
+)
+# Seconds a lookup may trust the catalog before rescanning the tree
+REFRESH_INTERVAL = float(os.getenv("MODEL_REGISTRY_REFRESH", "1.0"))
+
+log = logging.getLogger("waw.cloud.registry")
+
+REGISTRY_MIGRATIONS: List[Tuple[str, ...]] = [
+    # 1: one row per release file
+    (
+        """
+        CREATE TABLE IF NOT EXISTS release (
+            name TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            version TEXT NOT NULL,
+            version_key TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            source_key TEXT NOT NULL,
+            published_at INTEGER NOT NULL,
+            PRIMARY KEY (name, channel, version)
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_release_latest
+        ON release (name, channel, version_key DESC);
+        """,
+    ),
+]
+
+_VERSION_PART = re.compile(r"\d+|[^\d.\-_]+")
+
+
+def version_key(version: str) -> str:
+    """Sort key under which ``1.10`` follows ``1.9`` and ``10`` ``9``."""
+    return ".".join(
+        part.zfill(12) if part.isdigit() else part
+        for part in _VERSION_PART.findall(version)
+    )
+
+
+class Release(NamedTuple):
+    name: str
+    channel: str
+    version: str
+    sha256: str
+    size: int
+    source_key: str
+    published_at: int
+
+    def info(self) -> dict:
+        """Public metadata, as served by ``GET /models``."""
+        return {
+            "name": self.name,
+            "channel": self.channel,
+            "version": self.version,
+            "sha256": self.sha256,
+            "size": self.size,
+            "published_at": self.published_at,
+        }
+
+
+class ModelRegistry:
+    """Catalog of model releases under ``root``."""
+
+    def __init__(
+        self,
+        root: Path = REGISTRY_DIR,
+        db_path: Optional[Path] = None,
+        refresh_interval: float = REFRESH_INTERVAL,
+        publisher: Optional[ModelPublisher] = None,
+    ):
+        self.root = root
+        self.db_path = db_path or root / ".catalog.db"
+        self.refresh_interval = refresh_interval
+        self.publisher = publisher or ModelPublisher()
+        self._flight = SingleFlight()
+        self._conn: Optional[sqlite3.Connection] = None
+        # (name, channel, version) -> Release, mirroring the catalog
+        self._releases: Dict[Tuple[str, str, str], Release] = {}
+        # (name, channel) -> newest Release
+        self._latest: Dict[Tuple[str, str], Release] = {}
+        self._refreshed = float("-inf")
+
+    # ─── Lookups ───────────────────────────────────────────────────────
+
+    def latest(self, name: str, channel: str) -> Optional[Release]:
+        self._refresh_if_stale()
+        return self._latest.get((name, channel))
+
+    def get(self, name: str, channel: str, version: str) -> Optional[Release]:
+        self._refresh_if_stale()
+        return self._releases.get((name, channel, version))
+
+    def catalog(self) -> List[Release]:
+        """Return the newest release of every (name, channel)."""
+        self._refresh_if_stale()
+        return sorted(self._latest.values())
+
+    def source(self, release: Release) -> Path:
+        return (
+            self.root / release.name / release.channel
+            / f"{release.version}.bin"
+        )
+
+    def path(self, release: Release) -> Optional[Path]:
+        """Return the published copy of ``release``, if it still exists."""
+        store = self.publisher.store_for(self.source(release))
+        return store.path(release.sha256) if store.has(
+            release.sha256
+        ) else None
+
+    # ─── Refreshing ────────────────────────────────────────────────────
+
+    def _refresh_if_stale(self) -> None:
+        if time.monotonic() - self._refreshed >= self.refresh_interval:
+            self.refresh()
+
+    def refresh(self) -> List[Release]:
+        """Bring the catalog in line with the release files on disk.
+
+        Returns the releases added or changed since the last refresh.
+        """
+        return self._flight.do("refresh", self._refresh)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path), check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode = WAL;")
+            waw_storage.migrate(
+                conn, REGISTRY_MIGRATIONS, label="Model catalog"
+            )
+            for row in conn.execute(
+                "SELECT name, channel, version, sha256, size, source_key, "
+                "published_at FROM release"
+            ):
+                release = Release(*row)
+                self._releases[release[:3]] = release
+            self._conn = conn
+        return self._conn
+
+    def _refresh(self) -> List[Release]:
+        conn = self._connect()
+        seen = set()
+        changed: List[Release] = []
+        for source in sorted(self.root.glob("*/*/*.bin")):
+            parts = source.relative_to(self.root).parts
+            if any(part.startswith(".") for part in parts):
+                continue
+            ident = (parts[0], parts[1], source.stem)
+            try:
+                key = json.dumps(stat_key(source.stat()))
+            except FileNotFoundError:
+                continue
+            seen.add(ident)
+            known = self._releases.get(ident)
+            if known and known.source_key == key and self.path(known):
+                self.publisher.remember(
+                    source, tuple(json.loads(key)), known.sha256
+                )
+                continue
+            try:
+                published = self.publisher.current(source)
+            except ModelBusy:
+                log.info("⏳ Release still being written: %s", source)
+                continue
+            if published is None:
+                seen.discard(ident)
+                continue
+            sha, path = published
+            if known and (known.sha256, known.source_key) == (sha, key):
+                continue
+            release = Release(
+                *ident, sha, path.stat().st_size, key,
+                known.published_at if known and known.sha256 == sha
+                else int(time.time()),
+            )
+            conn.execute(
+                "INSERT INTO release (name, channel, version, version_key, "
+                "sha256, size, source_key, published_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (name, channel, version) DO UPDATE SET "
+                "sha256 = excluded.sha256, size = excluded.size, "
+                "source_key = excluded.source_key, "
+                "published_at = excluded.published_at",
+                (*ident, version_key(ident[2]), *release[3:]),
+            )
+            self._releases[ident] = release
+            if not known or known.sha256 != sha:
+                changed.append(release)
+        removed = set(self._releases) - seen
+        for ident in removed:
+            conn.execute(
+                "DELETE FROM release "
+                "WHERE name = ? AND channel = ? AND version = ?",
+                ident,
+            )
+            del self._releases[ident]
+        conn.commit()
+        if changed or removed or not self._latest:
+            self._latest = self._newest(conn)
+        self._refreshed = time.monotonic()
+        for release in changed:
+            log.info(
+                "📦 Model release published",
+                extra={"model": release.name, "channel": release.channel,
+                       "version": release.version},
+            )
+        return changed
+
+    def _newest(
+        self, conn: sqlite3.Connection
+    ) -> Dict[Tuple[str, str], Release]:
+        # The (name, channel, version_key DESC) index serves the subquery
+        rows = conn.execute(
+            "SELECT name, channel, version FROM release AS r "
+            "WHERE version_key = (SELECT MAX(version_key) FROM release "
+            "WHERE name = r.name AND channel = r.channel)"
+        )
+        return {
+            (name, channel): self._releases[(name, channel, version)]
+            for name, channel, version in rows
+        }
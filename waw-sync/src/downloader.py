@@ -0,0 +1,482 @@
+"""
+Parallel ranged downloads for large model files.
+
+A single HTTP stream cannot fill a long, fat pipe, so models above
+``MODEL_RANGE_THRESHOLD`` bytes are split into ``MODEL_PART_SIZE`` byte
+ranges fetched over up to ``MODEL_DOWNLOAD_CONNECTIONS`` pooled
+connections. Each range is written at its offset into a preallocated
+``<name>.part`` file; the SHA-256 is checked once the file is complete
+and only then is it renamed over the destination.
+
+Downloads can also run in the background without crowding out
+interactive traffic (see ``BandwidthPolicy``): a token bucket caps the
+rate at ``MODEL_DOWNLOAD_RATE`` bytes/s, the rate of capped or sliced
+downloads backs off when time-to-first-byte rises above the link's
+baseline and creeps back up while it stays low, and the cap is lifted
+during ``MODEL_DOWNLOAD_IDLE_HOURS`` (local time, e.g. ``22-6``). A
+download given a deadline stops at a range boundary once it passes;
+the completed ranges are recorded next to the ``.part`` file, so the
+next attempt resumes where this one stopped.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+
+import waw_metrics
+from waw_lazy import lazy_import
+
+requests = lazy_import("requests")
+
+CONNECTIONS = int(os.getenv("MODEL_DOWNLOAD_CONNECTIONS", "4"))
+RANGE_THRESHOLD = int(
+    os.getenv("MODEL_RANGE_THRESHOLD", str(32 * 1024 * 1024))
+)
+PART_SIZE = int(os.getenv("MODEL_PART_SIZE", str(8 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+# Network reads are smaller so a rate cap paces them smoothly
+READ_SIZE = 128 * 1024
+
+# Bytes/s cap outside idle hours; 0 leaves downloads unthrottled
+RATE_LIMIT = int(os.getenv("MODEL_DOWNLOAD_RATE", "0"))
+# Local hours "start-end" (wrapping past midnight) with no rate cap
+IDLE_HOURS = os.getenv("MODEL_DOWNLOAD_IDLE_HOURS", "")
+ADAPTIVE = os.getenv("MODEL_DOWNLOAD_ADAPTIVE", "1") != "0"
+# Seconds of downloading per sync cycle before pausing; 0 = no limit
+SLICE_SECONDS = float(os.getenv("MODEL_DOWNLOAD_SLICE", "0"))
+MIN_RATE = 64 * 1024
+# Time-to-first-byte this far above the baseline means a busy link
+RTT_TOLERANCE = 2.0
+RTT_SLACK = 0.02
+
+log = logging.getLogger("waw.sync.download")
+
+RATE_GAUGE = waw_metrics.gauge(
+    "sync_model_download_rate_limit_bytes_per_second",
+    "Current model download rate limit (0 when unthrottled).",
+)
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    """A download failed or produced content with the wrong checksum."""
+
+
+class DownloadPaused(Exception):
+    """A download hit its deadline; the next attempt resumes it."""
+
+    def __init__(self, done: int, total: int):
+        super().__init__(f"paused at {done}/{total} bytes")
+        self.done = done
+        self.total = total
+
+
+def sha256_file(path: Path, chunk_size: int = CHUNK_SIZE) -> str:
+    """Hash a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """Return inclusive ``(start, end)`` byte ranges covering ``size``."""
+    return [
+        (start, min(start + part_size, size) - 1)
+        for start in range(0, size, part_size)
+    ]
+
+
+def parse_hours(value: str) -> Optional[Tuple[int, int]]:
+    """Parse ``"22-6"`` into ``(22, 6)``; None when unset.
+
+    Raises ``ValueError`` if ``value`` is not two hours joined by ``-``.
+    """
+    if not value:
+        return None
+    start, sep, end = value.partition("-")
+    if not sep:
+        raise ValueError(f"expected hours as start-end, got {value!r}")
+    return int(start) % 24, int(end) % 24
+
+
+def configured_idle_hours() -> Optional[Tuple[int, int]]:
+    """Return ``MODEL_DOWNLOAD_IDLE_HOURS``, ignoring a malformed value."""
+    try:
+        return parse_hours(IDLE_HOURS)
+    except ValueError as e:
+        log.warning("⚠️  Ignoring MODEL_DOWNLOAD_IDLE_HOURS: %s", e)
+        return None
+
+
+# ─── Throttling ────────────────────────────────────────────────────────────
+
+class BandwidthPolicy:
+    """Token-bucket rate limit that backs off when the link gets busy.
+
+    ``rate`` is None while downloads run unthrottled. Time-to-first-byte
+    of each range request is compared with the lowest seen so far; a
+    rise means other traffic is queueing on the link, so the rate is cut
+    to 70% (of the measured throughput if there was no cap). Otherwise
+    it grows by 10% per range until it reaches the ceiling: ``max_rate``,
+    or no cap at all during idle hours.
+
+    Adaptation only applies to background downloads, i.e. with a rate
+    cap or a ``MODEL_DOWNLOAD_SLICE``; otherwise downloads use the whole
+    link.
+    """
+
+    def __init__(
+        self,
+        max_rate: int = RATE_LIMIT,
+        idle_hours: Optional[Tuple[int, int]] = configured_idle_hours(),
+        adaptive: bool = ADAPTIVE,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.max_rate = max_rate or None
+        self.idle_hours = idle_hours
+        self.adaptive = adaptive and (self.capped or SLICE_SECONDS > 0)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.rate: Optional[float] = None
+        self.baseline_rtt: Optional[float] = None
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+        self._bytes = 0
+        self._started: Optional[float] = None
+        self.reset()
+
+    @property
+    def capped(self) -> bool:
+        return self.max_rate is not None
+
+    def idle(self) -> bool:
+        if self.idle_hours is None:
+            return False
+        start, end = self.idle_hours
+        hour = self.clock().hour
+        return start <= hour < end if start <= end else (
+            hour >= start or hour < end
+        )
+
+    def ceiling(self) -> Optional[float]:
+        return None if self.idle() else self.max_rate
+
+    def reset(self) -> None:
+        """Start a new download at the ceiling rate."""
+        with self._lock:
+            self.rate = self.ceiling()
+            self._tokens = 0.0
+            self._refilled = time.monotonic()
+            self._bytes = 0
+            self._started = None
+        RATE_GAUGE.set(self.rate or 0)
+
+    def throughput(self) -> Optional[float]:
+        if self._started is None:
+            return None
+        elapsed = time.monotonic() - self._started
+        return self._bytes / elapsed if elapsed > 0 else None
+
+    def observe_rtt(self, rtt: float) -> None:
+        """Adjust the rate from one request's time-to-first-byte."""
+        if not self.adaptive:
+            return
+        with self._lock:
+            if self.baseline_rtt is None or rtt < self.baseline_rtt:
+                self.baseline_rtt = rtt
+            ceiling = self.ceiling()
+            busy = rtt > self.baseline_rtt * RTT_TOLERANCE + RTT_SLACK
+            current = self.rate or self.throughput()
+            if busy and current:
+                self.rate = max(MIN_RATE, current * 0.7)
+            elif self.rate is not None:
+                grown = self.rate * 1.1
+                if ceiling is not None:
+                    self.rate = min(ceiling, grown)
+                elif grown >= 2 * (self.throughput() or grown):
+                    # Far above what the link delivers; stop limiting
+                    self.rate = None
+                else:
+                    self.rate = grown
+            rate = self.rate
+        RATE_GAUGE.set(rate or 0)
+
+    def consume(self, nbytes: int) -> None:
+        """Block until ``nbytes`` may be written under the current rate."""
+        with self._lock:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            self._bytes += nbytes
+            rate = self.rate
+            if rate is None:
+                return
+            # One second of burst at most
+            self._tokens = min(
+                rate, self._tokens + (now - self._refilled) * rate
+            ) - nbytes
+            self._refilled = now
+            wait_for = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait_for:
+            time.sleep(wait_for)
+
+
+class PartManifest:
+    """Records which ranges of a ``.part`` file are already complete."""
+
+    def __init__(self, path: Path, sha256: str, size: int, part_size: int):
+        self.path = path
+        self.key = {"sha256": sha256, "size": size, "part_size": part_size}
+        self.done: Set[int] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(
+        cls, path: Path, sha256: str, size: int, part_size: int
+    ) -> "PartManifest":
+        """Return the saved progress, or an empty one if it is stale."""
+        manifest = cls(path, sha256, size, part_size)
+        try:
+            saved = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return manifest
+        if all(saved.get(k) == v for k, v in manifest.key.items()):
+            manifest.done = set(saved.get("done", []))
+        return manifest
+
+    def mark(self, start: int) -> None:
+        """Record a completed range; written atomically."""
+        with self._lock:
+            self.done.add(start)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps({**self.key, "done": sorted(self.done)}))
+            os.replace(tmp, self.path)
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+# ─── Downloader ────────────────────────────────────────────────────────────
+
+class RangeDownloader:
+    """Fetches one URL as concurrent byte ranges into a single file."""
+
+    def __init__(
+        self,
+        connections: int = CONNECTIONS,
+        part_size: int = PART_SIZE,
+        threshold: int = RANGE_THRESHOLD,
+        retries: int = 2,
+        timeout: float = 30.0,
+        session=None,
+        policy: Optional[BandwidthPolicy] = None,
+        slice_seconds: float = SLICE_SECONDS,
+    ):
+        self.connections = max(1, connections)
+        self.part_size = max(CHUNK_SIZE, part_size)
+        self.threshold = threshold
+        self.retries = retries
+        self.timeout = timeout
+        self._session = session
+        self.policy = policy or BandwidthPolicy()
+        self.slice_seconds = slice_seconds
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.connections
+            )
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def accepts(self, response) -> bool:
+        """Return True if ``response`` should be re-fetched in ranges.
+
+        Large files always are; with a rate cap or a time slice every
+        file is, so that it is throttled and can resume.
+        """
+        size = response.headers.get("Content-Length", "")
+        if response.headers.get("Accept-Ranges", "").lower() != "bytes":
+            return False
+        if not size.isdigit():
+            return False
+        return (
+            int(size) >= self.threshold
+            or self.policy.capped
+            or self.slice_seconds > 0
+        )
+
+    def download(
+        self,
+        url: str,
+        dest: Path,
+        size: int,
+        expected_sha256: str,
+        validator: Optional[str] = None,
+    ) -> int:
+        """Download ``size`` bytes of ``url`` to ``dest``; return the
+        bytes fetched by this call.
+
+        ``validator`` (an ETag) is sent as ``If-Range`` so a file that
+        changes mid-download fails fast instead of mixing versions.
+        Ranges saved by an earlier, interrupted call for the same SHA are
+        not fetched again. Raises ``DownloadPaused`` once
+        ``slice_seconds`` have passed with ranges still missing.
+        """
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + ".part")
+        manifest = PartManifest.load(
+            part.with_name(part.name + ".json"),
+            expected_sha256, size, self.part_size,
+        )
+        resume = bool(manifest.done) and part.exists() and (
+            part.stat().st_size == size
+        )
+        if not resume:
+            manifest.done.clear()
+        todo = [
+            (start, end) for start, end in split_ranges(size, self.part_size)
+            if start not in manifest.done
+        ]
+        if resume:
+            log.info(
+                "⏯️  Resuming model download",
+                extra={"remaining": len(todo)},
+            )
+        deadline = (
+            time.monotonic() + self.slice_seconds
+            if self.slice_seconds > 0 else None
+        )
+
+        self.policy.reset()
+        flags = os.O_RDWR | os.O_CREAT | (0 if resume else os.O_TRUNC)
+        fd = os.open(part, flags, 0o644)
+        fetched = 0
+        try:
+            if not resume:
+                self._preallocate(fd, size)
+            if todo:
+                fetched = self._fetch_all(
+                    url, fd, todo, validator, manifest, deadline
+                )
+        finally:
+            os.close(fd)
+
+        missing = sum(
+            end - start + 1 for start, end in todo
+            if start not in manifest.done
+        )
+        if missing:
+            raise DownloadPaused(size - missing, size)
+
+        sha = sha256_file(part)
+        manifest.discard()
+        if sha != expected_sha256:
+            part.unlink(missing_ok=True)
+            raise DownloadError(
+                f"checksum mismatch: got {sha}, expected {expected_sha256}"
+            )
+        os.replace(part, dest)
+        log.debug(
+            "Ranged download complete",
+            extra={"bytes": size, "fetched": fetched},
+        )
+        return fetched
+
+    def _fetch_all(
+        self, url: str, fd: int, ranges: List[Tuple[int, int]],
+        validator: Optional[str], manifest: PartManifest,
+        deadline: Optional[float],
+    ) -> int:
+        def fetch(start: int, end: int) -> int:
+            if deadline is not None and time.monotonic() >= deadline:
+                return 0
+            self._fetch(url, fd, start, end, validator)
+            # Durable before it is recorded as done
+            os.fsync(fd)
+            manifest.mark(start)
+            return end - start + 1
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.connections, len(ranges)),
+            thread_name_prefix="waw-download",
+        ) as pool:
+            futures = [pool.submit(fetch, *r) for r in ranges]
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+            return sum(future.result() for future in done)
+
+    @staticmethod
+    def _preallocate(fd: int, size: int) -> None:
+        if size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                # Not supported by this filesystem
+                pass
+        os.ftruncate(fd, size)
+
+    def _fetch(
+        self, url: str, fd: int, start: int, end: int,
+        validator: Optional[str],
+    ) -> None:
+        headers = {"Range": f"bytes={start}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+        for attempt in range(self.retries + 1):
+            try:
+                sent = time.monotonic()
+                with self.session.get(
+                    url, headers=headers, stream=True, timeout=self.timeout
+                ) as resp:
+                    self.policy.observe_rtt(time.monotonic() - sent)
+                    self._check_partial(resp, start, end)
+                    offset = start
+                    for chunk in resp.iter_content(chunk_size=READ_SIZE):
+                        self.policy.consume(len(chunk))
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+                if offset != end + 1:
+                    raise requests.ConnectionError(
+                        f"short read for bytes {start}-{end}"
+                    )
+                return
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise DownloadError(
+                        f"bytes {start}-{end} failed: {e}"
+                    ) from e
+                log.debug("Retrying range", extra={"start": start})
+
+    @staticmethod
+    def _check_partial(resp, start: int, end: int) -> None:
+        if resp.status_code != 206:
+            # 200 means the If-Range validator no longer matches
+            raise DownloadError(
+                f"expected 206 for bytes {start}-{end}, "
+                f"got {resp.status_code}"
+            )
+        match = _CONTENT_RANGE.fullmatch(
+            resp.headers.get("Content-Range", "")
+        )
+        if not match or (int(match[1]), int(match[2])) != (start, end):
+            raise DownloadError(
+                f"unexpected Content-Range for bytes {start}-{end}: "
+                f"{resp.headers.get('Content-Range')!r}"
+            )
@@ -0,0 +1,421 @@
+"""
+LAN model cache: sync clients on one network share model files so a
+release crosses the WAN about once per site instead of once per client.
+
+Every node serves the models it holds over HTTP (``GET /models/<sha>``,
+with byte ranges) and periodically announces ``{node, port, models}``
+as a UDP datagram to the multicast group ``LAN_CACHE_GROUP`` and to any
+``LAN_CACHE_PEERS`` (``host:port`` announce addresses, for networks
+without multicast; a node answers newcomers directly, so one side
+listing the other is enough). ``ModelSync`` asks ``sources(sha)`` for
+peers that announced the model it needs and fetches from them with the
+usual ranged downloader, which checks the SHA-256 before the file is
+used; a peer that serves bad data is skipped and the cloud remains the
+fallback.
+
+Clients that learn of a release together must not all go to the cloud:
+one with no peer to fetch from first waits a random part of
+``LAN_CACHE_WAIT`` seconds, and nodes announce the models they are
+fetching too. A client that hears a peer is already fetching the model
+waits for it (up to ``LAN_CACHE_FETCH_WAIT`` seconds) instead. The sync
+loop waits in short slices (``wait_for(..., budget=...)``) so profile
+sync keeps running; the wait carries over to its next cycle.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import waw_metrics
+
+ENABLED = os.getenv("LAN_CACHE", "0") == "1"
+GROUP = os.getenv("LAN_CACHE_GROUP", "239.255.77.77:47474")
+PEERS = os.getenv("LAN_CACHE_PEERS", "")
+# Port serving /models/<sha>; 0 picks a free one (it is announced)
+HTTP_PORT = int(os.getenv("LAN_CACHE_PORT", "0"))
+ANNOUNCE_INTERVAL = float(os.getenv("LAN_CACHE_ANNOUNCE_INTERVAL", "30"))
+WAIT_SECONDS = float(os.getenv("LAN_CACHE_WAIT", "10"))
+FETCH_WAIT_SECONDS = float(os.getenv("LAN_CACHE_FETCH_WAIT", "300"))
+COPY_SIZE = 1024 * 1024
+MAX_DATAGRAM = 8192
+
+log = logging.getLogger("waw.sync.lan")
+
+LAN_PEERS = waw_metrics.gauge(
+    "sync_lan_peers", "LAN cache peers heard from recently."
+)
+LAN_SERVED_BYTES = waw_metrics.counter(
+    "sync_lan_served_bytes_total", "Model bytes served to LAN peers."
+)
+
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+def parse_address(value: str) -> Tuple[str, int]:
+    """Split ``"host:port"``."""
+    host, _, port = value.strip().rpartition(":")
+    return host, int(port)
+
+
+def parse_peers(value: str) -> List[Tuple[str, int]]:
+    return [parse_address(peer) for peer in value.split(",") if peer.strip()]
+
+
+class Peer(NamedTuple):
+    url: str
+    address: Tuple[str, int]
+    models: List[str]
+    fetching: List[str]
+    heard: float
+
+
+class LanCache:
+    """Announces, discovers and serves model files on the local network."""
+
+    def __init__(
+        self,
+        group: Optional[str] = GROUP or None,
+        peers: Optional[List[Tuple[str, int]]] = None,
+        http_port: int = HTTP_PORT,
+        announce_port: Optional[int] = None,
+        interval: float = ANNOUNCE_INTERVAL,
+        wait_seconds: float = WAIT_SECONDS,
+        fetch_wait_seconds: float = FETCH_WAIT_SECONDS,
+    ):
+        self.node = uuid.uuid4().hex
+        self.group = parse_address(group) if group else None
+        self.peers = parse_peers(PEERS) if peers is None else peers
+        self.http_port = http_port
+        # Multicast listeners share the group port; unicast needs its own
+        self.announce_port = (
+            announce_port if announce_port is not None
+            else self.group[1] if self.group else 0
+        )
+        self.interval = interval
+        self.wait_seconds = wait_seconds
+        self.fetch_wait_seconds = fetch_wait_seconds
+        # sha -> (path, size, mtime_ns) of files this node serves
+        self._held: Dict[str, Tuple[Path, int, int]] = {}
+        # Models this node is fetching from the cloud
+        self._fetching: Set[str] = set()
+        # node -> Peer
+        self._seen: Dict[str, Peer] = {}
+        # sha -> (started, timeout) of waits spread over several calls
+        self._waits: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._server = None
+        self._sock: Optional[socket.socket] = None
+
+    # ─── Lifecycle ─────────────────────────────────────────────────────
+
+    def start(self) -> "LanCache":
+        self._server = self._serve()
+        self.http_port = self._server.server_address[1]
+        self._sock = self._listen()
+        self.announce_port = self._sock.getsockname()[1]
+        for target, name in (
+            (self._receive, "waw-lan-listen"),
+            (self._announce_loop, "waw-lan-announce"),
+        ):
+            threading.Thread(target=target, name=name, daemon=True).start()
+        log.info(
+            "📡 LAN model cache started",
+            extra={"http_port": self.http_port,
+                   "announce_port": self.announce_port},
+        )
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._sock is not None:
+            self._sock.close()
+
+    # ─── Holding models ────────────────────────────────────────────────
+
+    def publish(self, sha: str, path: Path) -> None:
+        """Serve ``path`` (already verified to hash to ``sha``).
+
+        It replaces whatever model ``path`` held before; models kept in
+        other files stay shared.
+        """
+        stat = path.stat()
+        held = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if self._held.get(sha) == held and sha not in self._fetching:
+                return
+            self._held = {
+                other: entry for other, entry in self._held.items()
+                if entry[0] != path
+            }
+            self._held[sha] = held
+            self._fetching.discard(sha)
+        self.announce()
+
+    def begin_fetch(self, sha: str) -> None:
+        """Tell peers this node is fetching ``sha`` from the cloud."""
+        with self._lock:
+            self._fetching.add(sha)
+        self.announce()
+
+    def end_fetch(self, sha: str) -> None:
+        """Withdraw a ``begin_fetch`` that did not end in ``publish``."""
+        with self._lock:
+            self._fetching.discard(sha)
+        self.announce()
+
+    def held_path(self, sha: str) -> Optional[Path]:
+        """Return the file for ``sha`` if it is still unchanged on disk."""
+        with self._lock:
+            held = self._held.get(sha)
+        if held is None:
+            return None
+        path, size, mtime_ns = held
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            return None
+        return path
+
+    # ─── Discovery ─────────────────────────────────────────────────────
+
+    def sources(self, sha: str) -> List[str]:
+        """Return model URLs of live peers holding ``sha``, shuffled."""
+        with self._lock:
+            urls = self._sources_locked(sha)
+        random.shuffle(urls)
+        return urls
+
+    def _live_peers(self) -> List[Peer]:
+        cutoff = time.monotonic() - 3 * self.interval
+        self._seen = {
+            node: peer for node, peer in self._seen.items()
+            if peer.heard >= cutoff
+        }
+        LAN_PEERS.set(len(self._seen))
+        return list(self._seen.values())
+
+    def _sources_locked(self, sha: str) -> List[str]:
+        return [
+            f"{peer.url}/models/{sha}"
+            for peer in self._live_peers() if sha in peer.models
+        ]
+
+    def wait_for(
+        self,
+        sha: str,
+        timeout: Optional[float] = None,
+        budget: Optional[float] = None,
+    ) -> List[str]:
+        """Wait for a peer to announce it holds ``sha``; return its URLs.
+
+        Gives up after ``timeout`` (default: a random share of
+        ``wait_seconds``), unless a peer is fetching ``sha``, in which
+        case it waits up to ``fetch_wait_seconds`` for that fetch.
+
+        With ``budget``, returns after at most that many seconds; the
+        wait is then ``still_waiting`` and the next call for ``sha``
+        picks it up where this one stopped.
+        """
+        now = time.monotonic()
+        with self._changed:
+            stale = now - max(self.wait_seconds, self.fetch_wait_seconds)
+            for other, (since, _) in list(self._waits.items()):
+                if since < stale:
+                    del self._waits[other]
+            started, timeout = self._waits.get(sha) or (
+                now,
+                random.uniform(0, self.wait_seconds) if timeout is None
+                else timeout,
+            )
+            stop_at = float("inf") if budget is None else now + budget
+            urls: List[str] = []
+            while not self._stop.is_set():
+                urls = self._sources_locked(sha)
+                if urls:
+                    break
+                fetching = any(
+                    sha in peer.fetching for peer in self._live_peers()
+                )
+                limit = self.fetch_wait_seconds if fetching else timeout
+                now = time.monotonic()
+                remaining = started + limit - now
+                if remaining <= 0:
+                    break
+                if now >= stop_at:
+                    self._waits[sha] = (started, timeout)
+                    return []
+                # Wake at least once per interval to expire dead peers
+                self._changed.wait(
+                    min(remaining, stop_at - now, self.interval)
+                )
+            self._waits.pop(sha, None)
+        random.shuffle(urls)
+        return urls
+
+    def still_waiting(self, sha: str) -> bool:
+        """True if a ``wait_for(sha)`` ran out of budget, not of time."""
+        with self._lock:
+            return sha in self._waits
+
+    def announce(self, to: Optional[Tuple[str, int]] = None) -> None:
+        """Tell peers (or just ``to``) which models this node serves."""
+        if self._sock is None:
+            return
+        with self._lock:
+            message = json.dumps({
+                "node": self.node,
+                "port": self.http_port,
+                "models": list(self._held),
+                "fetching": sorted(self._fetching),
+            }).encode()
+        if to is not None:
+            targets = [to]
+        elif self.group:
+            targets = self.peers + [self.group]
+        else:
+            # Without multicast, also answer peers that found us
+            with self._lock:
+                heard = [peer.address for peer in self._live_peers()]
+            targets = list(dict.fromkeys(self.peers + heard))
+        for target in targets:
+            try:
+                self._sock.sendto(message, target)
+            except OSError as e:
+                log.debug("LAN announce to %s failed: %s", target, e)
+
+    def handle_announcement(
+        self, data: bytes, sender: Tuple[str, int]
+    ) -> None:
+        try:
+            message = json.loads(data)
+            node, port = message["node"], int(message["port"])
+            models = [str(sha) for sha in message.get("models", [])]
+            fetching = [str(sha) for sha in message.get("fetching", [])]
+        except (ValueError, KeyError, TypeError):
+            return
+        if node == self.node:
+            return
+        with self._changed:
+            is_new = node not in self._seen
+            self._seen[node] = Peer(
+                f"http://{sender[0]}:{port}", sender, models, fetching,
+                time.monotonic(),
+            )
+            self._changed.notify_all()
+        if is_new:
+            # Announcements are sent from the listening socket, so the
+            # newcomer hears back at once without having us configured
+            self.announce(to=sender)
+
+    def _listen(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.group and hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.announce_port))
+        if self.group:
+            membership = struct.pack(
+                "4s4s", socket.inet_aton(self.group[0]),
+                socket.inet_aton("0.0.0.0"),
+            )
+            try:
+                sock.setsockopt(
+                    socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership
+                )
+                sock.setsockopt(
+                    socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1
+                )
+            except OSError as e:
+                log.warning("⚠️  LAN multicast unavailable: %s", e)
+        return sock
+
+    def _receive(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data, sender = self._sock.recvfrom(MAX_DATAGRAM)
+            except OSError:
+                return
+            self.handle_announcement(data, sender[:2])
+
+    def _announce_loop(self) -> None:
+        self.announce()
+        while not self._stop.wait(self.interval):
+            self.announce()
+
+    # ─── Serving ───────────────────────────────────────────────────────
+
+    def _serve(self):
+        # Imported here: http.server is costly and the cache is opt-in
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        cache = self
+
+        class ModelHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url_path = urlsplit(self.path).path
+                prefix, _, sha = url_path.partition("/models/")
+                path = None if prefix else cache.held_path(sha)
+                if path is None:
+                    self.send_error(404)
+                    return
+                size = path.stat().st_size
+                start, end, status = 0, size - 1, 200
+                requested = self.headers.get("Range")
+                if requested:
+                    match = _RANGE.fullmatch(requested.strip())
+                    if not match or int(match[1]) >= size:
+                        self.send_error(416)
+                        return
+                    start = int(match[1])
+                    end = min(int(match[2] or size - 1), size - 1)
+                    if end < start:
+                        self.send_error(416)
+                        return
+                    status = 206
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("X-Model-SHA256", sha)
+                if status == 206:
+                    self.send_header(
+                        "Content-Range", f"bytes {start}-{end}/{size}"
+                    )
+                self.end_headers()
+                with path.open("rb") as f:
+                    f.seek(start)
+                    remaining = end - start + 1
+                    while remaining:
+                        block = f.read(min(COPY_SIZE, remaining))
+                        if not block:
+                            break
+                        self.wfile.write(block)
+                        remaining -= len(block)
+                LAN_SERVED_BYTES.inc(end - start + 1 - remaining)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("", self.http_port), ModelHandler)
+        server.daemon_threads = True
+        threading.Thread(
+            target=server.serve_forever, name="waw-lan-http", daemon=True
+        ).start()
+        return server
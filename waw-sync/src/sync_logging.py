@@ -0,0 +1,154 @@
+"""
+Structured logging for the sync service: JSON or text records, sampling
+of chatty levels, rate limiting of repeated status lines, and a
+queue-based handler so the sync loop never blocks on stdout.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("SYNC_LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("SYNC_LOG_FORMAT", "json")
+# Seconds between repeats of the same throttled message
+LOG_RATE_WINDOW = float(os.getenv("SYNC_LOG_RATE_WINDOW", "300"))
+# Fraction of DEBUG/INFO records kept (WARNING and above always are)
+LOG_SAMPLE_RATE = float(os.getenv("SYNC_LOG_SAMPLE_RATE", "1.0"))
+
+# Pass as ``extra=`` on repetitive per-cycle status lines; use
+# ``{"throttle": "<key>"}`` to throttle variants of a message separately
+THROTTLED = {"throttle": True}
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message", "asctime", "throttle", "suppressed",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record and its ``extra`` fields as one JSON line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Emit a throttled message at most once per window.
+
+    Records are keyed by logger, level, unformatted message and the
+    ``throttle`` value, so the same status line with different arguments
+    still counts as a repeat. The next emitted copy carries a
+    ``suppressed`` count.
+    """
+
+    def __init__(self, window: float = LOG_RATE_WINDOW):
+        super().__init__()
+        self.window = window
+        self._seen: Dict[tuple, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "throttle", False):
+            return True
+        throttle = getattr(record, "throttle", True)
+        key = (record.name, record.levelno, str(record.msg), str(throttle))
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.get(key, (None, 0))
+            if last is not None and now - last < self.window:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+        record.suppressed = suppressed
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records below WARNING."""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    rate_window: float = LOG_RATE_WINDOW,
+    sample_rate: float = LOG_SAMPLE_RATE,
+    stream=None,
+) -> logging.handlers.QueueListener:
+    """Route the ``waw`` loggers through a non-blocking queue handler.
+
+    Filtering happens on the calling thread so dropped records cost no
+    queue traffic; formatting and I/O happen on the listener thread.
+    Calling it again replaces the previous configuration.
+    """
+    global _listener
+
+    if fmt == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s: %(message)s"
+        )
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(formatter)
+
+    records: queue.Queue = queue.Queue(-1)
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_rate))
+    handler.addFilter(RateLimitFilter(rate_window))
+
+    root = logging.getLogger("waw")
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        for old in list(root.handlers):
+            root.removeHandler(old)
+        root.addHandler(handler)
+        root.setLevel(level)
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -4,66 +4,312 @@ cloud service.
 """
 
 import json
+import logging
 import os
 import sqlite3
+import threading
 import time
 import hashlib
-from datetime import datetime
+import random
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from urllib.parse import quote
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+)
 
-import requests
 from dotenv import load_dotenv
 
+import waw_metrics
+import waw_storage
+from waw_lazy import lazy_import
+from waw_profiling import PROFILER
+from sync_logging import THROTTLED, configure_logging
+from downloader import (
+    BandwidthPolicy, DownloadError, DownloadPaused, RangeDownloader,
+    sha256_file,
+)
+import lan_cache
+from lan_cache import LanCache
+
+# Heavy modules load on first use so the loop starts (and logs) quickly
+grpc = lazy_import("grpc")
+requests = lazy_import("requests")
+identity_pb2 = lazy_import("identity_pb2")
+identity_pb2_grpc = lazy_import("identity_pb2_grpc")
+
 # ─── Configuration ─────────────────────────────────────────────────────────
 
 load_dotenv()
 
+log = logging.getLogger("waw.sync")
+
 MASTER_KEY = os.getenv("waw_MASTER_KEY", "dummy_key")
 DB_PATH = Path(os.getenv("PROFILE_DB_PATH", "identity.db"))
 STATE_PATH = Path(
+    os.path.expanduser(
+        os.getenv("STATE_DB", "~/.waw/state.db")
+    )
+)
+# JSON state written by older versions; imported into STATE_PATH once
+LEGACY_STATE_PATH = Path(
     os.path.expanduser(
         os.getenv("STATE_FILE", "~/.waw/state.json")
     )
 )
+OUTBOX_PATH = Path(
+    os.path.expanduser(
+        os.getenv("OUTBOX_FILE", "~/.waw/outbox.db")
+    )
+)
 CLOUD_URL = os.getenv("CLOUD_SYNC_URL", "")
+IDENTITY_ADDR = os.getenv("IDENTITY_GRPC_ADDR", "localhost:50051")
+
+# Seconds between local checks, and between model polls while the
+# cloud event stream is connected (events then drive model updates)
+POLL_INTERVAL = int(os.getenv("SYNC_POLL_INTERVAL", "60"))
+PUSH_POLL_INTERVAL = int(os.getenv("SYNC_PUSH_POLL_INTERVAL", "900"))
+EVENTS_ENABLED = os.getenv("CLOUD_EVENTS", "1") != "0"
+# Registry models to track, as name[:channel],... (empty: /model/latest)
+SYNC_MODELS = os.getenv("SYNC_MODELS", "")
+# Seconds per cycle the loop may block waiting for LAN peers; longer
+# waits continue on the following cycles
+LAN_WAIT_BUDGET = float(os.getenv("SYNC_LAN_WAIT_BUDGET", "2"))
+
+# Local Prometheus endpoint (127.0.0.1); 0 disables it
+METRICS_PORT = int(os.getenv("SYNC_METRICS_PORT", "9102"))
+
+SYNC_CYCLES = waw_metrics.counter(
+    "sync_cycles_total", "Completed sync loop cycles."
+)
+SYNC_ERRORS = waw_metrics.counter(
+    "sync_errors_total", "Sync stages that raised.", ["stage"]
+)
+SYNC_STAGE_LATENCY = waw_metrics.histogram(
+    "sync_stage_duration_seconds", "Sync stage latency.", ["stage"]
+)
+MODEL_DOWNLOAD_BYTES = waw_metrics.counter(
+    "sync_model_download_bytes_total", "Model bytes downloaded."
+)
+MODEL_DOWNLOAD_LATENCY = waw_metrics.histogram(
+    "sync_model_download_seconds", "Model download wall time."
+)
+MODEL_DOWNLOAD_THROUGHPUT = waw_metrics.gauge(
+    "sync_model_download_bytes_per_second",
+    "Throughput of the most recent model download.",
+)
+MODEL_LAN_BYTES = waw_metrics.counter(
+    "sync_model_lan_bytes_total", "Model bytes downloaded from LAN peers."
+)
+MODEL_HASH_LATENCY = waw_metrics.histogram(
+    "sync_model_hash_seconds", "Time spent hashing the local model."
+)
+
+
+def cloud_base_url(cloud_url: str) -> str:
+    """Return the cloud API root for a ``.../profile`` sync URL."""
+    return cloud_url.rstrip("/").removesuffix("/profile")
+
+
+def field_digest(profile_id: str, value) -> str:
+    """Digest a profile field value so state never stores raw PII."""
+    return hashlib.sha256(f"{profile_id}\0{value}".encode()).hexdigest()[:16]
+
+
+def to_epoch(value) -> int:
+    """Convert an ISO timestamp (or epoch int) to epoch seconds."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+# ─── StateStore ────────────────────────────────────────────────────────────
+
+class StateStore:
+    """Sync state as JSON values in a small SQLite key-value table.
+
+    Every ``set`` is a single-row upsert in its own transaction, so a
+    crash mid-write loses at most that write and never the rest of the
+    state. A legacy ``state.json`` is imported when the store is created.
+    One connection is opened on first use and shared by every call.
+    """
+
+    def __init__(self, path: Path, legacy_path: Optional[Path] = None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the open connection; the caller holds ``_lock``."""
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the state database, creating it if needed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fresh = not self.path.exists()
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL;").fetchall()
+            conn.execute("PRAGMA synchronous = NORMAL;")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            if fresh:
+                self._import_legacy(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        if not (self.legacy_path and self.legacy_path.exists()):
+            return
+        try:
+            data = json.loads(self.legacy_path.read_text())
+        except ValueError as e:
+            log.warning("⚠️  Ignoring unreadable legacy state: %s", e)
+            return
+        with conn:
+            self._write(conn, data)
+        self.legacy_path.rename(
+            self.legacy_path.with_name(self.legacy_path.name + ".imported")
+        )
+        log.info("🗂️  Imported legacy sync state", extra={"keys": len(data)})
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, values: dict) -> None:
+        conn.executemany(
+            "INSERT INTO state (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            [(key, json.dumps(value)) for key, value in values.items()],
+        )
+
+    def get(self, key: str, default=None):
+        """Return the value stored under ``key``, or ``default``."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM state WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key: str, value) -> None:
+        """Store one value."""
+        self.set_many({key: value})
+
+    def set_many(self, values: dict) -> None:
+        """Store several values in one transaction."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._write(conn, values)
 
 
 # ─── FileManager ───────────────────────────────────────────────────────────
 
 class FileManager:
-    """Handles local state and file operations."""
+    """Handles local state and file operations.
+
+    State is kept per profile (sync cursor, field digests) plus a
+    fingerprint per model file; values written by versions that kept a
+    single cursor are used until a per-profile one exists.
+    """
+
+    # STATE_PATH -> its store, so the connection outlives each call
+    _states: Dict[Path, StateStore] = {}
+
+    @staticmethod
+    def state() -> StateStore:
+        store = FileManager._states.get(STATE_PATH)
+        if store is None:
+            store = FileManager._states.setdefault(
+                STATE_PATH, StateStore(STATE_PATH, LEGACY_STATE_PATH)
+            )
+        return store
 
     @staticmethod
-    def get_last_synced_at() -> Optional[int]:
-        """Retrieve the last sync timestamp from state file."""
-        if STATE_PATH.exists():
-            with STATE_PATH.open() as f:
-                data = json.load(f)
-            return data.get("last_synced_at")
-        return None
+    def get_last_synced_at(profile_id: str = "") -> Optional[int]:
+        """Retrieve a profile's last synced timestamp."""
+        state = FileManager.state()
+        ts = state.get(f"cursor:{profile_id}")
+        return ts if ts is not None else state.get("last_synced_at")
 
     @staticmethod
-    def set_last_synced_at(ts: int) -> None:
-        """Write the last sync timestamp to state file."""
-        STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with STATE_PATH.open("w") as f:
-            json.dump({"last_synced_at": ts}, f)
+    def set_last_synced_at(ts: int, profile_id: str = "") -> None:
+        """Record a profile's last synced timestamp."""
+        FileManager.state().set(f"cursor:{profile_id}", ts)
+
+    @staticmethod
+    def set_sync_cursors(cursors: dict) -> None:
+        """Record last synced timestamps for several profiles at once."""
+        FileManager.state().set_many(
+            {f"cursor:{pid}": ts for pid, ts in cursors.items()}
+        )
+
+    @staticmethod
+    def get_field_hashes(profile_id: str = "") -> dict:
+        """Retrieve digests of a profile's last-synced field values."""
+        state = FileManager.state()
+        hashes = state.get(f"fields:{profile_id}")
+        return hashes if hashes is not None else state.get(
+            "field_hashes", {}
+        )
+
+    @staticmethod
+    def set_field_hashes(hashes: dict, profile_id: str = "") -> None:
+        """Write digests of a profile's last-synced field values."""
+        FileManager.state().set(f"fields:{profile_id}", hashes)
 
     @staticmethod
     def get_local_model_sha(model_path: Path) -> Optional[str]:
-        """Compute SHA256 of the local model file."""
-        if model_path.exists():
-            return hashlib.sha256(model_path.read_bytes()).hexdigest()
-        return None
+        """Return the model file's SHA256, re-hashing only if it changed."""
+        try:
+            stat = model_path.stat()
+        except FileNotFoundError:
+            return None
+        state = FileManager.state()
+        key = f"model:{model_path}"
+        fingerprint = [stat.st_size, stat.st_mtime_ns]
+        cached = state.get(key)
+        if cached and cached["fingerprint"] == fingerprint:
+            return cached["sha256"]
+        with MODEL_HASH_LATENCY.time():
+            sha = sha256_file(model_path)
+        state.set(key, {"fingerprint": fingerprint, "sha256": sha})
+        return sha
+
+    @staticmethod
+    def set_local_model_sha(model_path: Path, sha: str) -> None:
+        """Record an already-verified SHA256 for the model file."""
+        stat = model_path.stat()
+        FileManager.state().set(f"model:{model_path}", {
+            "fingerprint": [stat.st_size, stat.st_mtime_ns],
+            "sha256": sha,
+        })
 
     @staticmethod
-    def save_file(model_path: Path, response: requests.Response) -> None:
+    def save_file(model_path: Path, response: "requests.Response") -> None:
         """Save streamed response content to disk."""
         model_path.parent.mkdir(parents=True, exist_ok=True)
+        received = 0
+        start = time.perf_counter()
         with model_path.open("wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
+            for chunk in response.iter_content(chunk_size=64 * 1024):
                 f.write(chunk)
+                received += len(chunk)
+        record_download(received, time.perf_counter() - start)
+
+
+def record_download(received: int, elapsed: float) -> None:
+    """Update the model download metrics."""
+    MODEL_DOWNLOAD_BYTES.inc(received)
+    MODEL_DOWNLOAD_LATENCY.observe(elapsed)
+    if elapsed > 0:
+        MODEL_DOWNLOAD_THROUGHPUT.set(received / elapsed)
 
 
 # ─── ProfileDB ─────────────────────────────────────────────────────────────
@@ -71,14 +317,26 @@ class FileManager:
 class ProfileDB:
     """Encrypted SQLite database access for UserProfile."""
 
+    COLUMNS = (
+        "id", "name", "email", "phone", "created_at", "updated_at",
+        "updated_ts", "version",
+    )
+
     def __init__(self, db_path: Path, master_key: str):
         self.db_path = db_path
         self.master_key = master_key
+        self._migrated = False
 
     def _connect(self) -> sqlite3.Connection:
         """Open encrypted SQLite connection."""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute(f"PRAGMA key = '{self.master_key}';")
+        conn = waw_storage.connect(self.db_path, self.master_key)
+        if not self._migrated:
+            try:
+                waw_storage.migrate(conn)
+            except Exception:
+                conn.close()
+                raise
+            self._migrated = True
         return conn
 
     def get_profile(self) -> Optional[dict]:
@@ -86,15 +344,13 @@ class ProfileDB:
         conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT id, name, email, phone, created_at, updated_at "
-            "FROM profile LIMIT 1"
+            f"SELECT {', '.join(self.COLUMNS)} FROM profile LIMIT 1"
         )
         row = cursor.fetchone()
         conn.close()
         if not row:
             return None
-        keys = ["id", "name", "email", "phone", "created_at", "updated_at"]
-        return dict(zip(keys, row))
+        return dict(zip(self.COLUMNS, row))
 
     def delete_profile(self, profile_id: str) -> None:
         """Delete a profile by ID."""
@@ -105,109 +361,742 @@ class ProfileDB:
         conn.close()
 
 
+# ─── Outbox ────────────────────────────────────────────────────────────────
+
+class Outbox:
+    """Durable queue of pending profile uploads, one record per profile.
+
+    Re-queuing a profile merges into its pending record, so repeated
+    offline edits collapse into a single upload. Failed drains back off
+    exponentially (with jitter) up to ``max_delay`` seconds.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        batch_size: int = 50,
+        base_delay: float = 5.0,
+        max_delay: float = 900.0,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self.next_attempt = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the outbox database, creating it if needed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "profile_id TEXT NOT NULL UNIQUE, "
+            "updated_at INTEGER NOT NULL, "
+            "payload TEXT NOT NULL)"
+        )
+        return conn
+
+    def enqueue(self, profile: dict) -> None:
+        """Queue a profile upload, merging into any pending one for it."""
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT payload FROM outbox WHERE profile_id = ?",
+                (profile["id"],),
+            ).fetchone()
+            if row:
+                profile = {**json.loads(row[0]), **profile}
+            conn.execute(
+                "INSERT OR REPLACE INTO outbox "
+                "(profile_id, updated_at, payload) VALUES (?, ?, ?)",
+                (profile["id"], profile["updated_at"], json.dumps(profile)),
+            )
+        conn.close()
+
+    def contains(self, profile_id: str, updated_at: int) -> bool:
+        """Return True if this profile version is already queued."""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT 1 FROM outbox WHERE profile_id = ? AND updated_at = ?",
+            (profile_id, updated_at),
+        ).fetchone()
+        conn.close()
+        return row is not None
+
+    def pending(self) -> int:
+        """Return the number of queued uploads."""
+        conn = self._connect()
+        (count,) = conn.execute("SELECT COUNT(*) FROM outbox").fetchone()
+        conn.close()
+        return count
+
+    def _peek(self, after_seq: int) -> List[Tuple[int, dict]]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT seq, payload FROM outbox WHERE seq > ? "
+            "ORDER BY seq LIMIT ?",
+            (after_seq, self.batch_size),
+        ).fetchall()
+        conn.close()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def _ack(self, seqs: List[int]) -> None:
+        # Records re-queued mid-upload got a new seq and stay pending
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "DELETE FROM outbox WHERE seq = ?", [(s,) for s in seqs]
+            )
+        conn.close()
+
+    def ready(self) -> bool:
+        """Return True if the backoff window has elapsed."""
+        return time.monotonic() >= self.next_attempt
+
+    def _backoff(self) -> None:
+        self.failures += 1
+        delay = min(
+            self.base_delay * 2 ** (self.failures - 1), self.max_delay
+        )
+        self.next_attempt = time.monotonic() + delay * random.uniform(0.5, 1)
+
+    def drain(self, send: Callable[[List[dict]], bool]) -> List[dict]:
+        """Upload queued records in batches; return the acknowledged ones."""
+        if not self.ready():
+            return []
+
+        sent: List[dict] = []
+        last_seq = 0
+        while True:
+            batch = self._peek(last_seq)
+            if not batch:
+                break
+            try:
+                ok = send([payload for _, payload in batch])
+            except requests.RequestException as e:
+                log.warning("🔥 Outbox upload error: %s", e)
+                ok = False
+            if not ok:
+                self._backoff()
+                return sent
+            self._ack([seq for seq, _ in batch])
+            sent.extend(payload for _, payload in batch)
+            last_seq = batch[-1][0]
+
+        self.failures = 0
+        self.next_attempt = 0.0
+        return sent
+
+
 # ─── ProfileSync ───────────────────────────────────────────────────────────
 
 class ProfileSync:
-    """Syncs the local profile to the cloud service."""
+    """Syncs the local profile to the cloud service via the outbox.
 
-    def __init__(self, profile_db: ProfileDB, cloud_url: str):
+    Only fields whose value changed since the last successful upload are
+    sent; the cloud merges them into its stored copy.
+    """
+
+    FIELDS = ("name", "email", "phone")
+
+    def __init__(
+        self,
+        profile_db: ProfileDB,
+        cloud_url: str,
+        outbox: Optional[Outbox] = None,
+    ):
         self.profile_db = profile_db
         self.cloud_url = cloud_url
+        self.outbox = outbox or Outbox(OUTBOX_PATH)
 
     def sync_profile(self) -> None:
-        """POST profile if it has changed since last sync."""
+        """Queue the profile if it changed since last sync, then flush."""
         profile = self.profile_db.get_profile()
         if not profile:
-            print("⚠️  No profile found in DB.")
+            log.warning("⚠️  No profile found in DB.", extra=THROTTLED)
             return
 
-        try:
-            updated_ts = int(datetime.fromisoformat(
-                profile["updated_at"]
-            ).timestamp())
-        except Exception as e:
-            print(f"⚠️  Invalid timestamp: {e}")
+        # Computed by SQLite from updated_at; NULL when it does not parse
+        updated_ts = profile["updated_ts"]
+        if updated_ts is None:
+            log.warning(
+                "⚠️  Invalid timestamp: %r", profile["updated_at"],
+                extra=THROTTLED,
+            )
             updated_ts = 0
 
-        last_synced = FileManager.get_last_synced_at()
+        last_synced = FileManager.get_last_synced_at(profile["id"])
         if last_synced != updated_ts:
-            print("📤 Detected change, syncing profile...")
-            # overwrite the field with an integer
-            profile["updated_at"] = updated_ts
-            print(f"url: {self.cloud_url}, payload: {str(profile)} called")
-            resp = requests.post(self.cloud_url, json=profile)
-            if resp.status_code == 200:
-                FileManager.set_last_synced_at(updated_ts)
-                print("✅ Sync successful.")
-            else:
-                print(f"❌ Sync failed: {resp.status_code} {resp.text}")
+            if not self.outbox.contains(profile["id"], updated_ts):
+                changed = self.changed_fields(profile)
+                # Field names only; values are PII
+                log.info(
+                    "📤 Detected change, queueing profile upload...",
+                    extra={"fields": sorted(changed)},
+                )
+                # send the timestamp as an integer, plus changed fields
+                self.outbox.enqueue({
+                    "id": profile["id"],
+                    "updated_at": updated_ts,
+                    **changed,
+                })
+            self.flush()
         else:
-            print("⏳ No profile changes detected.")
+            log.info("⏳ No profile changes detected.", extra=THROTTLED)
+
+    def changed_fields(self, profile: dict) -> dict:
+        """Return the fields that differ from the last synced values."""
+        hashes = FileManager.get_field_hashes(profile["id"])
+        return {
+            field: profile[field]
+            for field in self.FIELDS
+            if hashes.get(field) != field_digest(profile["id"], profile[field])
+        }
+
+    @classmethod
+    def record_synced_fields(cls, profiles: List[dict]) -> None:
+        """Remember digests of field values the cloud now holds."""
+        updates = {}
+        for profile in profiles:
+            pid = profile["id"]
+            hashes = updates.get(pid) or FileManager.get_field_hashes(pid)
+            for field in cls.FIELDS:
+                if field in profile:
+                    hashes[field] = field_digest(pid, profile[field])
+            updates[pid] = hashes
+        FileManager.state().set_many(
+            {f"fields:{pid}": hashes for pid, hashes in updates.items()}
+        )
+
+    def flush(self) -> None:
+        """Drain pending uploads and record the newest synced timestamp."""
+        sent = self.outbox.drain(self._post_batch)
+        if sent:
+            self.record_synced_fields(sent)
+            cursors: dict = {}
+            for p in sent:
+                pid = p["id"]
+                cursors[pid] = max(p["updated_at"], cursors.get(pid, 0))
+            FileManager.set_sync_cursors(cursors)
+            log.info("✅ Sync successful.", extra={"profiles": len(sent)})
+        elif not self.outbox.ready():
+            log.info(
+                "⏳ Uploads pending, backing off.",
+                extra={**THROTTLED, "pending": self.outbox.pending()},
+            )
+
+    def _post_batch(self, profiles: List[dict]) -> bool:
+        url = f"{cloud_base_url(self.cloud_url)}/profiles/batch"
+        log.debug(
+            "Uploading profile batch",
+            extra={"url": url, "profiles": len(profiles)},
+        )
+        resp = requests.post(url, json=profiles, timeout=10)
+        if resp.status_code != 200:
+            # The response body may echo the payload, so only log status
+            log.error("❌ Sync failed", extra={"status": resp.status_code})
+            return False
+        return True
+
+
+# ─── ProfilePull ───────────────────────────────────────────────────────────
+
+class IdentityClient:
+    """gRPC client used to write merged profiles via IdentityService."""
+
+    def __init__(self, address: str):
+        self.channel = grpc.insecure_channel(address)
+        self.stub = identity_pb2_grpc.IdentityServiceStub(self.channel)
+
+    def update_profile(self, profile: dict) -> None:
+        """Persist a profile dict through UpdateProfile."""
+        self.stub.UpdateProfile(
+            identity_pb2.ProfileDelta(
+                profile=identity_pb2.UserProfile(
+                    id=profile["id"],
+                    name=profile.get("name") or "",
+                    email=profile.get("email") or "",
+                    phone=profile.get("phone") or "",
+                    created_at=profile.get("created_at") or "",
+                    updated_at=profile["updated_at"],
+                )
+            ),
+            timeout=5,
+        )
+
+
+class ProfilePull:
+    """Merges newer cloud copies of the local profile into the identity DB."""
+
+    FIELDS = ("name", "email", "phone")
+
+    def __init__(
+        self,
+        profile_db: ProfileDB,
+        cloud_url: str,
+        identity: IdentityClient,
+    ):
+        self.profile_db = profile_db
+        self.cloud_url = cloud_base_url(cloud_url)
+        self.identity = identity
+
+    def pull_profile(self) -> bool:
+        """Fetch the cloud profile if newer; return True if merged."""
+        profile = self.profile_db.get_profile()
+        if not profile:
+            return False
+
+        local_ts = profile["updated_ts"] or 0
+
+        # The cloud answers 304 with no body unless it holds a newer copy
+        resp = requests.get(
+            f"{self.cloud_url}/profile/{profile['id']}",
+            params={"since": local_ts},
+            timeout=10,
+        )
+        if resp.status_code in (304, 404):
+            return False
+        if resp.status_code != 200:
+            log.error(
+                "❌ Profile pull failed", extra={"status": resp.status_code}
+            )
+            return False
+
+        remote = resp.json()
+        remote_ts = to_epoch(remote["updated_at"])
+        if remote_ts <= local_ts:
+            return False
+
+        merged = dict(profile)
+        merged.update({k: remote[k] for k in self.FIELDS if k in remote})
+        merged["updated_at"] = datetime.fromtimestamp(
+            remote_ts, timezone.utc
+        ).isoformat()
+        self.identity.update_profile(merged)
+
+        # Record the pulled version so the push stage does not echo it back
+        ProfileSync.record_synced_fields([merged])
+        FileManager.set_last_synced_at(remote_ts, merged["id"])
+        log.info("📥 Pulled newer profile from cloud.")
+        return True
 
 
 # ─── ModelSync ─────────────────────────────────────────────────────────────
 
+def parse_models(value: str) -> List[Tuple[str, str]]:
+    """Parse ``SYNC_MODELS`` (``name[:channel],...``; channel defaults
+    to ``stable``)."""
+    models = []
+    for item in value.split(","):
+        name, _, channel = item.strip().partition(":")
+        if name:
+            models.append((name, channel or "stable"))
+    return models
+
+
 class ModelSync:
-    """Fetches and updates the model binary from the cloud."""
+    """Fetches and updates model binaries from the cloud.
 
-    def __init__(self, cloud_url: str):
-        self.cloud_url = cloud_url.rstrip("/profile")
+    Without tracked ``models`` it follows the single ``/model/latest``;
+    with them, each cycle reads the registry catalog once and downloads
+    the releases that changed, all over the downloader's pooled session.
+    """
+
+    def __init__(
+        self,
+        cloud_url: str,
+        downloader: Optional[RangeDownloader] = None,
+        lan: Optional[LanCache] = None,
+        models: Optional[List[Tuple[str, str]]] = None,
+    ):
+        self.cloud_url = cloud_base_url(cloud_url)
+        self.downloader = downloader or RangeDownloader()
+        self.lan = lan
+        self.models = parse_models(SYNC_MODELS) if models is None else models
+        # Peers are on the local network: no WAN throttling or slicing
+        self.lan_downloader = RangeDownloader(
+            threshold=0,
+            policy=BandwidthPolicy(max_rate=0, adaptive=False),
+            slice_seconds=0,
+        )
+        # Set while a throttled download (or a LAN wait) is paused
+        # between cycles
+        self.resume_pending = False
+        # Monotonic time at which this cycle's LAN wait budget runs out
+        self._lan_deadline = 0.0
+
+    @staticmethod
+    def model_path(name: str, channel: str) -> Path:
+        return Path.home() / ".waw" / "models" / name / f"{channel}.bin"
 
     def sync_model(self) -> None:
-        """Download the latest model if checksum differs."""
+        """Download the latest model(s) if checksums differ."""
+        self.resume_pending = False
+        self._lan_deadline = time.monotonic() + LAN_WAIT_BUDGET
+        if self.models:
+            self._sync_registry()
+            return
         model_path = Path.home() / ".waw" / "models" / "model.bin"
-        print("🔍 Checking for model update...")
+        log.debug("🔍 Checking for model update...")
         try:
             resp = requests.get(f"{self.cloud_url}/model/latest", stream=True)
         except Exception as e:
-            print(f"🔥 Model fetch error: {e}")
+            log.warning("🔥 Model fetch error: %s", e, extra=THROTTLED)
             return
 
         if resp.status_code != 200:
-            print(f"⚠️  Model fetch failed: {resp.status_code}")
+            log.warning(
+                "⚠️  Model fetch failed",
+                extra={**THROTTLED, "status": resp.status_code},
+            )
             return
 
         server_sha = resp.headers.get("X-Model-SHA256")
         local_sha = FileManager.get_local_model_sha(model_path)
+        size = resp.headers.get("Content-Length", "")
 
         if server_sha and server_sha == local_sha:
-            print("🆗 Model is up to date.")
-        else:
-            FileManager.save_file(model_path, resp)
-            new_sha = FileManager.get_local_model_sha(model_path)
-            if new_sha == server_sha:
-                print(f"✅ Model updated: {model_path}")
+            log.info("🆗 Model is up to date.", extra=THROTTLED)
+            self._share(model_path, server_sha)
+            return
+        if server_sha and size.isdigit() and self._download_from_lan(
+            model_path, int(size), server_sha
+        ):
+            resp.close()
+            self._share(model_path, server_sha)
+            return
+        if server_sha and self._awaiting_lan(server_sha):
+            resp.close()
+            return
+
+        with self._fetching(model_path, server_sha):
+            if server_sha and self.downloader.accepts(resp):
+                resp.close()
+                self._download_ranges(
+                    model_path, resp.url, int(size), server_sha,
+                    validator=resp.headers.get("ETag"),
+                )
             else:
-                print("❌ SHA mismatch, discarding model.")
-                model_path.unlink(missing_ok=True)
+                FileManager.save_file(model_path, resp)
+                new_sha = FileManager.get_local_model_sha(model_path)
+                if new_sha == server_sha:
+                    log.info(
+                        "✅ Model updated", extra={"path": str(model_path)}
+                    )
+                else:
+                    log.error("❌ SHA mismatch, discarding model.")
+                    model_path.unlink(missing_ok=True)
+
+    def _sync_registry(self) -> None:
+        """Bring every tracked (name, channel) up to its latest release."""
+        log.debug("🔍 Checking for model updates...")
+        try:
+            resp = self.downloader.session.get(
+                f"{self.cloud_url}/models", timeout=self.downloader.timeout
+            )
+        except requests.RequestException as e:
+            log.warning("🔥 Model catalog error: %s", e, extra=THROTTLED)
+            return
+        if resp.status_code != 200:
+            log.warning(
+                "⚠️  Model catalog fetch failed",
+                extra={**THROTTLED, "status": resp.status_code},
+            )
+            return
+        catalog = {
+            (release["name"], release["channel"]): release
+            for release in resp.json()
+        }
+        current = 0
+        for name, channel in self.models:
+            release = catalog.get((name, channel))
+            if release is None:
+                log.warning(
+                    "⚠️  Model not in the catalog",
+                    extra={**THROTTLED, "model": name, "channel": channel},
+                )
+                continue
+            model_path = self.model_path(name, channel)
+            sha, size = release["sha256"], int(release["size"])
+            if FileManager.get_local_model_sha(model_path) == sha:
+                current += 1
+                self._share(model_path, sha)
+                continue
+            if self._download_from_lan(model_path, size, sha):
+                self._share(model_path, sha)
+                continue
+            if self._awaiting_lan(sha):
+                continue
+            url = "/".join((
+                self.cloud_url, "models", quote(name, safe=""),
+                quote(channel, safe=""), quote(release["version"], safe=""),
+            ))
+            try:
+                with self._fetching(model_path, sha):
+                    self._download_ranges(model_path, url, size, sha)
+            except (requests.RequestException, OSError) as e:
+                # One broken download must not hold up the other models
+                log.error(
+                    "❌ Model download failed: %s", e,
+                    extra={"model": name, "channel": channel},
+                )
+        if current == len(self.models):
+            log.info("🆗 Models are up to date.", extra=THROTTLED)
+
+    def _share(self, model_path: Path, sha: str) -> None:
+        if self.lan:
+            self.lan.publish(sha, model_path)
+
+    @contextmanager
+    def _fetching(self, model_path: Path, sha: Optional[str]):
+        """Tell LAN peers about a cloud download for as long as it runs.
+
+        However the download ends, the model is then either shared or
+        withdrawn (unless it is paused until the next cycle).
+        """
+        if self.lan and sha:
+            self.lan.begin_fetch(sha)
+        try:
+            yield
+        finally:
+            if self.lan and sha:
+                if FileManager.get_local_model_sha(model_path) == sha:
+                    self._share(model_path, sha)
+                elif not self.resume_pending:
+                    self.lan.end_fetch(sha)
+
+    def _download_from_lan(
+        self, model_path: Path, size: int, sha: str
+    ) -> bool:
+        """Fetch a model from a LAN peer; return True on success."""
+        if not self.lan:
+            return False
+        urls = self.lan.sources(sha) or self.lan.wait_for(
+            sha, budget=max(0.0, self._lan_deadline - time.monotonic())
+        )
+        for url in urls:
+            start = time.perf_counter()
+            try:
+                fetched = self.lan_downloader.download(
+                    url, model_path, size, sha
+                )
+            except DownloadError as e:
+                log.warning("⚠️  LAN peer failed: %s", e, extra={"url": url})
+                continue
+            record_download(fetched, time.perf_counter() - start)
+            MODEL_LAN_BYTES.inc(fetched)
+            FileManager.set_local_model_sha(model_path, sha)
+            log.info(
+                "✅ Model updated from LAN peer",
+                extra={"path": str(model_path), "url": url},
+            )
+            return True
+        return False
+
+    def _awaiting_lan(self, sha: str) -> bool:
+        """True if a LAN wait for ``sha`` continues on the next cycle."""
+        if not (self.lan and self.lan.still_waiting(sha)):
+            return False
+        self.resume_pending = True
+        log.info(
+            "⏳ Waiting for a LAN peer to get the model",
+            extra={**THROTTLED, "sha256": sha},
+        )
+        return True
+
+    def _download_ranges(
+        self,
+        model_path: Path,
+        url: str,
+        size: int,
+        sha: str,
+        validator: Optional[str] = None,
+    ) -> None:
+        """Fetch a model in throttled, resumable ranges and verify it."""
+        start = time.perf_counter()
+        try:
+            fetched = self.downloader.download(
+                url, model_path, size, sha, validator=validator
+            )
+        except DownloadPaused as e:
+            self.resume_pending = True
+            log.info(
+                "⏸️  Model download paused until the next cycle",
+                extra={"path": str(model_path), "done": e.done,
+                       "total": e.total},
+            )
+            return
+        except DownloadError as e:
+            # Completed ranges are kept for the next scheduled attempt
+            log.error("❌ Model download failed: %s", e)
+            return
+        record_download(fetched, time.perf_counter() - start)
+        FileManager.set_local_model_sha(model_path, sha)
+        log.info(
+            "✅ Model updated",
+            extra={
+                "path": str(model_path),
+                "connections": self.downloader.connections,
+            },
+        )
+
+
+# ─── EventListener ─────────────────────────────────────────────────────────
+
+def parse_sse(lines: Iterable[str]) -> Iterator[Tuple[str, dict]]:
+    """Yield ``(event, data)`` pairs from server-sent event lines."""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                try:
+                    yield event, json.loads("\n".join(data))
+                except ValueError:
+                    pass
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+class EventListener:
+    """Subscribes to the cloud event stream and wakes the main loop."""
+
+    def __init__(self, cloud_url: str, wake: threading.Event):
+        self.events_url = f"{cloud_base_url(cloud_url)}/events"
+        self.wake = wake
+        self.connected = threading.Event()
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start listening in a background thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="waw-events", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Ask the listener thread to exit."""
+        self._stop.set()
+
+    def drain(self) -> Set[str]:
+        """Return and clear the event types received since the last call."""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        return pending
+
+    def handle(self, event: str, data: dict) -> None:
+        """Record an event and wake the main loop."""
+        with self._lock:
+            self._pending.add(event)
+        self.wake.set()
+
+    def _run(self) -> None:
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                with requests.get(
+                    self.events_url, stream=True, timeout=(5, 60)
+                ) as resp:
+                    if resp.status_code != 200:
+                        raise RuntimeError(f"HTTP {resp.status_code}")
+                    self.connected.set()
+                    backoff = 1
+                    lines = resp.iter_lines(decode_unicode=True)
+                    for event, data in parse_sse(lines):
+                        self.handle(event, data)
+                        if self._stop.is_set():
+                            return
+            except Exception as e:
+                log.warning(
+                    "⚠️  Event stream unavailable, polling instead: %s",
+                    e,
+                    extra=THROTTLED,
+                )
+            self.connected.clear()
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, POLL_INTERVAL)
 
 
 # ─── Main Loop ─────────────────────────────────────────────────────────────
 
 def main_loop() -> None:
     """Run continuous sync of profile and model."""
-    print("🔁 Starting waw-sync loop (every 60s)...")
+    log.info(
+        "🔁 Starting waw-sync loop...",
+        extra={"interval": POLL_INTERVAL, "db_path": str(DB_PATH)},
+    )
     db = ProfileDB(DB_PATH, MASTER_KEY)
+    p_pull = ProfilePull(db, CLOUD_URL, IdentityClient(IDENTITY_ADDR))
     p_sync = ProfileSync(db, CLOUD_URL)
-    m_sync = ModelSync(CLOUD_URL)
+    lan = LanCache().start() if lan_cache.ENABLED else None
+    m_sync = ModelSync(CLOUD_URL, lan=lan)
 
-    while True:
-        try:
-            p_sync.sync_profile()
-        except Exception as e:
-            print(f"🔥 Profile sync error: {e}")
+    wake = threading.Event()
+    listener = EventListener(CLOUD_URL, wake)
+    if EVENTS_ENABLED:
+        listener.start()
+    last_run = {}
 
-        time.sleep(1)
+    def due(stage: str, events: Set[str]) -> bool:
+        # Without a live event stream, cloud checks run every cycle
+        interval = (
+            PUSH_POLL_INTERVAL
+            if listener.connected.is_set() else POLL_INTERVAL
+        )
+        last = last_run.get(stage)
+        if stage in events or last is None or (
+            time.monotonic() - last >= interval
+        ):
+            last_run[stage] = time.monotonic()
+            return True
+        return False
 
+    if METRICS_PORT:
         try:
-            m_sync.sync_model()
-        except Exception as e:
-            print(f"🔥 Model sync error: {e}")
+            waw_metrics.start_http_server(METRICS_PORT)
+        except OSError as e:
+            # e.g. a second client on this host; metrics are optional
+            log.warning(
+                "⚠️  Metrics disabled: %s", e, extra={"port": METRICS_PORT}
+            )
+
+    def run_stage(stage: str, label: str, fn: Callable[[], object]) -> None:
+        with SYNC_STAGE_LATENCY.time(stage=stage):
+            try:
+                PROFILER.run(f"sync.{stage}", fn)
+            except Exception as e:
+                SYNC_ERRORS.inc(stage=stage)
+                log.error(
+                    "🔥 %s error: %s", label, e, extra={"throttle": stage}
+                )
+
+    while True:
+        events = listener.drain()
+
+        if due("profile", events):
+            run_stage("pull", "Profile pull", p_pull.pull_profile)
+
+        run_stage("push", "Profile sync", p_sync.sync_profile)
+
+        if due("model", events) or m_sync.resume_pending:
+            time.sleep(1)
+            run_stage("model", "Model sync", m_sync.sync_model)
 
-        time.sleep(60)
+        SYNC_CYCLES.inc()
+        wake.wait(POLL_INTERVAL)
+        wake.clear()
 
 
 if __name__ == "__main__":
-    print(f"🔍 Testing DB at: {DB_PATH}")
-    ProfileDB(DB_PATH, MASTER_KEY).get_profile()
+    configure_logging()
+    PROFILER.install_signal_toggle()
     main_loop()
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import sys
 from pathlib import Path
@@ -9,7 +10,7 @@ sys.path.insert(
     str(Path(__file__).resolve().parents[1] / "backend_mock"),
 )
 
-from app import app, profile_manager  # noqa: E402
+from app import app, event_bus, format_sse, profile_manager  # noqa: E402
 
 client = TestClient(app)
 
@@ -37,3 +38,99 @@ def test_delete_profile_not_found():
     profile_manager.store.clear()
     response = client.delete("/profile/nonexistent")
     assert response.status_code == 404
+
+
+def test_profile_upsert_publishes_event():
+    """Subscribers to the event bus are notified of profile upserts."""
+    profile_manager.store.clear()
+
+    async def scenario():
+        queue = event_bus.subscribe()
+        try:
+            client.post(
+                "/profile", json={"id": "2", "updated_at": 1700000000}
+            )
+            return await asyncio.wait_for(queue.get(), timeout=2)
+        finally:
+            event_bus.unsubscribe(queue)
+
+    event, data = asyncio.run(scenario())
+    assert event == "profile"
+    assert data == {"id": "2", "updated_at": 1700000000}
+    assert format_sse(event, data).startswith("event: profile\ndata: ")
+
+
+def test_get_profile_since():
+    """GET /profile/{id}?since= returns 304 unless the cloud copy is newer."""
+    profile_manager.store.clear()
+    client.post("/profile", json={"id": "3", "updated_at": 100})
+
+    assert client.get("/profile/3", params={"since": 100}).status_code == 304
+    response = client.get("/profile/3", params={"since": 99})
+    assert response.status_code == 200
+    assert response.json()["updated_at"] == 100
+    assert client.get("/profile/missing").status_code == 404
+
+
+def test_batch_upsert_profiles():
+    """POST /profiles/batch stores every profile in one request."""
+    profile_manager.store.clear()
+    response = client.post(
+        "/profiles/batch",
+        json=[
+            {"id": "a", "updated_at": 1},
+            {"id": "b", "updated_at": "2025-05-09T07:09:13+00:00"},
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "count": 2, "accepted": 2}
+
+
+def test_batch_upsert_merges_partial_profiles():
+    """Fields missing from a batch record keep their stored values."""
+    profile_manager.store.clear()
+    client.post(
+        "/profile",
+        json={"id": "m", "name": "Ann", "email": "a@x.io", "updated_at": 1},
+    )
+    client.post(
+        "/profiles/batch", json=[{"id": "m", "phone": "555", "updated_at": 2}]
+    )
+    stored = profile_manager.get("m")
+    assert stored["name"] == "Ann"
+    assert stored["phone"] == "555"
+    assert stored["updated_at"] == 2
+
+
+def test_metrics_endpoint_reports_request_latency():
+    """Requests are timed per route template and exposed on /metrics."""
+    client.get("/profile/missing")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "Server-Timing" in response.headers
+    assert (
+        'cloud_request_duration_seconds_count{method="GET",'
+        'endpoint="/profile/{profile_id}",status="404"}'
+    ) in response.text
+
+
+def test_model_serves_byte_ranges(tmp_path, monkeypatch):
+    """Ranged model requests return 206 without hashing the file again."""
+    import app as cloud
+    import model_store
+
+    monkeypatch.setattr(cloud, "MODEL_PATH", tmp_path / "model.bin")
+    cloud.MODEL_PATH.write_bytes(bytes(range(256)) * 4)
+
+    full = client.get("/model/latest")
+    assert full.headers["accept-ranges"] == "bytes"
+    assert "x-model-sha256" in full.headers
+    hashed = model_store.MODEL_HASH_LATENCY.count()
+
+    part = client.get("/model/latest", headers={
+        "Range": "bytes=256-511", "If-Range": full.headers["etag"],
+    })
+    assert part.status_code == 206
+    assert part.content == bytes(range(256))
+    assert part.headers["x-model-sha256"] == full.headers["x-model-sha256"]
+    assert model_store.MODEL_HASH_LATENCY.count() == hashed
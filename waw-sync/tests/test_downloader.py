@@ -0,0 +1,223 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import requests
+
+# Ensure downloader module is importable
+sys.path.insert(
+    0, str(Path(__file__).resolve().parents[1] / "src")
+)
+
+from downloader import (  # noqa: E402
+    BandwidthPolicy,
+    DownloadError,
+    DownloadPaused,
+    RangeDownloader,
+    sha256_file,
+    split_ranges,
+)
+
+MB = 1024 * 1024
+
+
+class FakeResponse:
+    def __init__(self, status_code, body, headers):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Serves byte ranges of ``data``, like a server honouring If-Range."""
+
+    def __init__(self, data: bytes, etag: str = '"v1"', fail_from=None):
+        # Ranges starting at or after ``fail_from`` raise ConnectionError
+        self.data = data
+        self.etag = etag
+        self.fail_from = fail_from
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, **kwargs):
+        with self.lock:
+            self.requests.append(headers)
+        start, end = map(int, re.findall(r"\d+", headers["Range"]))
+        if self.fail_from is not None and start >= self.fail_from:
+            raise requests.ConnectionError("link dropped")
+        if headers.get("If-Range") not in (None, self.etag):
+            return FakeResponse(200, self.data, {})
+        return FakeResponse(206, self.data[start:end + 1], {
+            "Content-Range": f"bytes {start}-{end}/{len(self.data)}"
+        })
+
+
+def test_split_ranges_covers_every_byte():
+    assert split_ranges(10, 4) == [(0, 3), (4, 7), (8, 9)]
+    assert split_ranges(8, 4) == [(0, 3), (4, 7)]
+    assert split_ranges(0, 4) == []
+
+
+def test_ranged_download_assembles_and_verifies(tmp_path):
+    data = os.urandom(5 * MB + 123)
+    session = FakeSession(data)
+    downloader = RangeDownloader(
+        connections=3, part_size=MB, session=session
+    )
+    dest = tmp_path / "models" / "model.bin"
+
+    downloader.download(
+        "http://cloud/model/latest", dest, len(data),
+        hashlib.sha256(data).hexdigest(), validator='"v1"',
+    )
+
+    assert dest.read_bytes() == data
+    assert sha256_file(dest) == hashlib.sha256(data).hexdigest()
+    assert len(session.requests) == 6
+    assert all(h["If-Range"] == '"v1"' for h in session.requests)
+    assert not (tmp_path / "models" / "model.bin.part").exists()
+
+
+def test_ranged_download_rejects_bad_checksum(tmp_path):
+    data = os.urandom(2 * MB)
+    downloader = RangeDownloader(part_size=MB, session=FakeSession(data))
+    dest = tmp_path / "model.bin"
+    dest.write_bytes(b"old model")
+
+    with pytest.raises(DownloadError, match="checksum"):
+        downloader.download("http://cloud/m", dest, len(data), "0" * 64)
+
+    assert dest.read_bytes() == b"old model"
+    assert not (tmp_path / "model.bin.part").exists()
+
+
+def test_ranged_download_fails_if_the_file_changes(tmp_path):
+    data = os.urandom(2 * MB)
+    downloader = RangeDownloader(
+        part_size=MB, session=FakeSession(data, etag='"v2"')
+    )
+
+    with pytest.raises(DownloadError, match="expected 206"):
+        downloader.download(
+            "http://cloud/m", tmp_path / "model.bin", len(data),
+            hashlib.sha256(data).hexdigest(), validator='"v1"',
+        )
+
+
+def test_accepts_only_large_rangeable_responses():
+    downloader = RangeDownloader(threshold=MB)
+    large = {"Accept-Ranges": "bytes", "Content-Length": str(2 * MB)}
+    small = {"Accept-Ranges": "bytes", "Content-Length": "10"}
+
+    assert downloader.accepts(FakeResponse(200, b"", large))
+    assert not downloader.accepts(FakeResponse(200, b"", small))
+    assert not downloader.accepts(FakeResponse(
+        200, b"", {"Content-Length": str(2 * MB)}
+    ))
+
+
+def test_interrupted_download_resumes_missing_ranges(tmp_path):
+    data = os.urandom(4 * MB)
+    sha = hashlib.sha256(data).hexdigest()
+    dest = tmp_path / "model.bin"
+    broken = FakeSession(data, fail_from=2 * MB)
+    downloader = RangeDownloader(
+        connections=1, part_size=MB, retries=0, session=broken
+    )
+    with pytest.raises(DownloadError, match="link dropped"):
+        downloader.download("http://cloud/m", dest, len(data), sha)
+    assert (tmp_path / "model.bin.part.json").exists()
+
+    healthy = FakeSession(data)
+    downloader = RangeDownloader(
+        connections=1, part_size=MB, session=healthy
+    )
+    fetched = downloader.download("http://cloud/m", dest, len(data), sha)
+
+    assert dest.read_bytes() == data
+    assert fetched == 2 * MB
+    assert [h["Range"] for h in healthy.requests] == [
+        f"bytes={2 * MB}-{3 * MB - 1}", f"bytes={3 * MB}-{4 * MB - 1}"
+    ]
+    assert not (tmp_path / "model.bin.part.json").exists()
+
+
+def test_download_pauses_when_its_slice_runs_out(tmp_path):
+    data = os.urandom(2 * MB)
+    downloader = RangeDownloader(
+        part_size=MB, session=FakeSession(data), slice_seconds=1e-9
+    )
+    with pytest.raises(DownloadPaused) as paused:
+        downloader.download(
+            "http://cloud/m", tmp_path / "model.bin", len(data),
+            hashlib.sha256(data).hexdigest(),
+        )
+    assert (paused.value.done, paused.value.total) == (0, len(data))
+
+
+def test_policy_caps_the_download_rate():
+    policy = BandwidthPolicy(max_rate=4 * MB, adaptive=False)
+    start = time.monotonic()
+    for _ in range(16):
+        policy.consume(MB // 8)
+    assert time.monotonic() - start >= 0.4
+
+
+def test_policy_backs_off_when_the_link_gets_busy():
+    policy = BandwidthPolicy(max_rate=10 * MB)
+    policy.observe_rtt(0.01)
+    assert policy.rate == 10 * MB
+    policy.observe_rtt(0.5)
+    assert policy.rate == 7 * MB
+    policy.observe_rtt(0.01)
+    assert policy.rate == pytest.approx(7.7 * MB)
+
+
+def test_policy_leaves_uncapped_downloads_alone():
+    # Neither MODEL_DOWNLOAD_RATE nor MODEL_DOWNLOAD_SLICE is set here
+    policy = BandwidthPolicy(max_rate=0)
+    policy.observe_rtt(0.01)
+    policy.consume(MB)
+    policy.observe_rtt(0.5)
+    assert policy.rate is None
+
+
+def test_malformed_idle_hours_are_ignored(monkeypatch, caplog):
+    import downloader
+
+    assert downloader.parse_hours("22-6") == (22, 6)
+    for bad in ("22", "ten-6", "22-"):
+        with pytest.raises(ValueError):
+            downloader.parse_hours(bad)
+    monkeypatch.setattr(downloader, "IDLE_HOURS", "22")
+    assert downloader.configured_idle_hours() is None
+    assert "MODEL_DOWNLOAD_IDLE_HOURS" in caplog.text
+
+
+def test_policy_lifts_the_cap_during_idle_hours():
+    night = BandwidthPolicy(
+        max_rate=MB, idle_hours=(22, 6),
+        clock=lambda: datetime(2026, 1, 1, 23),
+    )
+    day = BandwidthPolicy(
+        max_rate=MB, idle_hours=(22, 6),
+        clock=lambda: datetime(2026, 1, 1, 12),
+    )
+    assert night.rate is None
+    assert day.rate == MB
@@ -0,0 +1,208 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import pytest
+from fastapi import Body, FastAPI, HTTPException, Response
+from fastapi.testclient import TestClient
+
+# Add backend_mock directory to path so we can import app module
+sys.path.insert(
+    0,
+    str(Path(__file__).resolve().parents[1] / "backend_mock"),
+)
+
+import app as cloud  # noqa: E402
+from edge import EdgeCache, read_events  # noqa: E402
+from model_store import ModelStore  # noqa: E402
+
+MODEL = os.urandom(256 * 1024)
+MODEL_SHA = hashlib.sha256(MODEL).hexdigest()
+
+
+class Upstream:
+    """A stand-in central cloud API that counts the calls it gets."""
+
+    def __init__(self):
+        self.model_requests = 0
+        self.release_requests = 0
+        self.batches: List[list] = []
+        self.fail = False
+        self.app = FastAPI()
+        self.app.get("/model/latest")(self.model)
+        self.app.get("/models/{name}/{channel}/{version}")(self.release)
+        self.app.post("/profiles/batch")(self.batch)
+        self.app.get("/profile/{profile_id}")(self.profile)
+
+    def model(self):
+        self.model_requests += 1
+        # Slow enough for concurrent edge misses to overlap
+        time.sleep(0.2)
+        return Response(MODEL, headers={"X-Model-SHA256": MODEL_SHA})
+
+    def release(self, name: str, channel: str, version: str):
+        self.release_requests += 1
+        data = f"{name} {channel} {version}".encode()
+        return Response(data, headers={
+            "X-Model-SHA256": hashlib.sha256(data).hexdigest(),
+            "X-Model-Version": version,
+        })
+
+    def batch(self, profiles: list = Body(...)):
+        if self.fail:
+            raise HTTPException(status_code=503)
+        self.batches.append(profiles)
+        return {"status": "ok", "count": 42, "accepted": len(profiles)}
+
+    def profile(self, profile_id: str):
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    upstream = Upstream()
+    edge = EdgeCache(
+        "http://upstream",
+        store=ModelStore(tmp_path / "edge"),
+        client=TestClient(upstream.app, base_url="http://upstream"),
+        window=0.2,
+    )
+    monkeypatch.setattr(cloud, "edge", edge)
+    return upstream
+
+
+def test_edge_coalesces_model_misses_and_serves_from_its_store(
+    upstream, tmp_path
+):
+    client = TestClient(cloud.app)
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(
+            lambda _: client.get("/model/latest"), range(8)
+        ))
+
+    assert upstream.model_requests == 1
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.content == MODEL for r in responses)
+    assert {r.headers["X-Model-SHA256"] for r in responses} == {MODEL_SHA}
+    assert (tmp_path / "edge" / MODEL_SHA).read_bytes() == MODEL
+
+    # Within the TTL the upstream is not asked again; ranges work locally
+    part = client.get("/model/latest", headers={"Range": "bytes=0-99"})
+    assert part.status_code == 206
+    assert part.content == MODEL[:100]
+    assert upstream.model_requests == 1
+
+    cloud.edge.invalidate_model()
+    assert client.get("/model/latest").status_code == 200
+    assert upstream.model_requests == 2
+
+
+def test_edge_keeps_only_latest_models_pinned(upstream, tmp_path):
+    client = TestClient(cloud.app)
+    cloud.edge.store.keep = 1
+    cloud.edge.ttl = 0
+    assert client.get("/model/latest").content == MODEL
+
+    for version in ("1.0", "1.1", "1.2"):
+        path = f"/models/asr-en/stable/{version}"
+        assert client.get(path).content == f"asr-en stable {version}".encode()
+    # Versioned files are not re-checked: their content never changes
+    assert client.get("/models/asr-en/stable/1.2").status_code == 200
+    assert upstream.release_requests == 3
+
+    # The latest model stays; older versions are pruned beyond the keep
+    stored = {p.name for p in (tmp_path / "edge").iterdir()}
+    assert MODEL_SHA in stored
+    assert len(stored) == 2
+    assert cloud.edge._pinned() == {MODEL_SHA}
+
+    # A pruned version is fetched again
+    assert client.get("/models/asr-en/stable/1.0").status_code == 200
+    assert upstream.release_requests == 4
+
+
+def test_edge_group_commits_profile_upserts(upstream):
+    client = TestClient(cloud.app)
+
+    def push(i):
+        return client.post("/profiles/batch", json=[
+            {"id": str(i), "name": f"user {i}", "updated_at": 1700000000 + i}
+        ])
+
+    with ThreadPoolExecutor(5) as pool:
+        responses = list(pool.map(push, range(5)))
+
+    assert [r.status_code for r in responses] == [200] * 5
+    assert all(r.json()["count"] == 42 for r in responses)
+    assert len(upstream.batches) == 1
+    assert sorted(p["id"] for p in upstream.batches[0]) == list("01234")
+
+    single = client.post("/profile", json={"id": "9", "updated_at": 1})
+    assert single.status_code == 200
+    assert single.json()["stored"]["id"] == "9"
+    assert upstream.batches[-1] == [{"id": "9", "name": None,
+                                     "email": None, "phone": None,
+                                     "updated_at": 1}]
+
+
+def test_edge_reports_upstream_failures(upstream):
+    client = TestClient(cloud.app)
+    upstream.fail = True
+    response = client.post(
+        "/profiles/batch", json=[{"id": "1", "updated_at": 1}]
+    )
+    assert response.status_code == 502
+    # Reads are relayed as is
+    assert client.get("/profile/1").status_code == 404
+
+
+def test_read_events_parses_upstream_stream():
+    lines = [": connected", "", "event: model", 'data: {"size": 1}', ""]
+    assert list(read_events(lines)) == [("model", '{"size": 1}')]
+
+
+def test_forwarder_merges_updates_to_one_profile():
+    sent = []
+    edge = EdgeCache(
+        "http://upstream", client=object(), window=0.2,
+        store=ModelStore(Path("/nonexistent")),
+    )
+    edge.profiles.send = lambda profiles: sent.append(profiles) or {}
+    threads = [
+        threading.Thread(
+            target=edge.profiles.submit, args=([{"id": "1", **fields}],)
+        )
+        for fields in ({"name": "A", "updated_at": 1}, {"phone": "555"})
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    assert sent == [[{"id": "1", "name": "A", "updated_at": 1,
+                      "phone": "555"}]]
+
+
+def test_forwarder_raises_unexpected_errors_in_every_caller():
+    edge = EdgeCache(
+        "http://upstream", client=object(), window=0.2,
+        store=ModelStore(Path("/nonexistent")),
+    )
+
+    def send(profiles):
+        raise ValueError("bad upstream reply")
+
+    edge.profiles.send = send
+    with ThreadPoolExecutor(3) as pool:
+        futures = [
+            pool.submit(edge.profiles.submit, [{"id": str(i)}])
+            for i in range(3)
+        ]
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+# Ensure lan_cache and sync_loop modules are importable
+sys.path.insert(
+    0, str(Path(__file__).resolve().parents[1] / "src")
+)
+
+import sync_loop  # noqa: E402
+from downloader import RangeDownloader  # noqa: E402
+from lan_cache import LanCache  # noqa: E402
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def peers():
+    """Two unicast LAN caches; only ``b`` is configured to reach ``a``."""
+    a = LanCache(group=None, peers=[], announce_port=0).start()
+    b = LanCache(
+        group=None, peers=[("127.0.0.1", a.announce_port)],
+        announce_port=0, wait_seconds=0,
+    ).start()
+    b.announce()
+    yield a, b
+    a.stop()
+    b.stop()
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_peers_discover_each_other_and_serve_ranges(peers, tmp_path):
+    a, b = peers
+    data = os.urandom(3 * MB + 7)
+    sha = hashlib.sha256(data).hexdigest()
+    model = tmp_path / "a" / "model.bin"
+    model.parent.mkdir()
+    model.write_bytes(data)
+
+    # a never listed b: it learned of it from b's announcement
+    wait_until(lambda: a._seen)
+    a.publish(sha, model)
+    urls = b.wait_for(sha, timeout=5)
+    assert urls == [f"http://127.0.0.1:{a.http_port}/models/{sha}"]
+
+    dest = tmp_path / "b" / "model.bin"
+    RangeDownloader(threshold=0, part_size=MB).download(
+        urls[0], dest, len(data), sha
+    )
+    assert dest.read_bytes() == data
+    assert requests.get(
+        f"http://127.0.0.1:{a.http_port}/models/{'0' * 64}"
+    ).status_code == 404
+
+
+def test_model_server_rejects_bad_ranges_and_ignores_queries(
+    peers, tmp_path
+):
+    a, _ = peers
+    data = b"0123456789"
+    sha = hashlib.sha256(data).hexdigest()
+    model = tmp_path / "model.bin"
+    model.write_bytes(data)
+    a.publish(sha, model)
+    url = f"http://127.0.0.1:{a.http_port}/models/{sha}"
+
+    assert requests.get(
+        url, headers={"Range": "bytes=5-2"}
+    ).status_code == 416
+    assert requests.get(
+        url, headers={"Range": "bytes=10-"}
+    ).status_code == 416
+    part = requests.get(url, headers={"Range": "bytes=5-"})
+    assert part.status_code == 206
+    assert part.content == b"56789"
+
+    queried = requests.get(url + "?cache-bust=1")
+    assert queried.status_code == 200
+    assert queried.content == data
+    assert queried.headers["X-Model-SHA256"] == sha
+
+
+def test_wait_for_follows_a_peer_fetching_from_the_cloud(peers, tmp_path):
+    a, b = peers
+    b.wait_seconds = b.fetch_wait_seconds = 0
+    wait_until(lambda: a._seen)
+    a.begin_fetch("f" * 64)
+    wait_until(lambda: b._seen and list(b._seen.values())[0].fetching)
+
+    assert b.wait_for("f" * 64, timeout=0) == []
+    b.fetch_wait_seconds = 5
+    model = tmp_path / "model.bin"
+    model.write_bytes(b"weights")
+    started = time.monotonic()
+    a.publish("f" * 64, model)
+    assert b.wait_for("f" * 64, timeout=0)
+    assert time.monotonic() - started < 5
+
+
+def test_budgeted_wait_carries_over_to_the_next_call(peers, tmp_path):
+    a, b = peers
+    b.fetch_wait_seconds = 60
+    wait_until(lambda: a._seen)
+    a.begin_fetch("f" * 64)
+    wait_until(lambda: b._seen and list(b._seen.values())[0].fetching)
+
+    started = time.monotonic()
+    assert b.wait_for("f" * 64, timeout=0, budget=0.1) == []
+    assert time.monotonic() - started < 1
+    assert b.still_waiting("f" * 64)
+
+    model = tmp_path / "model.bin"
+    model.write_bytes(b"weights")
+    a.publish("f" * 64, model)
+    assert b.wait_for("f" * 64, budget=5)
+    assert not b.still_waiting("f" * 64)
+
+
+def test_modelsync_prefers_lan_peers_and_skips_bad_ones(
+    peers, tmp_path, monkeypatch
+):
+    a, b = peers
+    data = os.urandom(2 * MB)
+    sha = hashlib.sha256(data).hexdigest()
+    source = tmp_path / "a.bin"
+    source.write_bytes(data)
+    wait_until(lambda: a._seen)
+    a.publish(sha, source)
+    wait_until(lambda: b.sources(sha))
+    # A peer that claims the model but is gone
+    b.handle_announcement(
+        b'{"node": "dead", "port": 9, "models": ["%s"]}' % sha.encode(),
+        ("127.0.0.1", 9),
+    )
+
+    class CloudResponse:
+        status_code = 200
+        url = "http://cloud/model/latest"
+        headers = {
+            "X-Model-SHA256": sha,
+            "Content-Length": str(len(data)),
+            "Accept-Ranges": "bytes",
+        }
+
+        def close(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            raise AssertionError("model fetched from the cloud")
+
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    monkeypatch.setattr(
+        sync_loop, "STATE_PATH", tmp_path / "state.db"
+    )
+    monkeypatch.setattr(
+        sync_loop.requests, "get", lambda *a, **kw: CloudResponse()
+    )
+    lan_bytes = sync_loop.MODEL_LAN_BYTES.value()
+
+    sync_loop.ModelSync("http://cloud", lan=b).sync_model()
+
+    model = tmp_path / ".waw" / "models" / "model.bin"
+    assert model.read_bytes() == data
+    assert sync_loop.MODEL_LAN_BYTES.value() - lan_bytes == len(data)
+    # b now serves the model too
+    assert b.held_path(sha) == model
@@ -0,0 +1,79 @@
+import hashlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend_mock directory to path so we can import app module
+sys.path.insert(
+    0,
+    str(Path(__file__).resolve().parents[1] / "backend_mock"),
+)
+
+import app as cloud  # noqa: E402
+import model_store  # noqa: E402
+from model_store import ModelBusy, ModelPublisher  # noqa: E402
+
+client = TestClient(cloud.app)
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    path = tmp_path / "model.bin"
+    monkeypatch.setattr(cloud, "MODEL_PATH", path)
+    monkeypatch.setattr(cloud, "model_publisher", ModelPublisher())
+    return path
+
+
+def test_concurrent_requests_share_one_hash(model):
+    model.write_bytes(b"v1" * 500_000)
+    hashed = model_store.MODEL_HASH_LATENCY.count()
+
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(
+            lambda _: client.get("/model/latest"), range(8)
+        ))
+
+    assert model_store.MODEL_HASH_LATENCY.count() - hashed == 1
+    sha = hashlib.sha256(b"v1" * 500_000).hexdigest()
+    assert {r.headers["x-model-sha256"] for r in responses} == {sha}
+    assert all(r.content == b"v1" * 500_000 for r in responses)
+
+
+def test_published_copy_outlives_changes_to_the_source(model):
+    model.write_bytes(b"old model")
+    sha, published = cloud.model_publisher.current(model)
+
+    # Written to in place, as a plain copy over the file would
+    with model.open("ab") as f:
+        f.write(b" v2")
+    assert published.read_bytes() == b"old model"
+
+    response = client.get("/model/latest")
+    assert response.content == b"old model v2"
+    assert response.headers["x-model-sha256"] == hashlib.sha256(
+        b"old model v2"
+    ).hexdigest()
+
+
+def test_model_that_keeps_changing_is_not_published(model, monkeypatch):
+    model.write_bytes(b"partial")
+    store_put = model_store.ModelStore.put
+
+    def put_while_writing(self, chunks, expected_sha=None):
+        # Another writer appends while the file is being read
+        with model.open("ab") as f:
+            f.write(b"+")
+        return store_put(self, chunks, expected_sha)
+
+    monkeypatch.setattr(model_store.ModelStore, "put", put_while_writing)
+    with pytest.raises(ModelBusy):
+        cloud.model_publisher.current(model)
+
+    response = client.get("/model/latest")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    store = ModelPublisher.store_for(model)
+    assert [p for p in store.root.iterdir()] == []
@@ -0,0 +1,102 @@
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend_mock directory to path so we can import app module
+sys.path.insert(
+    0,
+    str(Path(__file__).resolve().parents[1] / "backend_mock"),
+)
+
+import app as cloud  # noqa: E402
+import model_store  # noqa: E402
+from registry import ModelRegistry, version_key  # noqa: E402
+
+client = TestClient(cloud.app)
+
+
+def release(root: Path, name: str, channel: str, version: str, data: bytes):
+    path = root / name / channel / f"{version}.bin"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = ModelRegistry(tmp_path / "models", refresh_interval=0)
+    monkeypatch.setattr(cloud, "model_registry", registry)
+    return registry
+
+
+def test_version_key_orders_numeric_parts():
+    versions = ["1.10", "1.9", "2.0-rc1", "1.9.1", "10"]
+    assert sorted(versions, key=version_key) == [
+        "1.9", "1.9.1", "1.10", "2.0-rc1", "10"
+    ]
+
+
+def test_registry_serves_latest_release_per_channel(registry):
+    root = registry.root
+    release(root, "asr-en", "stable", "1.9", b"en 1.9")
+    release(root, "asr-en", "stable", "1.10", b"en 1.10")
+    release(root, "asr-en", "beta", "2.0-rc1", b"en 2.0")
+    release(root, "asr-de", "stable", "1.0", b"de 1.0")
+
+    catalog = client.get("/models").json()
+    assert [(r["name"], r["channel"], r["version"]) for r in catalog] == [
+        ("asr-de", "stable", "1.0"),
+        ("asr-en", "beta", "2.0-rc1"),
+        ("asr-en", "stable", "1.10"),
+    ]
+    assert catalog[2]["sha256"] == hashlib.sha256(b"en 1.10").hexdigest()
+    beta = client.get("/models", params={"channel": "beta"}).json()
+    assert [r["version"] for r in beta] == ["2.0-rc1"]
+
+    latest = client.get("/models/asr-en/stable/latest")
+    assert latest.content == b"en 1.10"
+    assert latest.headers["x-model-version"] == "1.10"
+    assert latest.headers["x-model-sha256"] == catalog[2]["sha256"]
+    part = client.get(
+        "/models/asr-en/stable/1.9", headers={"Range": "bytes=3-5"}
+    )
+    assert part.status_code == 206
+    assert part.content == b"1.9"
+
+    assert client.get("/models/asr-fr/stable/latest").status_code == 404
+    assert client.get("/models/asr-en/stable/0.1").status_code == 404
+
+
+def test_refresh_reports_changes_and_removals(registry):
+    root = registry.root
+    first = release(root, "asr-en", "stable", "1.0", b"v1")
+    assert [r.version for r in registry.refresh()] == ["1.0"]
+    assert registry.refresh() == []
+
+    release(root, "asr-en", "stable", "1.1", b"v1.1")
+    assert [r.version for r in registry.refresh()] == ["1.1"]
+    assert registry.latest("asr-en", "stable").version == "1.1"
+
+    # Release files still being copied in are not picked up
+    release(root, "asr-en", ".incoming", "2.0", b"partial")
+    assert registry.refresh() == []
+
+    first.unlink()
+    assert registry.refresh() == []
+    assert registry.get("asr-en", "stable", "1.0") is None
+
+
+def test_catalog_survives_restarts_without_rehashing(registry):
+    release(registry.root, "asr-en", "stable", "1.0", b"v1")
+    registry.refresh()
+    hashed = model_store.MODEL_HASH_LATENCY.count()
+
+    restarted = ModelRegistry(registry.root, refresh_interval=0)
+    assert restarted.refresh() == []
+    assert restarted.latest("asr-en", "stable").sha256 == (
+        hashlib.sha256(b"v1").hexdigest()
+    )
+    assert model_store.MODEL_HASH_LATENCY.count() == hashed
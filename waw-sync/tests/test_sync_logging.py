@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+import sys
+from pathlib import Path
+
+# Ensure sync_logging module is importable
+sys.path.insert(
+    0, str(Path(__file__).resolve().parents[1] / "src")
+)
+
+from sync_logging import (  # noqa: E402
+    THROTTLED,
+    JsonFormatter,
+    RateLimitFilter,
+    configure_logging,
+    shutdown_logging,
+)
+
+
+def make_record(msg, *args, **extra):
+    record = logging.makeLogRecord(
+        {"name": "waw.sync", "levelno": logging.INFO, "levelname": "INFO",
+         "msg": msg, "args": args}
+    )
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_rate_limit_filter_suppresses_repeats():
+    limiter = RateLimitFilter(window=60)
+    assert limiter.filter(make_record("⏳ No changes", **THROTTLED))
+    assert not limiter.filter(make_record("⏳ No changes", **THROTTLED))
+    assert not limiter.filter(make_record("⏳ No changes", **THROTTLED))
+
+    # Unthrottled records and other throttle keys pass through
+    assert limiter.filter(make_record("⏳ No changes"))
+    assert limiter.filter(make_record("⏳ No changes", throttle="model"))
+
+    limiter.window = 0
+    record = make_record("⏳ No changes", **THROTTLED)
+    assert limiter.filter(record)
+    assert record.suppressed == 2
+
+
+def test_json_formatter_includes_extra_fields():
+    record = make_record("✅ Sync %s", "ok", profiles=2)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "✅ Sync ok"
+    assert entry["level"] == "INFO"
+    assert entry["profiles"] == 2
+
+
+def test_configure_logging_writes_through_queue():
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt="json", stream=stream)
+    log = logging.getLogger("waw.sync")
+    log.info("🆗 Model is up to date.", extra=THROTTLED)
+    log.info("🆗 Model is up to date.", extra=THROTTLED)
+    log.debug("hidden")
+    shutdown_logging()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["msg"] for line in lines] == ["🆗 Model is up to date."]
@@ -1,6 +1,8 @@
 import hashlib
+import json
 import sqlite3
 import sys
+import threading
 from pathlib import Path
 
 import pytest
@@ -14,6 +16,9 @@ sys.path.insert(
 import sync_loop  # noqa: E402
 from sync_loop import FileManager, ProfileDB, ProfileSync  # noqa: E402
 from sync_loop import ModelSync, CLOUD_URL  # noqa: E402
+from sync_loop import EventListener, parse_sse  # noqa: E402
+from sync_loop import ProfilePull, to_epoch  # noqa: E402
+from sync_loop import Outbox  # noqa: E402
 
 load_dotenv()
 
@@ -36,8 +41,11 @@ conn.close()
 @pytest.fixture(autouse=True)
 def env_vars(tmp_path, monkeypatch):
     monkeypatch.setenv("PROFILE_DB_PATH", str(TEST_DB))
-    state_file = tmp_path / "state.json"
-    monkeypatch.setattr(sync_loop, "STATE_PATH", state_file)
+    monkeypatch.setattr(sync_loop, "STATE_PATH", tmp_path / "state.db")
+    monkeypatch.setattr(
+        sync_loop, "LEGACY_STATE_PATH", tmp_path / "state.json"
+    )
+    monkeypatch.setattr(sync_loop, "OUTBOX_PATH", tmp_path / "outbox.db")
     monkeypatch.setenv("CLOUD_SYNC_URL", "http://example.com/profile")
     yield
 
@@ -46,13 +54,60 @@ def test_filemanager_state(tmp_path):
     assert FileManager.get_last_synced_at() is None
     FileManager.set_last_synced_at(123)
     assert FileManager.get_last_synced_at() == 123
+    FileManager.set_sync_cursors({"a": 1, "b": 2})
+    assert FileManager.get_last_synced_at("b") == 2
+
+
+def test_state_store_imports_legacy_json(tmp_path):
+    (tmp_path / "state.json").write_text(json.dumps(
+        {"last_synced_at": 42, "field_hashes": {"name": "abc"}}
+    ))
+    assert FileManager.get_last_synced_at("p1") == 42
+    assert FileManager.get_field_hashes("p1") == {"name": "abc"}
+    assert not (tmp_path / "state.json").exists()
+
+    FileManager.set_last_synced_at(43, "p1")
+    assert FileManager.get_last_synced_at("p1") == 43
+    assert FileManager.get_last_synced_at("p2") == 42
+
+
+def test_state_store_reuses_one_connection(monkeypatch):
+    opened = []
+    connect = sqlite3.connect
+    monkeypatch.setattr(
+        sync_loop.sqlite3, "connect",
+        lambda *args, **kwargs: opened.append(args) or connect(
+            *args, **kwargs
+        ),
+    )
+    for i in range(5):
+        FileManager.set_last_synced_at(i, "p1")
+        assert FileManager.get_last_synced_at("p1") == i
+    assert opened == [(sync_loop.STATE_PATH,)]
+
+
+def test_model_sha_is_cached_until_the_file_changes(tmp_path):
+    model = tmp_path / "model.bin"
+    model.write_bytes(b"v1")
+    first = FileManager.get_local_model_sha(model)
+    assert first == hashlib.sha256(b"v1").hexdigest()
+
+    hashed = sync_loop.MODEL_HASH_LATENCY.count()
+    assert FileManager.get_local_model_sha(model) == first
+    assert sync_loop.MODEL_HASH_LATENCY.count() == hashed
+
+    model.write_bytes(b"v2!")
+    assert FileManager.get_local_model_sha(model) == hashlib.sha256(
+        b"v2!"
+    ).hexdigest()
 
 
 def test_profiledb_get_and_delete():
     db = ProfileDB(TEST_DB, "dummy_key")
     conn = db._connect()
     conn.execute(
-        "INSERT INTO profile VALUES "
+        "INSERT INTO profile "
+        "(id, name, email, phone, created_at, updated_at) VALUES "
         "('1','A','a@b.com','123','t','t');"
     )
     conn.commit()
@@ -96,3 +151,269 @@ def test_modelsync(tmp_path, monkeypatch):
 
     sync = ModelSync("http://example.com/profile")
     sync.sync_model()
+
+
+class RegistrySession:
+    """Serves a registry catalog and byte ranges of its releases."""
+
+    def __init__(self, releases):
+        self.releases = releases
+        self.urls = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.urls.append(url)
+        if url.endswith("/models"):
+            catalog = [
+                {"name": name, "channel": channel, "version": version,
+                 "sha256": hashlib.sha256(data).hexdigest(),
+                 "size": len(data)}
+                for (name, channel, version), data in self.releases.items()
+            ]
+            return Response(200, catalog)
+        name, channel, version = url.split("/")[-3:]
+        data = self.releases[(name, channel, version)]
+        start, end = (
+            int(n) for n in headers["Range"][6:].split("-")
+        )
+        return Response(206, data[start:end + 1], {
+            "Content-Range": f"bytes {start}-{end}/{len(data)}"
+        })
+
+
+class Response:
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_modelsync_tracks_registry_models(tmp_path, monkeypatch):
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    session = RegistrySession({
+        ("asr-en", "stable", "1.2"): b"english",
+        ("asr-de", "beta", "2.0-rc1"): b"german",
+    })
+    sync = ModelSync(
+        "http://example.com/profile",
+        downloader=sync_loop.RangeDownloader(session=session),
+        models=sync_loop.parse_models("asr-en, asr-de:beta, asr-fr"),
+    )
+    assert sync.models == [
+        ("asr-en", "stable"), ("asr-de", "beta"), ("asr-fr", "stable")
+    ]
+
+    sync.sync_model()
+    assert ModelSync.model_path("asr-en", "stable").read_bytes() == (
+        b"english"
+    )
+    assert ModelSync.model_path("asr-de", "beta").read_bytes() == b"german"
+    assert "http://example.com/models/asr-de/beta/2.0-rc1" in session.urls
+
+    # Up-to-date models are not downloaded again
+    session.urls.clear()
+    sync.sync_model()
+    assert session.urls == ["http://example.com/models"]
+
+
+def test_failed_download_withdraws_lan_fetch(tmp_path, monkeypatch):
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    session = RegistrySession({
+        ("asr-en", "stable", "1.0"): b"english",
+        ("asr-de", "stable", "1.0"): b"german",
+    })
+    lan = sync_loop.LanCache(group=None, peers=[], wait_seconds=0)
+    sync = ModelSync(
+        "http://example.com/profile",
+        downloader=sync_loop.RangeDownloader(session=session),
+        lan=lan,
+        models=[("asr-en", "stable"), ("asr-de", "stable")],
+    )
+    download = sync._download_ranges
+
+    def disk_full_for_english(model_path, url, size, sha):
+        assert lan._fetching == {sha}
+        if "/asr-en/" in url:
+            raise OSError("No space left on device")
+        download(model_path, url, size, sha)
+
+    monkeypatch.setattr(sync, "_download_ranges", disk_full_for_english)
+    sync.sync_model()
+
+    # The failure neither left a stale "fetching" nor stopped asr-de
+    assert lan._fetching == set()
+    assert ModelSync.model_path("asr-de", "stable").read_bytes() == b"german"
+    assert list(lan._held) == [hashlib.sha256(b"german").hexdigest()]
+
+
+def test_parse_sse_events():
+    lines = [
+        ": connected",
+        "",
+        "event: model",
+        'data: {"sha256": "abc", "size": 3}',
+        "",
+        ": keepalive",
+        "",
+        "event: profile",
+        'data: {"id": "1", "updated_at": 5}',
+        "",
+    ]
+    events = list(parse_sse(lines))
+    assert events == [
+        ("model", {"sha256": "abc", "size": 3}),
+        ("profile", {"id": "1", "updated_at": 5}),
+    ]
+
+
+def test_event_listener_wakes_loop():
+    wake = threading.Event()
+    listener = EventListener("http://example.com/profile", wake)
+    assert listener.events_url == "http://example.com/events"
+
+    listener.handle("model", {"sha256": "abc"})
+    assert wake.is_set()
+    assert listener.drain() == {"model"}
+    assert listener.drain() == set()
+
+
+def test_profilepull_merges_newer_cloud_profile(monkeypatch):
+    db = ProfileDB(TEST_DB, "dummy_key")
+    conn = db._connect()
+    conn.execute(
+        "INSERT INTO profile "
+        "(id, name, email, phone, created_at, updated_at) VALUES "
+        "('p1','Old','old@b.com','1','2025-01-01T00:00:00+00:00',"
+        "'2025-01-01T00:00:00+00:00');"
+    )
+    conn.commit()
+    conn.close()
+
+    local_ts = to_epoch("2025-01-01T00:00:00+00:00")
+    remote_ts = local_ts + 60
+    calls = []
+
+    class DummyResponse:
+        status_code = 200
+
+        def json(self):
+            return {"id": "p1", "name": "New", "updated_at": remote_ts}
+
+    def fake_get(url, params=None, **kwargs):
+        calls.append((url, params))
+        return DummyResponse()
+
+    class DummyIdentity:
+        merged = None
+
+        def update_profile(self, profile):
+            self.merged = profile
+
+    monkeypatch.setattr(sync_loop.requests, "get", fake_get)
+    identity = DummyIdentity()
+    pull = ProfilePull(db, "http://example.com/profile", identity)
+    try:
+        assert pull.pull_profile() is True
+    finally:
+        db.delete_profile("p1")
+
+    assert calls == [
+        ("http://example.com/profile/p1", {"since": local_ts})
+    ]
+    assert identity.merged["name"] == "New"
+    assert identity.merged["email"] == "old@b.com"
+    assert to_epoch(identity.merged["updated_at"]) == remote_ts
+    assert FileManager.get_last_synced_at("p1") == remote_ts
+
+
+def test_outbox_coalesces_and_backs_off(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db", base_delay=60)
+    outbox.enqueue({"id": "1", "name": "A", "updated_at": 1})
+    outbox.enqueue({"id": "1", "name": "B", "updated_at": 2})
+    outbox.enqueue({"id": "2", "name": "C", "updated_at": 3})
+    assert outbox.pending() == 2
+    assert outbox.contains("1", 2)
+    assert not outbox.contains("1", 1)
+
+    assert outbox.drain(lambda batch: False) == []
+    assert outbox.failures == 1
+    assert not outbox.ready()
+    assert outbox.pending() == 2
+
+    outbox.next_attempt = 0.0
+    batches = []
+    sent = outbox.drain(lambda batch: batches.append(batch) or True)
+    assert [p["name"] for p in sent] == ["B", "C"]
+    assert len(batches) == 1
+    assert outbox.pending() == 0
+    assert outbox.failures == 0
+
+
+def test_profilesync_uploads_through_outbox(tmp_path, monkeypatch):
+    db = ProfileDB(TEST_DB, "dummy_key")
+    conn = db._connect()
+    conn.execute(
+        "INSERT INTO profile "
+        "(id, name, email, phone, created_at, updated_at) VALUES "
+        "('o1','A','a@b.com','1','2025-01-01T00:00:00+00:00',"
+        "'2025-01-01T00:00:00+00:00');"
+    )
+    conn.commit()
+    conn.close()
+
+    posts = []
+
+    class DummyResponse:
+        status_code = 200
+        text = "ok"
+
+    def fake_post(url, json=None, **kwargs):
+        posts.append((url, json))
+        return DummyResponse()
+
+    monkeypatch.setattr(sync_loop.requests, "post", fake_post)
+    sync = ProfileSync(db, "http://example.com/profile")
+    try:
+        sync.sync_profile()
+        sync.sync_profile()
+    finally:
+        db.delete_profile("o1")
+
+    expected_ts = to_epoch("2025-01-01T00:00:00+00:00")
+    assert len(posts) == 1
+    assert posts[0][0] == "http://example.com/profiles/batch"
+    assert posts[0][1][0]["updated_at"] == expected_ts
+    assert FileManager.get_last_synced_at("o1") == expected_ts
+    assert sync.outbox.pending() == 0
+
+
+def test_profilesync_sends_only_changed_fields():
+    db = ProfileDB(TEST_DB, "dummy_key")
+    sync = ProfileSync(db, "http://example.com/profile")
+    profile = {"id": "f1", "name": "A", "email": "a@b.com", "phone": "1"}
+
+    assert sync.changed_fields(profile) == {
+        "name": "A", "email": "a@b.com", "phone": "1"
+    }
+    ProfileSync.record_synced_fields([profile])
+    assert sync.changed_fields(dict(profile, phone="2")) == {"phone": "2"}
+    assert "a@b.com" not in str(FileManager.get_field_hashes("f1"))
+
+
+def test_outbox_merges_partial_records(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.db")
+    outbox.enqueue({"id": "1", "name": "A", "updated_at": 1})
+    outbox.enqueue({"id": "1", "phone": "2", "updated_at": 2})
+    sent = outbox.drain(lambda batch: True)
+    assert sent == [{"id": "1", "name": "A", "phone": "2", "updated_at": 2}]